@@ -1,26 +1,41 @@
-from datetime import datetime, timedelta
-from typing import Optional
+import hashlib
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import JWTError, jwk, jwt
 from sqlalchemy.orm import Session
 
-from . import models, schemas, database, crud  # Use relative imports
+from . import schemas, database  # Use relative imports
+from .passwords import crypt_context
+from .revocation import RevocationList
+from .cache import LRUCache, build_cache
 from .config import settings
 
 # JWT config - use settings from config
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+# Built once: given the raw secret, jose tries json.loads on it and builds a key object on every call
+signing_key = jwk.construct(SECRET_KEY, ALGORITHM)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (the async routes hash on passwords.hasher's pool instead)
+pwd_context = crypt_context(settings.PASSWORD_BCRYPT_ROUNDS)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
+# Verified username -> user identity, so authenticated requests skip the users lookup
+user_cache = build_cache("user", settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
+# sha256(token) -> verified claims, until the token expires; process-local, as decoding is
+token_cache = LRUCache(settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+# jtis of logged-out access tokens, and users' revoked token versions, until those tokens expire
+revoked_tokens = RevocationList(settings.REVOCATION_SYNC_SECONDS)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -31,11 +46,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.setdefault("jti", uuid.uuid4().hex)  # lets this one token be revoked
+    return jwt.encode(to_encode, signing_key, algorithm=ALGORITHM)
+
+def new_refresh_token() -> Tuple[str, datetime]:
+    """A random opaque refresh token and its expiry; only its hash is stored"""
+    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    return secrets.token_urlsafe(32), expires_at
+
+def refresh_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def user_claims(user) -> dict:
+    """Claims identifying ``user`` in an access token: username, id and token version"""
+    return {"sub": user.username, "uid": user.id, "ver": user.token_version}
 
-def get_current_user(
+def decode_token(token: str) -> dict:
+    """Verified claims of ``token``; raises JWTError. Served from token_cache when seen recently"""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    payload = token_cache.get(key) if settings.TOKEN_CACHE_TTL_SECONDS > 0 else None
+    if payload is None:
+        payload = jwt.decode(token, signing_key, algorithms=[ALGORITHM])
+        ttl = min(payload.get("exp", 0) - time.time(), settings.TOKEN_CACHE_TTL_SECONDS)
+        if ttl > 0:
+            token_cache.set(key, payload, ttl)
+    return payload
+
+def invalidate_user(username: str):
+    """Drop a cached identity after the user row changes"""
+    user_cache.delete(username)
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_session)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -43,13 +86,31 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username)
-    if user is None:
+    # Imported here: crud imports this module, and crud_async needs crud complete
+    from . import crud_async
+    if revoked_tokens.sync_due():
+        revoked_tokens.merge(await crud_async.get_revoked_tokens(db))
+    version = payload.get("ver", 0)
+    if payload.get("jti") in revoked_tokens or version < revoked_tokens.min_version(payload.get("uid")):
+        raise credentials_exception
+    user = await user_cache.aget(username)
+    # A version other than the token's may just be stale: re-read before rejecting
+    if user is None or user.get("token_version") != version:
+        if "uid" in payload:
+            db_user = await crud_async.get_user(db, payload["uid"])
+        else:  # issued before tokens carried the id
+            db_user = await crud_async.get_user_by_username(db, username)
+        if db_user is None or db_user.username != username:
+            raise credentials_exception
+        user = {"id": db_user.id, "username": db_user.username, "token_version": db_user.token_version}
+        await user_cache.aset(username, user)
+    # Tokens issued before the user's token version was last bumped are no longer valid
+    if version != user["token_version"]:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return schemas.UserOut(id=user["id"], username=user["username"])
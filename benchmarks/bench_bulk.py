@@ -0,0 +1,77 @@
+"""Rows per second when creating many expenses at once.
+
+Compares one ``crud.create_expense`` call per row (an INSERT and commit
+each) with ``crud.import_expenses`` (batched validation, one executemany per
+batch, one commit), called directly and through ``POST /expenses/import``
+with a CSV upload::
+
+    python -m expanse_api.benchmarks.bench_bulk --rows 10000
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import httpx
+
+from .common import signup_headers, timed
+from .. import crud, database, main, models, schemas
+
+
+def rows(count: int):
+    return [{"amount": i % 500 + 0.5, "description": f"statement line {i}"} for i in range(count)]
+
+
+def csv_file(count: int) -> bytes:
+    lines = ["amount,description,date"]
+    lines += [f"{i % 500 + 0.5},statement line {i},2026-01-{i % 28 + 1:02d} 12:00:00" for i in range(count)]
+    return "\n".join(lines).encode()
+
+
+def one_by_one(db, user_id: int, count: int):
+    for row in rows(count):
+        crud.create_expense(db, user_id, schemas.ExpenseCreate(**row))
+
+
+def bulk(db, user_id: int, count: int):
+    result = crud.import_expenses(db, user_id, enumerate(rows(count)))
+    assert result.created == count, result
+
+
+async def csv_upload(count: int):
+    transport = httpx.ASGITransport(app=main.app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers = await signup_headers(client, f"bulk_http_{int(time.time())}")
+        body = csv_file(count)
+        start = time.perf_counter()
+        response = await client.post("/expenses/import", files={"file": ("bench.csv", io.BytesIO(body), "text/csv")},
+                                     headers=headers)
+        elapsed = time.perf_counter() - start
+        assert response.json()["created"] == count, response.text
+        return elapsed
+
+
+def print_rate(label: str, count: int, seconds: float):
+    print(f"{label:<40} n={count:<7} {seconds:8.2f}s {count / seconds:10.0f} rows/s")
+
+
+def run(count: int, single_rows: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        user = crud.create_user(db, schemas.UserCreate(username=f"bulk_{int(time.time())}", password="x"), "not-a-hash")
+        single = min(count, single_rows)
+        print_rate("create_expense per row", single, timed(one_by_one, db, user.id, single)[1])
+        print_rate("import_expenses (batched executemany)", count, timed(bulk, db, user.id, count)[1])
+    finally:
+        db.close()
+    print_rate("POST /expenses/import (CSV upload)", count, asyncio.run(csv_upload(count)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--single-rows", type=int, default=2000,
+                        help="rows for the one-by-one baseline, which is much slower")
+    args = parser.parse_args()
+    run(args.rows, args.single_rows)
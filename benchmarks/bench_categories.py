@@ -0,0 +1,71 @@
+"""Deleting categories that hold many expenses.
+
+Each run seeds a fresh user whose categories hold ``--per-category``
+expenses each, then deletes all but one of them. ``per category (old)``
+repeats the previous ``delete_category`` for each one: a ``.first()``
+probe, an UPDATE not scoped by user, an ORM load and delete and a commit.
+``delete_categories`` does them all in one transaction, with one UPDATE
+either uncategorizing the expenses or reassigning them to the remaining
+category::
+
+    python -m expanse_api.benchmarks.bench_categories --categories 5 --per-category 100000
+"""
+import argparse
+import time
+
+from .common import seed_expenses, timed
+from .. import crud, database, models, rollups
+
+
+def old_delete_category(db, category_id: int, user_id: int):
+    moved = 0
+    category = crud.get_category(db, category_id, user_id)
+    if category:
+        if db.query(models.Expense).filter(models.Expense.category_id == category_id).first():
+            moved = db.query(models.Expense).filter(
+                models.Expense.category_id == category_id
+            ).update({models.Expense.category_id: None})
+            rollups.move_categories(db, user_id, [category_id])
+        db.delete(category)
+        db.commit()
+    return moved
+
+
+def per_category(db, user_id: int, ids, keep: int):
+    return sum(old_delete_category(db, category_id, user_id) for category_id in ids)
+
+
+def set_based(db, user_id: int, ids, keep: int):
+    return crud.delete_categories(db, user_id, ids)[1]
+
+
+def reassigned(db, user_id: int, ids, keep: int):
+    return crud.delete_categories(db, user_id, ids, reassign_to=keep)[1]
+
+
+def run(categories: int, per_category_expenses: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    # seed_expenses leaves about 1/(categories + 1) of the expenses uncategorized
+    expenses = per_category_expenses * (categories + 1)
+    print(f"{categories} categories x ~{per_category_expenses} expenses, deleting {categories - 1}")
+    for label, fn in [("per category (old)", per_category),
+                      ("delete_categories", set_based),
+                      ("delete_categories, reassign_to", reassigned)]:
+        db = database.SessionLocal()
+        try:
+            user_id = seed_expenses(db, f"categories_{label}_{time.time()}", expenses, categories)
+            rollups.rebuild(db, user_id)
+            keep, *ids = [category.id for category in crud.get_categories(db, user_id)]
+            moved, seconds = timed(fn, db, user_id, ids, keep)
+            assert rollups.verify(db, user_id) == []
+            print(f"{label:<40} moved={moved:<8} {seconds:8.3f}s")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--per-category", type=int, default=100_000)
+    args = parser.parse_args()
+    run(args.categories, args.per_category)
@@ -0,0 +1,119 @@
+"""Throughput and peak memory of each export format for one user with many expenses.
+
+Every format reads the same batched row source
+(``crud.stream_expenses_for_export``); CSV, NDJSON and JSON are encoded
+chunk by chunk, XLSX and Parquet are written to a spooled temporary file.
+The baseline is the previous CSV export: load every expense as an ORM
+object, write the whole CSV to a StringIO and copy it into a BytesIO. Peak
+memory is traced Python allocations::
+
+    python -m expanse_api.benchmarks.bench_export --expenses 5000000 --no-baseline
+    python -m expanse_api.benchmarks.bench_export --formats csv ndjson parquet
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+
+from sqlalchemy.orm import joinedload
+
+from .common import seed_expenses, timed
+from .. import crud, database, models
+from ..exports import (
+    EXPORT_COLUMNS, csv_chunks, file_chunks, json_array_chunks, ndjson_chunks, write_parquet, write_xlsx,
+)
+
+
+def buffered_csv(db, user_id: int, batch_size: int) -> int:
+    """The pre-streaming CSV export, kept here only as the baseline."""
+    expenses = (
+        db.query(models.Expense)
+        .options(joinedload(models.Expense.category))
+        .filter(models.Expense.user_id == user_id)
+        .order_by(models.Expense.created_at.desc())
+        .all()
+    )
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_COLUMNS)
+    for expense in expenses:
+        writer.writerow([
+            expense.id,
+            expense.description or '',
+            expense.amount,
+            expense.category.name if expense.category else 'Uncategorized',
+            expense.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        ])
+    body = io.BytesIO(output.getvalue().encode())
+    return len(body.getvalue())
+
+
+def streamed(encode):
+    def export(db, user_id: int, batch_size: int) -> int:
+        batches = crud.stream_expenses_for_export(db, user_id, batch_size=batch_size)
+        return sum(len(chunk) for chunk in encode(batches))
+    return export
+
+
+def xlsx_export(db, user_id: int, batch_size: int) -> int:
+    summary = crud.get_expense_summary(db, user_id)
+    batches = crud.stream_expenses_for_export(db, user_id, batch_size=batch_size)
+    return sum(len(chunk) for chunk in file_chunks(write_xlsx(batches, summary, "All to All")))
+
+
+FORMATS = {
+    "csv": streamed(csv_chunks),
+    "ndjson": streamed(ndjson_chunks),
+    "json": streamed(json_array_chunks),
+    "parquet": streamed(lambda batches: file_chunks(write_parquet(batches))),
+    "xlsx": xlsx_export,
+}
+
+
+def measure(label: str, export, user_id: int, expenses: int, batch_size: int, trace: bool):
+    db = database.SessionLocal()
+    if trace:
+        tracemalloc.start()
+    try:
+        size, seconds = timed(export, db, user_id, batch_size)
+    finally:
+        db.close()
+    peak = f"peak={tracemalloc.get_traced_memory()[1] / 2**20:8.1f} MiB" if trace else ""
+    tracemalloc.stop()
+    print(f"{label:<24} {size / 2**20:9.1f} MiB {seconds:8.2f}s "
+          f"{expenses / seconds:11.0f} rows/s {size / 2**20 / seconds:8.1f} MiB/s  {peak}")
+
+
+def run(expenses: int, batch_size: int, formats, baseline: bool, trace: bool):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        user_id, seconds = timed(seed_expenses, db, f"export_bench_{int(time.time())}", expenses)
+    finally:
+        db.close()
+    print(f"seeded {expenses} expenses in {seconds:.1f}s, batch_size={batch_size}")
+
+    if "parquet" in formats:
+        try:
+            import pyarrow.parquet  # noqa: F401 - imported up front so the import is not traced
+        except ImportError:
+            print("parquet: skipped, pyarrow is not installed")
+            formats = [name for name in formats if name != "parquet"]
+    for name in formats:
+        measure(name, FORMATS[name], user_id, expenses, batch_size, trace)
+    if baseline:
+        measure("csv (buffered baseline)", buffered_csv, user_id, expenses, batch_size, trace)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=5_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--no-baseline", dest="baseline", action="store_false",
+                        help="skip the buffered CSV export, which needs several GiB at 5M rows")
+    parser.add_argument("--no-trace", dest="trace", action="store_false",
+                        help="skip tracemalloc, which slows every format down several times")
+    args = parser.parse_args()
+    run(args.expenses, args.batch_size, args.formats, args.baseline, args.trace)
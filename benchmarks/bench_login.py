@@ -0,0 +1,126 @@
+"""Login throughput, and latency of other requests during a login burst.
+
+Each configuration runs a burst of concurrent POST /users/login calls while
+a probe keeps requesting GET /users/me, as other users' traffic would.
+``thread x40`` approximates the previous setup (bcrypt on the request
+threadpool, 40 threads by default); the process pools take bcrypt off the
+interpreter entirely. The cached row repeats the process run with the login
+verification cache on, as when the same clients log in again; the last one
+renews sessions through POST /users/refresh instead, which needs no bcrypt::
+
+    python -m expanse_api.benchmarks.bench_login --logins 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+# Before the app's settings are imported: the logins must not be rate limited
+os.environ.setdefault("RATE_LIMIT_CALLS", str(10**9))
+os.environ.setdefault("RATE_LIMIT_ROUTES", "{}")
+
+from .common import report, signup_headers
+from .. import main, models, database, passwords
+from ..cache import LRUCache
+
+hasher = passwords.hasher
+
+
+def configure(executor: str, workers: int, cached: bool):
+    hasher.shutdown()
+    hasher.executor_kind = executor
+    hasher.workers = workers
+    hasher.max_pending = 10**6
+    hasher.verified = LRUCache(10_000, 300) if cached else None
+
+
+async def burst(client, users, logins: int, concurrency: int, probe_headers):
+    """Run ``logins`` logins, ``concurrency`` at a time, while probing /users/me"""
+    queue = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(users[i % len(users)])
+    login_samples, probe_samples = [], []
+    done = asyncio.Event()
+
+    async def login_worker():
+        while not queue.empty():
+            credentials = queue.get_nowait()
+            began = time.perf_counter()
+            response = await client.post("/users/login", json=credentials)
+            login_samples.append(time.perf_counter() - began)
+            assert response.status_code == 200, response.text
+
+    async def probe():
+        while not done.is_set():
+            began = time.perf_counter()
+            response = await client.get("/users/me", headers=probe_headers)
+            probe_samples.append(time.perf_counter() - began)
+            assert response.status_code == 200, response.text
+            await asyncio.sleep(0.005)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return login_samples, probe_samples, elapsed
+
+
+async def refresh_burst(client, users, refreshes: int, concurrency: int):
+    """Renew ``refreshes`` sessions, each worker rotating its own refresh token"""
+    samples, remaining = [], [refreshes]
+
+    async def refresh_worker(refresh_token):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            began = time.perf_counter()
+            response = await client.post("/users/refresh", json={"refresh_token": refresh_token})
+            samples.append(time.perf_counter() - began)
+            assert response.status_code == 200, response.text
+            refresh_token = response.json()["refresh_token"]
+
+    logins = [client.post("/users/login", json=users[i % len(users)]) for i in range(concurrency)]
+    refresh_tokens = [response.json()["refresh_token"] for response in await asyncio.gather(*logins)]
+    start = time.perf_counter()
+    await asyncio.gather(*(refresh_worker(token) for token in refresh_tokens))
+    return samples, time.perf_counter() - start
+
+
+async def run(logins: int, concurrency: int, workers: int):
+    configs = [
+        ("thread x40 (request threadpool)", "thread", 40, False),
+        (f"thread x{workers}", "thread", workers, False),
+        (f"process x{workers}", "process", workers, False),
+        (f"process x{workers} + login cache", "process", workers, True),
+    ]
+    transport = httpx.ASGITransport(app=main.app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        configure("process", workers, False)
+        stamp = int(time.time())
+        users = [{"username": f"login_{stamp}_{i}", "password": "benchpass123"} for i in range(concurrency)]
+        await asyncio.gather(*(client.post("/users/signup", json=user) for user in users))
+        probe_headers = await signup_headers(client, f"login_probe_{stamp}")
+        print(f"bcrypt rounds={hasher.rounds}, {logins} logins, concurrency={concurrency}")
+        for label, executor, pool_workers, cached in configs:
+            configure(executor, pool_workers, cached)
+            if cached:
+                await burst(client, users, len(users), concurrency, probe_headers)  # warm the cache
+            login_samples, probe_samples, elapsed = await burst(client, users, logins, concurrency, probe_headers)
+            report(f"login, {label}", login_samples, elapsed)
+            report("  GET /users/me meanwhile", probe_samples, elapsed)
+        samples, elapsed = await refresh_burst(client, users, logins, concurrency)
+        report("refresh (no bcrypt)", samples, elapsed)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="bcrypt pool size")
+    args = parser.parse_args()
+    models.Base.metadata.create_all(bind=database.engine)
+    asyncio.run(run(args.logins, args.concurrency, args.workers))
@@ -0,0 +1,83 @@
+"""Per-request latency and throughput of the middleware stack.
+
+Compares the pure ASGI ``RateLimitMiddleware`` with the same limiter wrapped
+in Starlette's ``BaseHTTPMiddleware`` (the previous implementation), with
+CORS and GZip in place, for ``/health`` and ``/expenses/``::
+
+    python -m expanse_api.benchmarks.bench_middleware --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .common import report, signup_headers
+from .. import database, main, models
+from ..ratelimit import MemoryStore, RateLimiter, client_identity
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    """The pre-ASGI middleware shape, kept here only as the baseline."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request, call_next):
+        identity = client_identity(request.headers.get("authorization"), request.client.host)
+        if await self.limiter.hit(identity, request.url.path):
+            return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded. Too many requests."})
+        return await call_next(request)
+
+
+def use_middleware(middleware_class):
+    limiter = RateLimiter(MemoryStore(), calls=10**9, period=60)
+    for index, middleware in enumerate(main.app.user_middleware):
+        if middleware.cls in (main.RateLimitMiddleware, BaseHTTPRateLimitMiddleware):
+            main.app.user_middleware[index] = type(middleware)(middleware_class, limiter=limiter)
+    main.app.middleware_stack = None
+
+
+async def measure(client, path: str, headers: dict, requests: int, concurrency: int):
+    samples = []
+
+    async def worker(count: int):
+        for _ in range(count):
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+async def run(requests: int, concurrency: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    transport = httpx.ASGITransport(app=main.app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await signup_headers(client, f"bench_{int(time.time())}")
+        for i in range(50):
+            await client.post("/expenses/", json={"amount": i + 0.5, "description": f"expense {i}"}, headers=headers)
+
+        for label, middleware_class in (
+            ("BaseHTTPMiddleware", BaseHTTPRateLimitMiddleware),
+            ("pure ASGI", main.RateLimitMiddleware),
+        ):
+            use_middleware(middleware_class)
+            for path in ("/health", "/expenses/"):
+                await measure(client, path, headers, concurrency, concurrency)  # warm up
+                samples, elapsed = await measure(client, path, headers, requests, concurrency)
+                report(f"{label} GET {path}", samples, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency))
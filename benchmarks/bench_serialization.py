@@ -0,0 +1,123 @@
+"""Time to read and encode one page of expenses as JSON.
+
+Compares the previous path (ORM objects validated through the Pydantic
+response models, encoded with the json module, as FastAPI's JSONResponse
+did) with orjson on the same models, and with the projection reads that
+build response dicts straight from row tuples, including a sparse fieldset::
+
+    python -m expanse_api.benchmarks.bench_serialization --expenses 100000 --page 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+import httpx
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy.orm import joinedload
+
+# Before the app's settings are imported: the HTTP rounds must not be rate limited
+os.environ.setdefault("RATE_LIMIT_CALLS", str(10**9))
+
+from .common import report, seed_expenses, signup_headers, timed
+from .. import crud, database, main, models, schemas
+from ..routers.expenses import ExpenseRowsResponse
+
+expense_list = TypeAdapter(List[schemas.Expense])
+SPARSE_FIELDS = ("amount", "id", "created_at")
+
+
+def orm_expenses(db, user_id: int, page: int):
+    """The previous list read: ORM objects with their categories joined in"""
+    return (
+        db.query(models.Expense)
+        .options(joinedload(models.Expense.category))
+        .filter(models.Expense.user_id == user_id)
+        .order_by(models.Expense.created_at.desc(), models.Expense.id.desc())
+        .limit(page)
+        .all()
+    )
+
+
+def orm_pydantic_json(db, user_id: int, page: int) -> bytes:
+    expenses = orm_expenses(db, user_id, page)
+    return json.dumps(expense_list.dump_python(expense_list.validate_python(expenses), mode="json")).encode()
+
+
+def orm_pydantic_orjson(db, user_id: int, page: int) -> bytes:
+    expenses = orm_expenses(db, user_id, page)
+    return orjson.dumps(expense_list.dump_python(expense_list.validate_python(expenses), mode="json"))
+
+
+def projection_orjson(db, user_id: int, page: int) -> bytes:
+    return ExpenseRowsResponse(crud.get_expense_rows(db, user_id, limit=page)).body
+
+
+def sparse_projection_orjson(db, user_id: int, page: int) -> bytes:
+    return ExpenseRowsResponse(crud.get_expense_rows(db, user_id, limit=page, fields=SPARSE_FIELDS)).body
+
+
+VARIANTS = {
+    "ORM + Pydantic + json (before)": orm_pydantic_json,
+    "ORM + Pydantic + orjson": orm_pydantic_orjson,
+    "projection + orjson": projection_orjson,
+    "projection fields=amount,id,created_at": sparse_projection_orjson,
+}
+
+
+def run_direct(user_id: int, page: int, repeat: int):
+    for label, encode in VARIANTS.items():
+        db = database.SessionLocal()
+        try:
+            samples, size = [], 0
+            start = time.perf_counter()
+            for _ in range(repeat):
+                # A fresh identity map each time, as each request gets
+                db.expunge_all()
+                body, seconds = timed(encode, db, user_id, page)
+                samples.append(seconds)
+                size = len(body)
+            report(f"{label} ({size // 1024} KB)", samples, time.perf_counter() - start)
+        finally:
+            db.close()
+
+
+async def run_http(page: int, repeat: int):
+    transport = httpx.ASGITransport(app=main.app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers = await signup_headers(client, f"serialize_http_{int(time.time())}")
+        expenses = [{"amount": i % 500 + 0.5, "description": f"expense {i}"} for i in range(page)]
+        await client.post("/expenses/bulk", json=expenses, headers=headers)
+        for label, params in [("GET /expenses/", {}), ("GET /expenses/?fields=amount,id,created_at",
+                                                        {"fields": ",".join(SPARSE_FIELDS)})]:
+            samples = []
+            start = time.perf_counter()
+            for _ in range(repeat):
+                began = time.perf_counter()
+                response = await client.get("/expenses/", params={"limit": page, **params}, headers=headers)
+                samples.append(time.perf_counter() - began)
+                assert response.status_code == 200, response.text
+            report(label, samples, time.perf_counter() - start)
+
+
+def run(expenses: int, page: int, repeat: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        user_id = seed_expenses(db, f"serialize_{int(time.time())}", expenses)
+    finally:
+        db.close()
+    run_direct(user_id, page, repeat)
+    asyncio.run(run_http(page, repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--page", type=int, default=1000, help="expenses per page")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.expenses, args.page, args.repeat)
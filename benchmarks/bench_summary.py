@@ -0,0 +1,47 @@
+"""Cost of ``/reports/summary`` for one user with many expenses.
+
+Compares the SQL aggregate (``crud.get_expense_summary``) with loading every
+expense as an ORM object and summing in Python (the previous approach, minus
+its 100-row cap that made it wrong), with and without the category split::
+
+    python -m expanse_api.benchmarks.bench_summary --expenses 1000000
+"""
+import argparse
+from datetime import datetime
+
+from .common import report, seed_expenses, timed
+from .. import crud, database, models
+
+
+def orm_summary(db, user_id: int) -> dict:
+    expenses = db.query(models.Expense).filter(models.Expense.user_id == user_id).all()
+    total = sum(expense.amount for expense in expenses)
+    db.expunge_all()
+    return {"total_expenses": len(expenses), "total_amount": total}
+
+
+def run(expenses: int, repeat: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        (user_id, seconds) = timed(seed_expenses, db, "summary_bench", expenses)
+        print(f"seeded {expenses} expenses in {seconds:.1f}s")
+        for label, fn in (
+            ("ORM load + Python sum", lambda: orm_summary(db, user_id)),
+            ("SQL aggregate", lambda: crud.get_expense_summary(db, user_id)),
+            ("SQL aggregate by_category", lambda: crud.get_expense_summary(db, user_id, by_category=True)),
+            ("SQL aggregate, one-year window", lambda: crud.get_expense_summary(
+                db, user_id, datetime(2020, 1, 1), datetime(2020, 12, 31, 23, 59))),
+        ):
+            samples = [timed(fn)[1] for _ in range(repeat)]
+            report(label, samples, sum(samples))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.expenses, args.repeat)
@@ -0,0 +1,101 @@
+"""Cost of verifying one access token, per algorithm and code path.
+
+HS256 through python-jose as before (secret passed as a string), with the
+prebuilt key, and from the verified-token cache; then asymmetric signatures
+for comparison. python-jose has no EdDSA, so Ed25519 is verified with
+``cryptography`` directly, next to an equally minimal HS256 (``hmac``) to
+separate the signature cost from jose's own overhead::
+
+    python -m expanse_api.benchmarks.bench_tokens --repeat 20000
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jose import jwk, jwt
+
+from .common import report, timed
+from .. import auth
+from ..config import settings
+
+CLAIMS = {"sub": "bench", "uid": 1, "ver": 0}
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def minimal_token(alg: str, sign) -> str:
+    header = b64url(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    payload = b64url(json.dumps({**CLAIMS, "exp": int(time.time()) + 3600}).encode())
+    signing_input = f"{header}.{payload}"
+    return f"{signing_input}.{b64url(sign(signing_input.encode()))}"
+
+
+def minimal_decode(token: str, verify) -> dict:
+    """Verify the signature, then parse and check exp: the least a JWT library can do"""
+    signing_input, _, signature = token.rpartition(".")
+    verify(b64url_decode(signature), signing_input.encode())
+    claims = json.loads(b64url_decode(signing_input.split(".")[1]))
+    if claims["exp"] < time.time():
+        raise ValueError("expired")
+    return claims
+
+
+def variants():
+    secret = settings.SECRET_KEY
+    hs256 = auth.create_access_token(dict(CLAIMS))
+
+    ec_private = ec.generate_private_key(ec.SECP256R1())
+    ec_pem = ec_private.public_key().public_bytes(serialization.Encoding.PEM,
+                                                  serialization.PublicFormat.SubjectPublicKeyInfo)
+    es256 = jwt.encode({**CLAIMS, "exp": int(time.time()) + 3600},
+                       ec_private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                serialization.NoEncryption()).decode(), algorithm="ES256")
+    es256_key = jwk.construct(ec_pem.decode(), "ES256")
+
+    ed_private = ed25519.Ed25519PrivateKey.generate()
+    ed_public = ed_private.public_key()
+    eddsa = minimal_token("EdDSA", ed_private.sign)
+
+    def hmac_verify(signature: bytes, signing_input: bytes):
+        expected = hmac.new(secret.encode(), signing_input, hashlib.sha256).digest()
+        if not hmac.compare_digest(signature, expected):
+            raise ValueError("bad signature")
+    hs256_minimal = minimal_token("HS256", lambda data: hmac.new(secret.encode(), data, hashlib.sha256).digest())
+
+    auth.decode_token(hs256)  # warm the cache
+    return {
+        "jose HS256, secret string (before)": lambda: jwt.decode(hs256, secret, algorithms=["HS256"]),
+        "jose HS256, prebuilt key": lambda: jwt.decode(hs256, auth.signing_key, algorithms=["HS256"]),
+        "auth.decode_token, cache hit": lambda: auth.decode_token(hs256),
+        "jose ES256, prebuilt key": lambda: jwt.decode(es256, es256_key, algorithms=["ES256"]),
+        "minimal HS256 (hmac)": lambda: minimal_decode(hs256_minimal, hmac_verify),
+        "minimal EdDSA (Ed25519)": lambda: minimal_decode(eddsa, lambda sig, data: ed_public.verify(sig, data)),
+    }
+
+
+def run(repeat: int):
+    for label, decode in variants().items():
+        assert decode()["sub"] == "bench"
+        samples = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            samples.append(timed(decode)[1])
+        report(label, samples, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,137 @@
+"""Write latency (p50/p99) and statements per write for expense and category mutations.
+
+Compares the previous read-modify-write pattern (SELECT, change, commit,
+refresh) with the current ``crud`` functions built on INSERT/UPDATE/DELETE
+... RETURNING, one timed call per write::
+
+    python -m expanse_api.benchmarks.bench_writes --writes 2000
+    DATABASE_URL=postgresql+psycopg2://... python -m expanse_api.benchmarks.bench_writes
+
+The statement count includes the roll-up upsert and COMMIT.
+"""
+import argparse
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from .common import report, timed
+from .. import crud, database, models, rollups, schemas
+
+
+def legacy_create_expense(db, user_id, expense):
+    db_expense = models.Expense(**expense.model_dump(), user_id=user_id)
+    db.add(db_expense)
+    db.flush()
+    rollups.RollupDeltas().add_expense(db_expense).apply(db)
+    db.commit()
+    db.refresh(db_expense)
+    return db_expense
+
+
+def legacy_update_expense(db, expense_id, user_id, updated):
+    expense = crud.get_expense(db, expense_id, user_id)
+    if expense:
+        deltas = rollups.RollupDeltas().add_expense(expense, sign=-1)
+        for key, value in updated.model_dump(exclude_unset=True).items():
+            setattr(expense, key, value)
+        deltas.add_expense(expense).apply(db)
+        db.commit()
+        db.refresh(expense)
+    return expense
+
+
+def legacy_delete_expense(db, expense_id, user_id):
+    expense = crud.get_expense(db, expense_id, user_id)
+    if expense:
+        rollups.RollupDeltas().add_expense(expense, sign=-1).apply(db)
+        db.delete(expense)
+        db.commit()
+    return expense
+
+
+def legacy_update_category(db, category_id, user_id, category_update):
+    category = crud.get_category(db, category_id, user_id)
+    if category:
+        for key, value in category_update.model_dump(exclude_unset=True).items():
+            setattr(category, key, value)
+        db.commit()
+        db.refresh(category)
+    return category
+
+
+IMPLEMENTATIONS = {
+    "legacy": (legacy_create_expense, legacy_update_expense, legacy_delete_expense, legacy_update_category),
+    "returning": (crud.create_expense, crud.update_expense, crud.delete_expense, crud.update_category),
+}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.executed)
+        event.listen(engine, "commit", self.executed)
+
+    def executed(self, *args):
+        self.count += 1
+
+
+def measure(label: str, counter: StatementCounter, calls):
+    """Time each call separately and report latency and statements per call"""
+    samples = []
+    before = counter.count
+    start = time.perf_counter()
+    for fn, args in calls:
+        samples.append(timed(fn, *args)[1])
+    report(label, samples, time.perf_counter() - start)
+    print(f"{'':<40} {(counter.count - before) / len(samples):.1f} statements per write")
+
+
+def run(writes: int):
+    models.Base.metadata.create_all(bind=database.engine)
+    counter = StatementCounter(database.engine)
+    stamp = int(time.time())
+    for name, (create, update, delete, update_category) in IMPLEMENTATIONS.items():
+        # The legacy pattern ran with the default expire_on_commit=True
+        session_factory = sessionmaker(bind=database.engine, autoflush=False, expire_on_commit=(name == "legacy"))
+        db = session_factory()
+        try:
+            user_id = crud.create_user(db, schemas.UserCreate(username=f"writes_{name}_{stamp}", password="x"),
+                                       "not-a-hash").id
+            category_ids = [
+                crud.create_category(db, schemas.CategoryCreate(name=f"category {i}"), user_id).id for i in range(10)
+            ]
+            created = []
+
+            def create_one(i):
+                expense = schemas.ExpenseCreate(amount=i % 500 + 0.5, description=f"write {i}",
+                                                category_id=category_ids[i % 10])
+                created.append(create(db, user_id, expense).id)
+
+            measure(f"{name}: create expense", counter, [(create_one, (i,)) for i in range(writes)])
+            measure(f"{name}: update expense description", counter, [
+                (update, (db, expense_id, user_id, schemas.ExpenseUpdate(description="edited")))
+                for expense_id in created
+            ])
+            measure(f"{name}: update expense amount", counter, [
+                (update, (db, expense_id, user_id,
+                          schemas.ExpenseUpdate(amount=i % 7 + 1.0, category_id=category_ids[(i + 1) % 10])))
+                for i, expense_id in enumerate(created)
+            ])
+            measure(f"{name}: update category", counter, [
+                (update_category, (db, category_ids[i % 10], user_id, schemas.CategoryBase(name=f"renamed {i}")))
+                for i in range(writes)
+            ])
+            measure(f"{name}: delete expense", counter, [
+                (delete, (db, expense_id, user_id)) for expense_id in created
+            ])
+            assert rollups.verify(db, user_id) == []
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000, help="writes per operation")
+    args = parser.parse_args()
+    run(args.writes)
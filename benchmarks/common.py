@@ -0,0 +1,78 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks are run as modules from the directory above the project, e.g.
+``python -m expanse_api.benchmarks.bench_middleware``. They use a throwaway
+SQLite database unless DATABASE_URL is set (e.g. to a Postgres instance).
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DB = os.path.join(tempfile.gettempdir(), "expense_bench.db")
+
+# Must run before the app's settings are imported
+if "DATABASE_URL" not in os.environ:
+    if os.path.exists(BENCH_DB):
+        os.remove(BENCH_DB)
+    os.environ["DATABASE_URL"] = f"sqlite:///{BENCH_DB}"
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label: str, samples, elapsed: float):
+    """Print one result row: latency percentiles in ms and throughput."""
+    print(
+        f"{label:<40} n={len(samples):<7} "
+        f"p50={percentile(samples, 50) * 1000:8.3f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.3f}ms "
+        f"mean={statistics.fmean(samples) * 1000:8.3f}ms "
+        f"{len(samples) / elapsed:10.1f}/s"
+    )
+
+
+def timed(fn, *args, **kwargs):
+    """Call ``fn`` and return ``(result, seconds)``."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def seed_expenses(db, username: str, expenses: int, categories: int = 10, batch: int = 50_000) -> int:
+    """Create a user with ``expenses`` random expenses via bulk INSERTs; returns the user id."""
+    from .. import crud, models, schemas
+
+    user = crud.create_user(db, schemas.UserCreate(username=username, password="x"), "not-a-hash")
+    category_ids = [
+        crud.create_category(db, schemas.CategoryCreate(name=f"category {i}"), user.id).id
+        for i in range(categories)
+    ] + [None]
+    start = datetime(2020, 1, 1)
+    rng = random.Random(0)
+    table = models.Expense.__table__
+    for offset in range(0, expenses, batch):
+        db.execute(table.insert(), [
+            {
+                "user_id": user.id,
+                "amount": round(rng.uniform(1, 500), 2),
+                "description": f"expense {i}",
+                "category_id": rng.choice(category_ids),
+                "created_at": start + timedelta(minutes=i),
+            }
+            for i in range(offset, min(offset + batch, expenses))
+        ])
+    db.commit()
+    return user.id
+
+
+async def signup_headers(client, username: str, password: str = "benchpass123") -> dict:
+    """Create a user through the API and return bearer headers."""
+    credentials = {"username": username, "password": password}
+    await client.post("/users/signup", json=credentials)
+    response = await client.post("/users/login", json=credentials)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+try:
+    from redis import RedisError
+except ImportError:  # redis is only required when CACHE_BACKEND is "redis"
+    RedisError = OSError
+
+
+class LRUCache:
+    """Process-local LRU cache whose entries expire after ``ttl`` seconds."""
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # Async interface shared with RedisCache; nothing here waits on I/O
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    """Shared cache on any Redis-protocol client, storing JSON values under ``namespace``.
+
+    Redis errors are treated as misses so an unavailable cache only costs the DB lookup.
+    Nothing waits on Redis on the event loop: async code uses ``aget``/``aset``/
+    ``adelete``, and sync calls made inside ``AsyncSession.run_sync`` (crud in
+    DB_ASYNC mode) are awaited on ``async_client`` the way the async driver's
+    queries are. Without an ``async_client``, the async methods run the sync
+    client in the threadpool.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, namespace: str, ttl: float = 300, async_client=None):
+        self.client = client
+        self.async_client = async_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _command(self, name: str, *args, **kwargs):
+        if self.async_client is not None and in_greenlet():
+            return await_only(getattr(self.async_client, name)(*args, **kwargs))
+        return getattr(self.client, name)(*args, **kwargs)
+
+    async def _acommand(self, name: str, *args, **kwargs):
+        if self.async_client is not None:
+            return await getattr(self.async_client, name)(*args, **kwargs)
+        return await run_in_threadpool(getattr(self.client, name), *args, **kwargs)
+
+    def _loaded(self, raw) -> Optional[Any]:
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def _px(self, ttl: Optional[float]) -> int:
+        return int((self.ttl if ttl is None else ttl) * 1000)
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._command("get", self._key(key))
+        except RedisError:
+            raw = None
+        return self._loaded(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self._command("set", self._key(key), json.dumps(value), px=self._px(ttl))
+        except RedisError:
+            pass
+
+    def delete(self, key: str):
+        try:
+            self._command("delete", self._key(key))
+        except RedisError:
+            pass
+
+    async def aget(self, key: str) -> Optional[Any]:
+        try:
+            raw = await self._acommand("get", self._key(key))
+        except RedisError:
+            raw = None
+        return self._loaded(raw)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            await self._acommand("set", self._key(key), json.dumps(value), px=self._px(ttl))
+        except RedisError:
+            pass
+
+    async def adelete(self, key: str):
+        try:
+            await self._acommand("delete", self._key(key))
+        except RedisError:
+            pass
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self._key("*")):
+            self.client.delete(key)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+
+_redis_client = None
+_async_redis_client = None
+
+
+def get_redis():
+    """Return the process-wide Redis client for ``settings.REDIS_URL``."""
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def get_async_redis():
+    """Return the process-wide ``redis.asyncio`` client for ``settings.REDIS_URL``."""
+    global _async_redis_client
+    if _async_redis_client is None:
+        import redis.asyncio
+
+        _async_redis_client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+    return _async_redis_client
+
+
+def build_cache(namespace: str, maxsize: int, ttl: float):
+    """Create a cache for ``namespace`` on the backend selected by ``settings.CACHE_BACKEND``."""
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(get_redis(), namespace, ttl, get_async_redis())
+    return LRUCache(maxsize, ttl)
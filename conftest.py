@@ -1,13 +1,19 @@
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from main import app
+from main import app, limiter
 from database import get_db, Base
 from config import settings
+import auth
+import crud
 import models
+import passwords
+import schemas
 
 # Test database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -17,7 +23,7 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 def override_get_db():
     try:
@@ -51,6 +57,82 @@ def client():
     with TestClient(app) as test_client:
         yield test_client
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    auth.user_cache.clear()
+    auth.token_cache.clear()
+    auth.revoked_tokens.clear()
+    crud.category_cache.clear()
+    limiter.store.clear()
+    if passwords.hasher.verified is not None:
+        passwords.hasher.verified.clear()
+    yield
+
+class QueryCounter:
+    """The SQL statements run on an engine (including its test connections) while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def kinds(self) -> list:
+        """First keyword of each statement, e.g. ["SELECT", "INSERT"]"""
+        return [statement.split(None, 1)[0].upper() for statement in self.statements]
+
+class BlockingRedis:
+    """A sync Redis client for caches that must not block on it: any use fails"""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"blocking Redis call: {name}")
+
+@pytest.fixture
+def assert_num_queries(db_engine):
+    """``with assert_num_queries(n) as queries:`` fails unless exactly n statements ran"""
+    @contextmanager
+    def _assert(expected):
+        with QueryCounter(db_engine) as queries:
+            yield queries
+        assert queries.count == expected, (
+            f"expected {expected} queries, ran {queries.count}:\n" + "\n".join(queries.statements)
+        )
+    return _assert
+
+@pytest.fixture
+def make_user(db_session):
+    """Create a user on the test session (password not hashed), returning the row"""
+    def _make(username):
+        return crud.create_user(db_session, schemas.UserCreate(username=username, password="testpass123"),
+                                "not-a-hash")
+    return _make
+
+@pytest.fixture
+def make_auth_headers(client, db_engine):
+    """Sign up and log in a user, returning bearer headers"""
+    def _make(username, password="testpass123"):
+        credentials = {"username": username, "password": password}
+        client.post("/users/signup", json=credentials)
+        token = client.post("/users/login", json=credentials).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    yield _make
+    with db_engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
 @pytest.fixture
 def test_user_data():
     return {
@@ -1,74 +1,573 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, extract, and_
-from typing import Optional, List, Dict
-from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
+from pydantic import ValidationError
+from sqlalchemy import func, and_, delete, insert, literal, select, tuple_, update
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, List, Dict, Sequence, Tuple
+from datetime import datetime, timedelta, timezone
+import base64
 import calendar
-from . import models, schemas, auth
+import csv
+import hashlib
+import io
+import itertools
+import json
+import uuid
+from collections import defaultdict
+import orjson
+from . import models, schemas, auth, rollups
+from .cache import build_cache
+from .config import settings
 
+# How expenses without a category appear in reports and exports
+UNCATEGORIZED_NAME = "Uncategorized"
+UNCATEGORIZED_COLOR = "#9CA3AF"
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_pw = auth.get_password_hash(user.password)  # Use get_password_hash
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    hashed_pw = hashed_password or auth.get_password_hash(user.password)  # Use get_password_hash
     db_user = models.User(username=user.username, hashed_password=hashed_pw)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    auth.invalidate_user(db_user.username)
     return db_user
 
 def authenticate_user(db: Session, username: str, password: str):
     db_user = db.query(models.User).filter(models.User.username == username).first()
-    if not db_user or not auth.verify_password(password, db_user.hashed_password):
+    if not db_user:
         return None
+    valid, new_hash = auth.pwd_context.verify_and_update(password, db_user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        set_password_hash(db, db_user.id, new_hash)
     return db_user
 
+def set_password_hash(db: Session, user_id: int, hashed_password: str):
+    """Store a rehashed password (e.g. after PASSWORD_BCRYPT_ROUNDS changed)"""
+    db.execute(update(models.User).where(models.User.id == user_id).values(hashed_password=hashed_password))
+    db.commit()
+
+def create_refresh_token(db: Session, user_id: int, token_hash: str, expires_at: datetime,
+                         family_id: Optional[str] = None):
+    """Store a new refresh token; a new family per login, the old one's when rotating"""
+    now = datetime.now(timezone.utc)
+    # The user's expired tokens are no use to anyone: drop them while here
+    db.execute(delete(models.RefreshToken)
+               .where(models.RefreshToken.user_id == user_id, models.RefreshToken.expires_at <= now)
+               .execution_options(synchronize_session=False))
+    db.execute(insert(models.RefreshToken).values(
+        token_hash=token_hash, user_id=user_id, family_id=family_id or uuid.uuid4().hex, expires_at=expires_at,
+    ))
+    db.commit()
+
+def rotate_refresh_token(db: Session, token_hash: str, new_hash: str, expires_at: datetime) -> Optional[models.User]:
+    """Exchange a refresh token for a new one in the same family, returning its user.
+
+    Each token works once: the UPDATE claims it, so of two concurrent
+    exchanges only one succeeds. Presenting a token that was already used
+    means it was copied, so its whole family is revoked. Returns None for
+    unknown, expired or used tokens.
+    """
+    tokens = models.RefreshToken
+    now = datetime.now(timezone.utc)
+    claimed = db.execute(
+        update(tokens)
+        .where(tokens.token_hash == token_hash, tokens.used_at.is_(None), tokens.expires_at > now)
+        .values(used_at=now)
+        .returning(tokens.user_id, tokens.family_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if claimed is None:
+        reused = db.scalar(select(tokens.family_id)
+                           .where(tokens.token_hash == token_hash, tokens.used_at.is_not(None)))
+        if reused is not None:
+            revoke_refresh_tokens(db, tokens.family_id == reused)
+        db.commit()
+        return None
+    db.execute(insert(tokens).values(token_hash=new_hash, user_id=claimed.user_id, family_id=claimed.family_id,
+                                     expires_at=expires_at))
+    user = db.get(models.User, claimed.user_id)
+    db.commit()
+    return user
+
+def revoke_refresh_tokens(db: Session, *clauses):
+    """Mark the matching unused refresh tokens used (not committed)"""
+    db.execute(update(models.RefreshToken).where(models.RefreshToken.used_at.is_(None), *clauses)
+               .values(used_at=datetime.now(timezone.utc)).execution_options(synchronize_session=False))
+
+def logout(db: Session, user_id: int, jti: Optional[str], expires_at: datetime,
+           refresh_token_hash: Optional[str] = None):
+    """Revoke one access token (by jti) and, if given, the refresh token family it came with"""
+    if jti:
+        # Rows for tokens that have expired anyway are dropped as new ones come in
+        db.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at <= datetime.now(timezone.utc))
+                   .execution_options(synchronize_session=False))
+        db.execute(insert(models.RevokedToken).values(jti=jti, expires_at=expires_at))
+    if refresh_token_hash:
+        family = select(models.RefreshToken.family_id).where(
+            models.RefreshToken.token_hash == refresh_token_hash, models.RefreshToken.user_id == user_id
+        ).scalar_subquery()
+        revoke_refresh_tokens(db, models.RefreshToken.family_id == family)
+    db.commit()
+
+def revoke_user_tokens(db: Session, user_id: int):
+    """Log a user out everywhere: bump their token version and revoke all their refresh tokens.
+
+    The new version is also recorded in revoked_tokens until every token
+    issued before it has expired, so other workers, whose cached identity
+    still holds the old version, pick the revocation up on their next sync.
+    """
+    users = models.User.__table__
+    username, version = db.execute(users.update().where(users.c.id == user_id)
+                                   .values(token_version=users.c.token_version + 1)
+                                   .returning(users.c.username, users.c.token_version)).one()
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    db.execute(insert(models.RevokedToken).values(user_id=user_id, token_version=version, expires_at=expires_at))
+    revoke_refresh_tokens(db, models.RefreshToken.user_id == user_id)
+    db.commit()
+    auth.invalidate_user(username)  # the cached identity holds the old token version
+    auth.revoked_tokens.add_user(user_id, version, expires_at)
+
+def get_revoked_tokens(db: Session) -> List[Tuple[Optional[str], Optional[int], Optional[int], datetime]]:
+    """Every unexpired revocation, as (jti, user_id, token_version, expires_at)"""
+    revoked = models.RevokedToken
+    return db.execute(
+        select(revoked.jti, revoked.user_id, revoked.token_version, revoked.expires_at)
+        .where(revoked.expires_at > datetime.now(timezone.utc))
+    ).all()
+
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
+def bump_data_version(db: Session, user_id: int):
+    """Record that the user's expenses or categories changed, which changes
+    their ETags; call inside the write's transaction so both commit together"""
+    users = models.User.__table__
+    db.execute(users.update().where(users.c.id == user_id).values(data_version=users.c.data_version + 1))
+
+def get_data_version(db: Session, user_id: int) -> int:
+    return db.scalar(select(models.User.data_version).where(models.User.id == user_id))
+
+# Expense.category is lazy="raise": reads that return expenses with their
+# category load it explicitly, writes with one SELECT after the RETURNING
+EXPENSE_CATEGORY = selectinload(models.Expense.category)
+
 def create_expense(db: Session, user_id: int, expense: schemas.ExpenseCreate):
-    db_expense = models.Expense(**expense.dict(), user_id=user_id)
-    db.add(db_expense)
+    # INSERT ... RETURNING loads the new row without a refresh
+    stmt = insert(models.Expense).values(**expense.dict(), user_id=user_id).returning(models.Expense)
+    db_expense = db.scalars(select(models.Expense).from_statement(stmt).options(EXPENSE_CATEGORY)).one()
+    rollups.RollupDeltas().add_expense(db_expense).apply(db)
+    bump_data_version(db, user_id)
     db.commit()
-    db.refresh(db_expense)
     return db_expense
 
 def get_expense(db: Session, expense_id: int, user_id: int):
-    return db.query(models.Expense).filter(
+    return db.query(models.Expense).options(joinedload(models.Expense.category)).filter(
         models.Expense.id == expense_id,
         models.Expense.user_id == user_id
     ).first()
 
-def get_expenses(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+def expense_filters(user_id: int, filters: Optional[schemas.ExpenseFilter] = None) -> list:
+    """WHERE clauses for a user's expenses narrowed by ``filters``"""
+    clauses = [models.Expense.user_id == user_id]
+    if filters is None:
+        return clauses
+    if filters.start_date:
+        clauses.append(models.Expense.created_at >= filters.start_date)
+    if filters.end_date:
+        clauses.append(models.Expense.created_at <= filters.end_date)
+    if filters.category_id is not None:
+        clauses.append(models.Expense.category_id == filters.category_id)
+    if filters.min_amount is not None:
+        clauses.append(models.Expense.amount >= filters.min_amount)
+    if filters.max_amount is not None:
+        clauses.append(models.Expense.amount <= filters.max_amount)
+    return clauses
+
+def encode_cursor(created_at: datetime, expense_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), expense_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        created_at, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(expense_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+def after_cursor(cursor: str):
+    """Keyset condition: rows after ``cursor`` in newest-first order, seeking
+    past the last row of the previous page instead of counting an offset"""
+    created_at, expense_id = decode_cursor(cursor)
+    return (
+        tuple_(models.Expense.created_at, models.Expense.id)
+        < tuple_(literal(created_at, models.Expense.created_at.type), expense_id)
+    )
+
+# Response fields of an expense and its nested category, in schema order;
+# "category" (last) stands for the nested object
+EXPENSE_FIELDS = tuple(schemas.Expense.model_fields)
+CATEGORY_FIELDS = tuple(schemas.Category.model_fields)
+
+def expense_rows_query(user_id: int, filters: Optional[schemas.ExpenseFilter] = None,
+                       fields: Sequence[str] = EXPENSE_FIELDS):
+    """SELECT of just the columns behind ``fields`` (EXPENSE_FIELDS names) for a
+    user's expenses, newest first.
+
+    Rows hold the expense columns in ``fields`` order, then created_at and id
+    for the keyset cursor, then (when "category" is requested) the category
+    id to attach the category by.
+    """
+    expense = models.Expense
+    columns = [getattr(expense, name) for name in fields if name != "category"]
+    query = select(*columns)
+    # Labelled, so select() keeps them even when the same columns were requested
+    query = query.add_columns(expense.created_at.label("cursor_created_at"), expense.id.label("cursor_id"))
+    if "category" in fields:
+        # Attached from the user's cached categories by expense_row_dicts, not joined
+        query = query.add_columns(expense.category_id.label("ref_category_id"))
+    return (
+        query.where(*expense_filters(user_id, filters))
+        .order_by(expense.created_at.desc(), expense.id.desc())
+    )
+
+def expense_row_dicts(rows, fields: Sequence[str] = EXPENSE_FIELDS,
+                      categories: Optional[Dict[int, dict]] = None) -> List[dict]:
+    """Response dicts from ``expense_rows_query`` rows, keyed (and ordered) like
+    schemas.Expense narrowed to ``fields``; no ORM objects or model validation.
+    The nested category comes from ``categories`` (see get_category_map)."""
+    names = [name for name in fields if name != "category"]
+    if "category" not in fields:
+        return [dict(zip(names, row)) for row in rows]
+    items = []
+    for row in rows:
+        item = dict(zip(names, row))
+        item["category"] = categories.get(row.ref_category_id) if row.ref_category_id is not None else None
+        items.append(item)
+    return items
+
+def row_categories(db: Session, user_id: int, rows, fields: Sequence[str],
+                   version: Optional[int] = None) -> Optional[Dict[int, dict]]:
+    """The categories to attach to ``rows`` as of data ``version``; re-checked against the
+    current version if any is missing (created, with its expenses, since ``version`` was read)"""
+    if "category" not in fields:
+        return None
+    categories = get_category_map(db, user_id, version)
+    if version is not None and any(row.ref_category_id is not None and row.ref_category_id not in categories
+                                   for row in rows):
+        categories = get_category_map(db, user_id)
+    return categories
+
+def get_expense_rows(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                     filters: Optional[schemas.ExpenseFilter] = None,
+                     fields: Sequence[str] = EXPENSE_FIELDS, version: Optional[int] = None) -> List[dict]:
+    """A user's expenses, newest first, as response dicts of ``fields`` read as column projections.
+    ``version`` is the user's data version, when the caller has read it already (see get_category_map)"""
+    rows = db.execute(expense_rows_query(user_id, filters, fields).offset(skip).limit(limit)).all()
+    return expense_row_dicts(rows, fields, row_categories(db, user_id, rows, fields, version))
+
+def get_expense_rows_page(db: Session, user_id: int, limit: int = 100, cursor: Optional[str] = None,
+                          filters: Optional[schemas.ExpenseFilter] = None,
+                          fields: Sequence[str] = EXPENSE_FIELDS,
+                          version: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
+    """Keyset page of get_expense_rows, seeking past ``cursor``; returns (items, next_cursor)"""
+    query = expense_rows_query(user_id, filters, fields)
+    if cursor:
+        query = query.where(after_cursor(cursor))
+    rows = db.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].cursor_created_at, rows[-1].cursor_id)
+    return expense_row_dicts(rows, fields, row_categories(db, user_id, rows, fields, version)), next_cursor
+
+def updated_rows(db: Session, stmt, *columns, options: Sequence = ()):
+    """Run ``stmt`` (an UPDATE) with RETURNING ``columns``, loading returned
+    entities over any copy already in the session, whose stale attributes
+    would otherwise be kept; ``options`` are loader options for them."""
+    return db.execute(
+        select(*columns).from_statement(stmt.returning(*columns)).options(*options)
+        .execution_options(populate_existing=True)
+    )
+
+def locked_pre_image(where: Sequence):
+    """CTE of the id, old_amount and old_category_id of the expenses matching ``where``.
+
+    For PostgreSQL UPDATE ... FROM it ... RETURNING: FOR UPDATE makes the
+    pre-image wait for, and then see, any concurrent update of those rows.
+    """
+    expense = models.Expense
     return (
-        db.query(models.Expense)
-        .filter(models.Expense.user_id == user_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
+        select(expense.id, expense.amount.label("old_amount"), expense.category_id.label("old_category_id"))
+        .where(*where)
+        .with_for_update()
+        .cte("old")
     )
 
 def update_expense(db: Session, expense_id: int, user_id: int, updated: schemas.ExpenseUpdate):
-    expense = get_expense(db, expense_id, user_id)
-    if expense:
-        for key, value in updated.dict(exclude_unset=True).items():
-            setattr(expense, key, value)
-        db.commit()
-        db.refresh(expense)
-    return expense
+    """Apply ``updated`` with one UPDATE ... RETURNING scoped to the user; None if not theirs.
+
+    Changing the amount or category moves the expense between roll-ups, which
+    needs its old values: PostgreSQL returns them from the same statement,
+    other databases (SQLite can only return the updated table) read them first.
+    """
+    changes = updated.dict(exclude_unset=True)
+    if not changes:
+        return get_expense(db, expense_id, user_id)
+    expense = models.Expense
+    where = [expense.id == expense_id, expense.user_id == user_id]
+    stmt = update(expense).values(**changes)
+    deltas = rollups.RollupDeltas()
+    if not changes.keys() & {"amount", "category_id"}:
+        db_expense = updated_rows(db, stmt.where(*where), expense, options=[EXPENSE_CATEGORY]).scalar_one_or_none()
+    elif db.get_bind().dialect.name == "postgresql":
+        old = locked_pre_image(where)
+        row = updated_rows(
+            db, stmt.where(expense.id == old.c.id), expense, old.c.old_amount, old.c.old_category_id,
+            options=[EXPENSE_CATEGORY],
+        ).one_or_none()
+        db_expense = None
+        if row:
+            db_expense, old_amount, old_category_id = row
+            created_at = db_expense.created_at
+            deltas.add(user_id, created_at.year, created_at.month, old_category_id, -old_amount, -1)
+            deltas.add_expense(db_expense)
+    else:
+        deltas.change_matching(db, where, changes)
+        db_expense = updated_rows(db, stmt.where(*where), expense, options=[EXPENSE_CATEGORY]).scalar_one_or_none()
+    if db_expense is None:
+        return None
+    deltas.apply(db)
+    bump_data_version(db, user_id)
+    db.commit()
+    return db_expense
 
 def delete_expense(db: Session, expense_id: int, user_id: int):
-    expense = get_expense(db, expense_id, user_id)
-    if expense:
-        db.delete(expense)
+    """Delete with one DELETE ... RETURNING scoped to the user.
+
+    Returns the deleted row's ``user_id``, ``amount``, ``category_id`` and
+    ``created_at`` (enough to adjust its roll-up), or None if not theirs.
+    """
+    expense = models.Expense
+    deleted = db.execute(
+        delete(expense)
+        .where(expense.id == expense_id, expense.user_id == user_id)
+        .returning(expense.user_id, expense.amount, expense.category_id, expense.created_at)
+    ).one_or_none()
+    if deleted is None:
+        return None
+    rollups.RollupDeltas().add_expense(deleted, sign=-1).apply(db)
+    bump_data_version(db, user_id)
+    db.commit()
+    return deleted
+
+# CSV import headers (case-insensitive) and the ExpenseImport fields they fill
+IMPORT_COLUMNS = {
+    "amount": "amount",
+    "description": "description",
+    "category_id": "category_id",
+    "created_at": "created_at",
+    "date": "created_at",
+}
+
+def read_expense_csv(file: BinaryIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, fields) per CSV row, reading ``file`` incrementally.
+
+    Columns are matched by IMPORT_COLUMNS; others (e.g. an export's ID and
+    Category) are ignored and empty cells are left out.
+    """
+    reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    header = next(reader, [])
+    fields = [IMPORT_COLUMNS.get(name.strip().lower()) for name in header]
+    for row in reader:
+        if not any(row):
+            continue
+        yield reader.line_num, {field: value for field, value in zip(fields, row) if field and value != ""}
+
+def validation_messages(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors()]
+
+def as_utc(moment: datetime) -> datetime:
+    """``moment`` converted to UTC; naive timestamps are taken to be in UTC already"""
+    return moment.astimezone(timezone.utc) if moment.tzinfo else moment
+
+def import_expenses(db: Session, user_id: int, rows: Iterable[Tuple[int, Dict[str, Any]]],
+                    batch_size: int = 1000, atomic: bool = False, max_errors: int = 100) -> schemas.BulkResult:
+    """Validate and insert (row number, fields) pairs in batches, in one transaction.
+
+    Each batch is validated, its category ids are checked against the user's
+    cached categories (see missing_categories), and the valid rows are
+    inserted with a single executemany. Invalid rows are reported instead of
+    inserted; with ``atomic`` any invalid row rolls the whole import back.
+    Timestamps with a time zone are stored, and counted in roll-ups, in UTC.
+    """
+    created, failed, errors = 0, 0, []
+    deltas = rollups.RollupDeltas()
+    now = datetime.now(timezone.utc)
+    
+    def reject(row_number: int, messages: List[str]):
+        nonlocal failed
+        failed += 1
+        if len(errors) < max_errors:
+            errors.append(schemas.RowError(row=row_number, errors=messages))
+    
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        valid = []
+        for row_number, data in batch:
+            try:
+                valid.append((row_number, schemas.ExpenseImport.model_validate(data)))
+            except ValidationError as exc:
+                reject(row_number, validation_messages(exc))
+        
+        unknown = missing_categories(db, user_id, (expense.category_id for _, expense in valid))
+        
+        values = []
+        for row_number, expense in valid:
+            if expense.category_id in unknown:
+                reject(row_number, ["category_id: Category not found"])
+                continue
+            created_at = as_utc(expense.created_at) if expense.created_at else now
+            values.append({**expense.model_dump(), "user_id": user_id, "created_at": created_at})
+        if values:
+            db.execute(insert(models.Expense.__table__), values)
+            for value in values:
+                deltas.add(user_id, value["created_at"].year, value["created_at"].month,
+                           value["category_id"], value["amount"], 1)
+            created += len(values)
+    
+    if atomic and failed:
+        db.rollback()
+        created = 0
+    else:
+        deltas.apply(db)
+        if created:
+            bump_data_version(db, user_id)
         db.commit()
-    return expense
+    return schemas.BulkResult(created=created, failed=failed, errors=errors)
+
+def selection_batches(user_id: int, selection: schemas.ExpenseSelection, batch_size: int = 1000) -> Iterator[list]:
+    """WHERE clauses per batch: id lists are split into batches, a pure filter is one batch"""
+    clauses = expense_filters(user_id, selection.filters)
+    if selection.ids is None:
+        yield clauses
+        return
+    ids = sorted(set(selection.ids))
+    for start in range(0, len(ids), batch_size):
+        yield clauses + [models.Expense.id.in_(ids[start:start + batch_size])]
+
+def update_expenses(db: Session, user_id: int, selection: schemas.ExpenseSelection,
+                    changes: schemas.ExpenseUpdate, batch_size: int = 1000) -> int:
+    """Apply ``changes`` to the user's selected expenses with one UPDATE per batch; returns the row count.
+
+    Roll-ups move by the rows actually updated: PostgreSQL returns their old
+    values from the UPDATE itself (see update_expense); elsewhere they are
+    aggregated just before it.
+    """
+    values = changes.model_dump(exclude_unset=True)
+    if not values:
+        return 0
+    expense = models.Expense
+    moves_rollups = "amount" in values or "category_id" in values
+    returns_pre_image = moves_rollups and db.get_bind().dialect.name == "postgresql"
+    deltas = rollups.RollupDeltas()
+    affected = 0
+    for clauses in selection_batches(user_id, selection, batch_size):
+        stmt = update(expense).values(**values).execution_options(synchronize_session=False)
+        if returns_pre_image:
+            old = locked_pre_image(clauses)
+            rows = db.execute(
+                stmt.where(expense.id == old.c.id)
+                .returning(expense.user_id, expense.amount, expense.category_id, expense.created_at,
+                           old.c.old_amount, old.c.old_category_id)
+            ).all()
+            for row in rows:
+                deltas.add(row.user_id, row.created_at.year, row.created_at.month, row.old_category_id,
+                           -row.old_amount, -1)
+                deltas.add_expense(row)
+            affected += len(rows)
+        else:
+            if moves_rollups:
+                deltas.change_matching(db, clauses, values)
+            affected += db.execute(stmt.where(*clauses)).rowcount
+    deltas.apply(db)
+    if affected:
+        bump_data_version(db, user_id)
+    db.commit()
+    return affected
+
+def delete_expenses(db: Session, user_id: int, selection: schemas.ExpenseSelection, batch_size: int = 1000) -> int:
+    """Delete the user's selected expenses with one DELETE ... RETURNING per batch; returns the row count.
+
+    Roll-ups are adjusted by the returned rows (as in delete_expense), so
+    they match what was deleted even when other writes commit meanwhile.
+    """
+    expense = models.Expense
+    deltas = rollups.RollupDeltas()
+    affected = 0
+    for clauses in selection_batches(user_id, selection, batch_size):
+        deleted = db.execute(
+            delete(expense).where(*clauses)
+            .returning(expense.user_id, expense.amount, expense.category_id, expense.created_at)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for row in deleted:
+            deltas.add_expense(row, sign=-1)
+        affected += len(deleted)
+    deltas.apply(db)
+    if affected:
+        bump_data_version(db, user_id)
+    db.commit()
+    return affected
+
+# User id -> the user's categories as JSON-ready response dicts, with the users.data_version
+# they were read at; dropped on every category write
+category_cache = build_cache("category", settings.CATEGORY_CACHE_MAX_SIZE, settings.CATEGORY_CACHE_TTL_SECONDS)
+
+def get_category_map(db: Session, user_id: int, version: Optional[int] = None) -> Dict[int, dict]:
+    """The user's categories as {id: schemas.Category dict}, from category_cache.
+
+    Every category write bumps the user's data version, so an entry read at
+    an older version than ``version`` (by default read now) is out of date,
+    e.g. after a write through another worker, and is re-read.
+    """
+    if version is None:
+        version = get_data_version(db, user_id)
+    cached = category_cache.get(str(user_id))
+    if cached is not None and cached["version"] >= version:
+        categories = cached["categories"]
+    else:
+        # Read after the version, so the entry is never older than the version it is stored with
+        rows = db.execute(select(*(getattr(models.Category, name) for name in CATEGORY_FIELDS))
+                          .where(models.Category.user_id == user_id)).all()
+        # Stored as the response encodes them (e.g. created_at as a string), so Redis can hold them
+        categories = orjson.loads(orjson.dumps([dict(zip(CATEGORY_FIELDS, row)) for row in rows],
+                                               option=orjson.OPT_UTC_Z))
+        category_cache.set(str(user_id), {"version": version, "categories": categories})
+    return {category["id"]: category for category in categories}
+
+def missing_categories(db: Session, user_id: int, category_ids: Iterable[Optional[int]]) -> set:
+    """The ids among ``category_ids`` that are not the user's categories, checked against
+    their cached categories as of their current data version"""
+    missing = {category_id for category_id in category_ids if category_id is not None}
+    if missing:
+        missing.difference_update(get_category_map(db, user_id))
+    return missing
+
+def invalidate_categories(user_id: int):
+    category_cache.delete(str(user_id))
 
 def create_category(db: Session, category: schemas.CategoryCreate, user_id: int):
-    db_category = models.Category(**category.dict(), user_id=user_id)
-    db.add(db_category)
+    db_category = db.scalars(
+        insert(models.Category).values(**category.dict(), user_id=user_id).returning(models.Category)
+    ).one()
+    bump_data_version(db, user_id)
     db.commit()
-    db.refresh(db_category)
+    invalidate_categories(user_id)
     return db_category
 
 def get_categories(db: Session, user_id: int):
@@ -83,113 +582,166 @@ def get_category(db: Session, category_id: int, user_id: int):
     ).first()
 
 def update_category(db: Session, category_id: int, user_id: int, category_update: schemas.CategoryBase):
-    """Update a category"""
-    category = get_category(db, category_id, user_id)
+    """Update a category with one UPDATE ... RETURNING scoped to the user; None if not theirs"""
+    changes = category_update.dict(exclude_unset=True)
+    if not changes:
+        return get_category(db, category_id, user_id)
+    category = updated_rows(
+        db,
+        update(models.Category)
+        .where(models.Category.id == category_id, models.Category.user_id == user_id)
+        .values(**changes),
+        models.Category,
+    ).scalar_one_or_none()
     if category:
-        for key, value in category_update.dict(exclude_unset=True).items():
-            setattr(category, key, value)
+        bump_data_version(db, user_id)
         db.commit()
-        db.refresh(category)
+        invalidate_categories(user_id)
     return category
 
-def delete_category(db: Session, category_id: int, user_id: int):
-    """Delete a category"""
-    category = get_category(db, category_id, user_id)
-    if category:
-        # Check if category has expenses
-        has_expenses = db.query(models.Expense).filter(
-            models.Expense.category_id == category_id
-        ).first()
-        
-        if has_expenses:
-            # Set expenses to uncategorized instead of deleting
-            db.query(models.Expense).filter(
-                models.Expense.category_id == category_id
-            ).update({models.Expense.category_id: None})
-        
-        db.delete(category)
-        db.commit()
-    return category
+def delete_categories(db: Session, user_id: int, category_ids: Iterable[int],
+                      reassign_to: Optional[int] = None) -> Tuple[List[int], int]:
+    """Delete the user's categories among ``category_ids`` in one transaction.
 
-def get_monthly_report(db: Session, user_id: int, year: int, month: int):
-    # Simple implementation - you can enhance this
-    from sqlalchemy import func
-    from datetime import datetime, timedelta
-    
+    Their expenses are moved to ``reassign_to`` (another of the user's
+    categories, checked by the caller) or left uncategorized, with a single
+    UPDATE whatever the number of categories; roll-ups follow. Returns the
+    deleted ids and the number of expenses moved.
+    """
+    category = models.Category
+    ids = sorted(set(category_ids))
+    if reassign_to is not None and reassign_to in ids:
+        raise ValueError("Cannot reassign expenses to a category being deleted")
+    owned = list(db.scalars(select(category.id).where(category.user_id == user_id, category.id.in_(ids))))
+    if not owned:
+        return [], 0
+    # Expenses first: on Postgres the categories cannot go while expenses still reference them
+    moved = db.execute(
+        update(models.Expense)
+        .where(models.Expense.user_id == user_id, models.Expense.category_id.in_(owned))
+        .values(category_id=reassign_to)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    rollups.move_categories(db, user_id, owned, reassign_to)
+    db.execute(delete(category).where(category.user_id == user_id, category.id.in_(owned))
+               .execution_options(synchronize_session=False))
+    bump_data_version(db, user_id)
+    db.commit()
+    invalidate_categories(user_id)
+    return owned, moved
+
+def delete_category(db: Session, category_id: int, user_id: int, reassign_to: Optional[int] = None) -> Optional[int]:
+    """Delete one category (see delete_categories); returns the expenses moved, None if not the user's"""
+    deleted, moved = delete_categories(db, user_id, [category_id], reassign_to)
+    return moved if deleted else None
+
+def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    """Half-open [start, end) range covering one calendar month"""
     start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = datetime(year, month + 1, 1) - timedelta(days=1)
-    
-    total = db.query(func.sum(models.Expense.amount)).filter(
-        models.Expense.user_id == user_id,
-        models.Expense.created_at >= start_date,
-        models.Expense.created_at <= end_date
-    ).scalar() or 0
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start_date, end_date
+
+def get_monthly_report(db: Session, user_id: int, year: int, month: int) -> schemas.MonthlyReportResponse:
+    start_date, end_date = month_range(year, month)
     
-    count = db.query(func.count(models.Expense.id)).filter(
+    # One pass over the month at (day, category) grain; every figure in the
+    # report is a roll-up of these at most days x categories rows
+    day = func.date(models.Expense.created_at)
+    rows = db.query(
+        day,
+        models.Expense.category_id,
+        models.Category.name,
+        models.Category.color,
+        func.sum(models.Expense.amount),
+        func.count(models.Expense.id)
+    ).outerjoin(
+        models.Category, models.Category.id == models.Expense.category_id
+    ).filter(
         models.Expense.user_id == user_id,
         models.Expense.created_at >= start_date,
-        models.Expense.created_at <= end_date
-    ).scalar() or 0
+        models.Expense.created_at < end_date
+    ).group_by(day, models.Expense.category_id, models.Category.name, models.Category.color).all()
     
-    return {
-        "year": year,
-        "month": month,
-        "total_amount": total,
-        "expense_count": count
-    }
-def get_yearly_report(db: Session, user_id: int, year: int) -> schemas.YearlyReportResponse:
-    start_date = datetime(year, 1, 1)
-    end_date = datetime(year + 1, 1, 1) - timedelta(days=1)
+    total_amount = 0.0
+    expense_count = 0
+    daily_breakdown = defaultdict(float)
+    category_totals = {}
+    for day_value, category_id, cat_name, cat_color, day_total, day_count in rows:
+        total_amount += day_total
+        expense_count += day_count
+        daily_breakdown[str(day_value)] += day_total
+        entry = category_totals.setdefault(
+            category_id, [cat_name or UNCATEGORIZED_NAME, cat_color or UNCATEGORIZED_COLOR, 0.0, 0]
+        )
+        entry[2] += day_total
+        entry[3] += day_count
     
-    # Total for the year
-    total_amount = db.query(func.sum(models.Expense.amount)).filter(
-        models.Expense.user_id == user_id,
-        models.Expense.created_at >= start_date,
-        models.Expense.created_at <= end_date
-    ).scalar() or 0.0
+    categories = [
+        schemas.CategoryExpense(
+            category_name=cat_name,
+            category_color=cat_color,
+            total_amount=cat_total,
+            expense_count=cat_count,
+            percentage=round(cat_total / total_amount * 100, 2) if total_amount > 0 else 0
+        )
+        for cat_name, cat_color, cat_total, cat_count in sorted(
+            category_totals.values(), key=lambda entry: entry[2], reverse=True
+        )
+    ]
     
-    # Monthly breakdown
-    monthly_query = db.query(
-        extract('month', models.Expense.created_at).label('month'),
-        func.sum(models.Expense.amount).label('total')
+    return schemas.MonthlyReportResponse(
+        year=year,
+        month=month,
+        total_expenses=total_amount,
+        expense_count=expense_count,
+        categories=categories,
+        daily_breakdown=dict(sorted(daily_breakdown.items()))
+    )
+
+def get_yearly_report(db: Session, user_id: int, year: int) -> schemas.YearlyReportResponse:
+    # Reads the pre-aggregated roll-ups (at most 12 x categories rows), not expenses
+    rollup = models.ExpenseRollup
+    rows = db.query(
+        rollup.month,
+        rollup.category_id,
+        models.Category.name,
+        models.Category.color,
+        rollup.total,
+        rollup.count
+    ).outerjoin(
+        models.Category, models.Category.id == rollup.category_id
     ).filter(
-        models.Expense.user_id == user_id,
-        models.Expense.created_at >= start_date,
-        models.Expense.created_at <= end_date
-    ).group_by(extract('month', models.Expense.created_at)).all()
+        rollup.user_id == user_id,
+        rollup.year == year,
+        rollup.count > 0
+    ).order_by(rollup.month).all()
     
+    total_amount = 0.0
     monthly_breakdown = {}
-    for month_num, total in monthly_query:
-        month_name = calendar.month_name[int(month_num)]
-        monthly_breakdown[month_name] = float(total)
+    category_totals = {}
+    for month_num, category_id, cat_name, cat_color, month_total, month_count in rows:
+        total_amount += month_total
+        month_name = calendar.month_name[month_num]
+        monthly_breakdown[month_name] = monthly_breakdown.get(month_name, 0.0) + month_total
+        if category_id == rollups.UNCATEGORIZED:
+            continue
+        entry = category_totals.setdefault(category_id, [cat_name, cat_color, 0.0, 0])
+        entry[2] += month_total
+        entry[3] += month_count
     
     # Top categories
-    category_query = db.query(
-        models.Category.name,
-        models.Category.color,
-        func.sum(models.Expense.amount).label('total'),
-        func.count(models.Expense.id).label('count')
-    ).join(
-        models.Expense, models.Category.id == models.Expense.category_id
-    ).filter(
-        models.Expense.user_id == user_id,
-        models.Expense.created_at >= start_date,
-        models.Expense.created_at <= end_date
-    ).group_by(models.Category.id).order_by(func.sum(models.Expense.amount).desc()).limit(5).all()
-    
-    top_categories = []
-    for cat_name, cat_color, cat_total, cat_count in category_query:
-        percentage = (cat_total / total_amount * 100) if total_amount > 0 else 0
-        top_categories.append(schemas.CategoryExpense(
+    top_categories = [
+        schemas.CategoryExpense(
             category_name=cat_name,
             category_color=cat_color,
             total_amount=cat_total,
             expense_count=cat_count,
-            percentage=round(percentage, 2)
-        ))
+            percentage=round(cat_total / total_amount * 100, 2) if total_amount > 0 else 0
+        )
+        for cat_name, cat_color, cat_total, cat_count in sorted(
+            category_totals.values(), key=lambda entry: entry[2], reverse=True
+        )[:5]
+    ]
     
     return schemas.YearlyReportResponse(
         year=year,
@@ -199,19 +751,152 @@ def get_yearly_report(db: Session, user_id: int, year: int) -> schemas.YearlyRep
     )
 
 
-def get_expenses_for_export(db: Session, user_id: int, start_date: Optional[datetime] = None,
-                          end_date: Optional[datetime] = None, categories: Optional[List[int]] = None):
-    query = db.query(models.Expense).options(joinedload(models.Expense.category)).filter(
-        models.Expense.user_id == user_id
-    )
-    
-    if start_date:
-        query = query.filter(models.Expense.created_at >= start_date)
+def get_expense_summary(db: Session, user_id: int, start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None, by_category: bool = False,
+                        categories: Optional[List[int]] = None) -> schemas.ExpenseSummary:
+    """Count, sum, average, min and max over all matching expenses, computed in SQL"""
+    aggregates = [
+        func.count(models.Expense.id),
+        func.coalesce(func.sum(models.Expense.amount), 0.0),
+        func.min(models.Expense.amount),
+        func.max(models.Expense.amount),
+    ]
+    clauses = export_filters(user_id, start_date, end_date, categories)
     
-    if end_date:
-        query = query.filter(models.Expense.created_at <= end_date)
+    if not by_category:
+        count, total, min_amount, max_amount = db.query(*aggregates).filter(*clauses).one()
+        categories = None
+    else:
+        # Overall figures are folded from the per-category rows: still one query
+        rows = db.query(models.Expense.category_id, models.Category.name, *aggregates).outerjoin(
+            models.Category, models.Category.id == models.Expense.category_id
+        ).filter(*clauses).group_by(models.Expense.category_id, models.Category.name).order_by(
+            func.sum(models.Expense.amount).desc()
+        ).all()
+        count = sum(row[2] for row in rows)
+        total = sum(row[3] for row in rows)
+        min_amount = min((row[4] for row in rows), default=None)
+        max_amount = max((row[5] for row in rows), default=None)
+        categories = [
+            schemas.CategorySummary(
+                category_id=category_id,
+                category_name=cat_name or UNCATEGORIZED_NAME,
+                expense_count=cat_count,
+                total_amount=cat_total
+            )
+            for category_id, cat_name, cat_count, cat_total, _, _ in rows
+        ]
     
+    return schemas.ExpenseSummary(
+        total_expenses=count,
+        total_amount=total,
+        average_expense=total / count if count else 0,
+        min_expense=min_amount,
+        max_expense=max_amount,
+        categories=categories
+    )
+
+
+def export_filters(user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                   categories: Optional[List[int]] = None) -> list:
+    clauses = expense_filters(user_id, schemas.ExpenseFilter(start_date=start_date, end_date=end_date))
     if categories:
-        query = query.filter(models.Expense.category_id.in_(categories))
-    
-    return query.order_by(models.Expense.created_at.desc()).all()
\ No newline at end of file
+        clauses.append(models.Expense.category_id.in_(categories))
+    return clauses
+
+def stream_expenses_for_export(db: Session, user_id: int, start_date: Optional[datetime] = None,
+                               end_date: Optional[datetime] = None, categories: Optional[List[int]] = None,
+                               batch_size: int = 1000) -> Iterator[list]:
+    """Yield export rows in lists of up to ``batch_size``, newest first.
+
+    Rows are plain (id, description, amount, category, created_at) tuples read
+    through a server-side cursor, so memory use does not grow with the export.
+    """
+    statement = select(
+        models.Expense.id,
+        models.Expense.description,
+        models.Expense.amount,
+        func.coalesce(models.Category.name, UNCATEGORIZED_NAME).label("category"),
+        models.Expense.created_at
+    ).outerjoin(
+        models.Category, models.Category.id == models.Expense.category_id
+    ).where(
+        *export_filters(user_id, start_date, end_date, categories)
+    ).order_by(
+        models.Expense.created_at.desc(), models.Expense.id.desc()
+    ).execution_options(yield_per=batch_size)
+    yield from db.execute(statement).partitions()
+
+def export_params_key(export: schemas.ExportRequest) -> str:
+    """Identical exports (same format and filters) share this key"""
+    params = export.model_dump(mode="json")
+    if params["categories"]:
+        params["categories"] = sorted(set(params["categories"]))
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+ACTIVE_EXPORT_STATUSES = ("pending", "running")
+
+def get_active_export_job(db: Session, user_id: int, params_key: str):
+    return db.query(models.ExportJob).filter(
+        models.ExportJob.user_id == user_id,
+        models.ExportJob.params_key == params_key,
+        models.ExportJob.status.in_(ACTIVE_EXPORT_STATUSES)
+    ).first()
+
+def fail_stale_export_jobs(db: Session, *clauses) -> int:
+    """Mark jobs still pending/running EXPORT_JOB_TIMEOUT_SECONDS after being
+    queued as failed; returns how many. Their worker is gone (a crash or
+    restart), and while active they would block identical requests."""
+    job = models.ExportJob
+    now = datetime.now(timezone.utc)
+    return db.execute(
+        update(job)
+        .where(job.status.in_(ACTIVE_EXPORT_STATUSES),
+               job.created_at < now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT_SECONDS), *clauses)
+        .values(status="failed", error="Interrupted before it finished; request the export again", completed_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def delete_expired_export_jobs(db: Session) -> list:
+    """Delete jobs finished more than EXPORT_RETENTION_SECONDS ago; returns
+    their (id, user_id, format) rows, whose files the caller removes"""
+    job = models.ExportJob
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.EXPORT_RETENTION_SECONDS)
+    return db.execute(
+        delete(job)
+        .where(job.status.notin_(ACTIVE_EXPORT_STATUSES), job.completed_at < cutoff)
+        .returning(job.id, job.user_id, job.format)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+def create_export_job(db: Session, user_id: int, export: schemas.ExportRequest) -> Tuple[models.ExportJob, bool]:
+    """Queue an export job, or return the identical one still pending/running; returns (job, created)"""
+    params_key = export_params_key(export)
+    # An identical job lost with its worker would otherwise be returned forever
+    fail_stale_export_jobs(db, models.ExportJob.user_id == user_id, models.ExportJob.params_key == params_key)
+    job = get_active_export_job(db, user_id, params_key)
+    if job:
+        return job, False
+    job = models.ExportJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        format=export.format,
+        parameters=export.model_dump(mode="json", exclude={"format"}),
+        params_key=params_key,
+        status="pending"
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # An identical request queued its job first (ux_export_jobs_active)
+        db.rollback()
+        return get_active_export_job(db, user_id, params_key), False
+    db.refresh(job)
+    return job, True
+
+def get_export_job(db: Session, job_id: str, user_id: int):
+    return db.query(models.ExportJob).filter(
+        models.ExportJob.id == job_id,
+        models.ExportJob.user_id == user_id
+    ).first()
@@ -0,0 +1,69 @@
+"""Async counterparts of the functions in crud.
+
+Each takes the session from ``database.get_session`` (an AsyncSession in
+DB_ASYNC mode, otherwise a sync Session) and runs the query code from crud
+through ``database.run``, so both modes share one implementation.
+"""
+from functools import wraps
+
+from . import crud, database, schemas
+from .passwords import hasher
+
+
+def _on_session(fn):
+    @wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await database.run(db, fn, *args, **kwargs)
+    return wrapper
+
+
+async def create_user(db, user: schemas.UserCreate):
+    # bcrypt is CPU-bound: hash on its own pool, not the event loop or the request threadpool
+    hashed_pw = await hasher.hash(user.password)
+    return await database.run(db, crud.create_user, user, hashed_pw)
+
+async def authenticate_user(db, username: str, password: str):
+    db_user = await get_user_by_username(db, username)
+    if not db_user:
+        return None
+    valid, new_hash = await hasher.verify(password, db_user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # Hashed with another work factor: upgrade it now that we have the password
+        await set_password_hash(db, db_user.id, new_hash)
+    return db_user
+
+get_user = _on_session(crud.get_user)
+get_user_by_username = _on_session(crud.get_user_by_username)
+get_data_version = _on_session(crud.get_data_version)
+set_password_hash = _on_session(crud.set_password_hash)
+create_refresh_token = _on_session(crud.create_refresh_token)
+rotate_refresh_token = _on_session(crud.rotate_refresh_token)
+logout = _on_session(crud.logout)
+revoke_user_tokens = _on_session(crud.revoke_user_tokens)
+get_revoked_tokens = _on_session(crud.get_revoked_tokens)
+
+create_expense = _on_session(crud.create_expense)
+get_expense = _on_session(crud.get_expense)
+get_expense_rows = _on_session(crud.get_expense_rows)
+get_expense_rows_page = _on_session(crud.get_expense_rows_page)
+update_expense = _on_session(crud.update_expense)
+delete_expense = _on_session(crud.delete_expense)
+import_expenses = _on_session(crud.import_expenses)
+update_expenses = _on_session(crud.update_expenses)
+delete_expenses = _on_session(crud.delete_expenses)
+
+create_category = _on_session(crud.create_category)
+get_categories = _on_session(crud.get_categories)
+get_category = _on_session(crud.get_category)
+update_category = _on_session(crud.update_category)
+delete_category = _on_session(crud.delete_category)
+delete_categories = _on_session(crud.delete_categories)
+missing_categories = _on_session(crud.missing_categories)
+
+get_monthly_report = _on_session(crud.get_monthly_report)
+get_yearly_report = _on_session(crud.get_yearly_report)
+get_expense_summary = _on_session(crud.get_expense_summary)
+create_export_job = _on_session(crud.create_export_job)
+get_export_job = _on_session(crud.get_export_job)
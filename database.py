@@ -1,9 +1,144 @@
-from sqlalchemy import create_engine
+import threading
+import time
+import uuid
+from collections import deque
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# asyncio drivers used in DB_ASYNC mode, keyed by backend name
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_url(url: str):
+    """Map a sync database URL onto the matching asyncio driver"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+class PoolMetrics:
+    """Checkout wait times and connections in use for one engine's pool"""
+
+    def __init__(self, window: int = 1024):
+        self.checkouts = 0
+        self.in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def checked_out(self):
+        with self._lock:
+            self.in_use += 1
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def observe_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self._recent.append(seconds)
+
+    def snapshot(self, pool) -> dict:
+        recent = sorted(self._recent)
+        stats = {
+            "pool": type(pool).__name__,
+            "in_use": self.in_use,
+            "checkouts": self.checkouts,
+            "wait_ms_avg": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_ms_p50": round(recent[len(recent) // 2] * 1000, 3) if recent else 0.0,
+            "wait_ms_p99": round(recent[int(len(recent) * 0.99)] * 1000, 3) if recent else 0.0,
+            "wait_ms_max": round(self.max_wait * 1000, 3),
+        }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), idle=pool.checkedin(), overflow=pool.overflow())
+        return stats
+
+def metered(pool_class, metrics: PoolMetrics):
+    """Subclass ``pool_class`` so every checkout reports how long it waited"""
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return pool_class.connect(self)
+        finally:
+            metrics.observe_wait(time.perf_counter() - start)
+    return type(pool_class.__name__, (pool_class,), {"connect": connect})
+
+def utc_connect_args(url) -> dict:
+    """Driver arguments that run PostgreSQL sessions in UTC.
+
+    Timestamps are stored in UTC and imports bucket them into roll-ups by
+    their UTC month; SQL that extracts the year, month or date of a
+    timestamptz (roll-ups, reports) uses the session's TimeZone, which
+    otherwise defaults to the server's.
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "postgresql":
+        return {}
+    if url.get_driver_name() == "asyncpg":
+        return {"server_settings": {"timezone": "UTC"}}
+    return {"options": "-c timezone=UTC"}
+
+def engine_options(url, metrics: PoolMetrics) -> dict:
+    """Pool settings for ``url`` from config; PgBouncer mode disables local pooling"""
+    url = make_url(url)
+    connect_args = utc_connect_args(url)
+    if settings.DB_PGBOUNCER:
+        if url.get_driver_name() == "asyncpg":
+            # Transaction pooling cannot keep prepared statements between transactions
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+            )
+        return {"poolclass": metered(NullPool, metrics), "connect_args": connect_args}
+    pool_class = url.get_dialect().get_pool_class(url)
+    options = {
+        "poolclass": metered(pool_class, metrics),
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+    if issubclass(pool_class, QueuePool):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+def track_in_use(engine, metrics: PoolMetrics):
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checked_out()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checked_in()
+
+pool_metrics = {"sync": PoolMetrics()}
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, pool_metrics["sync"]))
+track_in_use(engine, pool_metrics["sync"])
+# Objects returned from a write stay loaded after commit instead of being re-read
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# The sync engine always exists (exports, migrations, scripts); the async
+# engine serves the request path when DB_ASYNC is enabled.
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    pool_metrics["async"] = PoolMetrics()
+    async_database_url = settings.ASYNC_DATABASE_URL or async_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(async_database_url, **engine_options(async_database_url, pool_metrics["async"]))
+    track_in_use(async_engine.sync_engine, pool_metrics["async"])
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 def get_db():
@@ -12,3 +147,28 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Session dependency for async routers: an AsyncSession in DB_ASYNC mode,
+# otherwise the regular sync Session (so overriding get_db still applies)
+get_session = get_async_db if settings.DB_ASYNC else get_db
+
+def pool_stats() -> dict:
+    """Current pool metrics for each engine"""
+    stats = {"sync": pool_metrics["sync"].snapshot(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = pool_metrics["async"].snapshot(async_engine.sync_engine.pool)
+    return stats
+
+async def run(db, fn, *args, **kwargs):
+    """Run a sync CRUD function without blocking the event loop.
+
+    On an AsyncSession the function runs on the async connection via
+    ``run_sync``; on a sync Session it runs in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
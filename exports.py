@@ -0,0 +1,367 @@
+"""Export formats, export file storage and background export jobs.
+
+Every format reads the same batched row source (``export_batches``). The
+``/export/<format>`` endpoints stream a file straight to the client; ``POST
+/export/`` instead queues an ``ExportJob`` that ``ExportJobs`` runs on a
+thread or process pool, writing the file to storage for a later download.
+"""
+import csv
+import io
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+import orjson
+from openpyxl import Workbook
+from sqlalchemy.orm import Session
+
+from . import crud, database, models, schemas
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExportFormat(NamedTuple):
+    extension: str
+    media_type: str
+
+
+FORMATS = {
+    "csv": ExportFormat("csv", "text/csv"),
+    "excel": ExportFormat("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "json": ExportFormat("json", "application/json"),
+    "ndjson": ExportFormat("ndjson", "application/x-ndjson"),
+    "parquet": ExportFormat("parquet", "application/vnd.apache.parquet"),
+}
+
+EXPORT_COLUMNS = ['ID', 'Description', 'Amount', 'Category', 'Date']
+# Field names of the rows from crud.stream_expenses_for_export, used as JSON keys
+EXPORT_FIELDS = ('id', 'description', 'amount', 'category', 'created_at')
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+
+
+def export_batches(db: Session, user_id: int, export: schemas.ExportRequest) -> Iterator[list]:
+    """The row source shared by every format: batches read from a server-side cursor"""
+    return crud.stream_expenses_for_export(
+        db, user_id, export.start_date, export.end_date, export.categories, settings.EXPORT_BATCH_SIZE
+    )
+
+
+def csv_chunks(batches: Iterator[list]) -> Iterator[bytes]:
+    """Encode export rows as CSV, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        for expense_id, description, amount, category, created_at in batch:
+            writer.writerow([
+                expense_id,
+                description or '',
+                amount,
+                category,
+                created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(batches: Iterator[list]) -> Iterator[bytes]:
+    """Encode export rows as newline-delimited JSON objects, one chunk per batch"""
+    for batch in batches:
+        yield b"".join(orjson.dumps(dict(zip(EXPORT_FIELDS, row))) + b"\n" for row in batch)
+
+
+def json_array_chunks(batches: Iterator[list]) -> Iterator[bytes]:
+    """Encode export rows as a single JSON array, one chunk per batch"""
+    separator = b"["
+    for batch in batches:
+        yield separator + b",".join(orjson.dumps(dict(zip(EXPORT_FIELDS, row))) for row in batch)
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
+
+
+def write_xlsx(batches: Iterator[list], summary: schemas.ExpenseSummary, date_range: str) -> BinaryIO:
+    """Write an Expenses and a Summary sheet to a temporary file, rewound for reading.
+
+    Write-only mode streams rows to disk as they are appended, so memory stays
+    flat; the file spills from memory to disk once it passes 8 MiB.
+    """
+    workbook = Workbook(write_only=True)
+    expenses_sheet = workbook.create_sheet('Expenses')
+    expenses_sheet.append(EXPORT_COLUMNS)
+    for batch in batches:
+        for expense_id, description, amount, category, created_at in batch:
+            expenses_sheet.append([
+                expense_id,
+                description or '',
+                amount,
+                category,
+                created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ])
+
+    summary_sheet = workbook.create_sheet('Summary')
+    summary_sheet.append(['Total Expenses', 'Total Amount', 'Date Range'])
+    summary_sheet.append([summary.total_expenses, summary.total_amount, date_range])
+
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 2**20)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def write_parquet(batches: Iterator[list]) -> BinaryIO:
+    """Write export rows as Parquet to a temporary file, rewound for reading.
+
+    Batches are gathered into row groups of about PARQUET_ROW_GROUP_SIZE rows,
+    so at most one row group (in columnar form) is held in memory.
+    """
+    import pyarrow as pa  # optional: only the Parquet export needs it
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('description', pa.string()),
+        ('amount', pa.float64()),
+        ('category', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+    ])
+
+    def record_batch(rows):
+        columns = zip(*rows)
+        return pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                          schema=schema)
+
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 2**20)
+    with pq.ParquetWriter(output, schema) as writer:
+        # Each batch is converted to columns straight away; only those are held until a group is full
+        pending, pending_rows = [], 0
+        for batch in batches:
+            pending.append(record_batch(batch))
+            pending_rows += len(batch)
+            if pending_rows >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_batches(pending), row_group_size=pending_rows)
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending), row_group_size=pending_rows)
+    output.seek(0)
+    return output
+
+
+def file_chunks(file: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Read ``file`` in chunks, closing (and deleting) it when done"""
+    with file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+def export_chunks(db: Session, user_id: int, export: schemas.ExportRequest,
+                  batches: Optional[Iterator[list]] = None) -> Iterator[bytes]:
+    """Encode a user's export in ``export.format``; reads ``export_batches`` unless given ``batches``"""
+    if batches is None:
+        batches = export_batches(db, user_id, export)
+    if export.format == "csv":
+        return csv_chunks(batches)
+    if export.format == "json":
+        return json_array_chunks(batches)
+    if export.format == "ndjson":
+        return ndjson_chunks(batches)
+    if export.format == "parquet":
+        return file_chunks(write_parquet(batches))
+    if export.format == "excel":
+        summary = crud.get_expense_summary(
+            db, user_id, export.start_date, export.end_date, categories=export.categories
+        )
+        date_range = f"{export.start_date or 'All'} to {export.end_date or 'All'}"
+        return file_chunks(write_xlsx(batches, summary, date_range))
+    raise ValueError(f"Unknown export format: {export.format}")
+
+
+class RowCounter:
+    """Iterate over ``batches`` unchanged, counting the rows that went past"""
+
+    def __init__(self, batches: Iterator[list]):
+        self.batches = batches
+        self.rows = 0
+
+    def __iter__(self):
+        for batch in self.batches:
+            self.rows += len(batch)
+            yield batch
+
+
+class FileSystemStorage:
+    """Export files kept under a local directory, keyed by relative path."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def save(self, key: str, chunks: Iterator[bytes]) -> int:
+        """Write ``chunks`` to ``key`` atomically; returns the size in bytes"""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".part")
+        size = 0
+        with open(partial, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                size += len(chunk)
+        os.replace(partial, path)
+        return size
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def delete(self, key: str):
+        self.path(key).unlink(missing_ok=True)
+
+
+def build_storage():
+    """Create the export storage selected by ``settings.EXPORT_STORAGE``."""
+    if settings.EXPORT_STORAGE == "filesystem":
+        return FileSystemStorage(settings.EXPORT_DIR)
+    raise ValueError(f"Unknown EXPORT_STORAGE: {settings.EXPORT_STORAGE}")
+
+
+def storage_key(job: models.ExportJob) -> str:
+    return f"{job.user_id}/{job.id}.{FORMATS[job.format].extension}"
+
+
+def human_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def run_export_job(job_id: str, session_factory=None, storage=None):
+    """Generate the file for a pending job and record the outcome on it.
+
+    Runs on the job executor; in a worker process the defaults (the app's own
+    engine and storage settings) are used.
+    """
+    db = (session_factory or database.SessionLocal)()
+    storage = storage or build_storage()
+    try:
+        job = db.get(models.ExportJob, job_id)
+        if job is None or job.status != "pending":
+            return
+        job.status = "running"
+        db.commit()
+
+        export = schemas.ExportRequest(format=job.format, **job.parameters)
+        try:
+            rows = RowCounter(export_batches(db, job.user_id, export))
+            job.file_size = storage.save(storage_key(job), export_chunks(db, job.user_id, export, rows))
+            job.total_records = rows.rows
+            job.status = "done"
+        except Exception as exc:
+            logger.exception("Export job %s failed", job_id)
+            db.rollback()
+            job.status = "failed"
+            job.error = str(exc)[:500]
+        job.completed_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+
+def sweep_export_jobs(session_factory=None, storage=None):
+    """Fail jobs lost with their worker and delete expired jobs and their files;
+    returns (failed, expired). Runs on the job executor, like run_export_job."""
+    db = (session_factory or database.SessionLocal)()
+    storage = storage or build_storage()
+    try:
+        failed = crud.fail_stale_export_jobs(db)
+        expired = crud.delete_expired_export_jobs(db)
+        db.commit()
+    except Exception:
+        # Nobody waits on the sweep's future; it is retried with a later job
+        logger.exception("Export sweep failed")
+        return 0, 0
+    finally:
+        db.close()
+    for job in expired:
+        storage.delete(storage_key(job))
+    if failed or expired:
+        logger.info("Export sweep: %d stale jobs failed, %d expired jobs deleted", failed, len(expired))
+    return failed, len(expired)
+
+
+def dispose_inherited_connections():
+    """Worker process initializer: drop the pooled connections forked from the
+    app, so the worker opens its own rather than sharing the parent's sockets"""
+    database.engine.dispose(close=False)
+
+
+class ExportJobs:
+    """Runs export jobs on a thread or process pool (``settings.EXPORT_EXECUTOR``).
+
+    The pool is created on first use and recreated after ``shutdown``, so the
+    app can stop it on shutdown and still be served again (as tests do). A
+    sweep of stale and expired jobs is queued at startup and then with a job
+    at most every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, executor: str = "thread", workers: int = 2, session_factory=None, storage=None,
+                 sweep_interval: float = 600):
+        self.executor_kind = executor
+        self.workers = workers
+        # Only used in-process; worker processes always build their own
+        self.session_factory = session_factory
+        self.storage = storage
+        self.sweep_interval = sweep_interval
+        self._swept_at = float("-inf")
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=dispose_inherited_connections)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+        return self._executor
+
+    def get_storage(self):
+        if self.storage is None:
+            self.storage = build_storage()
+        return self.storage
+
+    def submit(self, job_id: str) -> Future:
+        if time.monotonic() - self._swept_at >= self.sweep_interval:
+            self.sweep()
+        return self._submit(run_export_job, job_id)
+
+    def sweep(self) -> Future:
+        """Queue a sweep_export_jobs run"""
+        self._swept_at = time.monotonic()
+        return self._submit(sweep_export_jobs)
+
+    def _submit(self, fn, *args) -> Future:
+        if self.executor_kind == "process":
+            return self.executor.submit(fn, *args)
+        return self.executor.submit(fn, *args, self.session_factory, self.get_storage())
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool, by default after the queued jobs finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+jobs = ExportJobs(settings.EXPORT_EXECUTOR, settings.EXPORT_WORKERS, sweep_interval=settings.EXPORT_SWEEP_SECONDS)
@@ -0,0 +1,63 @@
+"""Conditional GETs for a user's lists and reports: ETags and Cache-Control.
+
+crud bumps ``users.data_version`` in the same transaction as every expense or
+category write, so a user's version changes exactly when their data does.
+ETags are derived from it (plus the URL), which makes checking one cheap: the
+``conditional_get`` dependency reads the version with a primary-key lookup
+and answers a matching ``If-None-Match`` with 304 before the route's own
+queries run.
+"""
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+
+from . import auth, crud_async, database
+from .config import settings
+
+
+def make_etag(user_id: int, version: int, request: Request) -> str:
+    """Weak ETag for one user's view of a URL (weak: GZip may re-encode the body)"""
+    key = f"{user_id}:{version}:{request.url.path}?{request.url.query}"
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of ``etag`` against an If-None-Match header"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def cache_control(request: Request) -> str:
+    """The route's policy from CACHE_CONTROL_ROUTES (keyed by path template), else the default"""
+    route = request.scope.get("route")
+    return settings.CACHE_CONTROL_ROUTES.get(getattr(route, "path", None), settings.CACHE_CONTROL_DEFAULT)
+
+
+async def data_version(db=Depends(database.get_session), current_user=Depends(auth.get_current_user)) -> int:
+    """The current user's data version, read once per request however many dependants ask for it"""
+    return await crud_async.get_data_version(db, current_user.id)
+
+
+async def conditional_get(request: Request, response: Response,
+                          version: int = Depends(data_version),
+                          current_user=Depends(auth.get_current_user)) -> Dict[str, str]:
+    """Raise 304 Not Modified when If-None-Match matches the current ETag.
+
+    Otherwise ETag, Cache-Control and Vary are set on the response; they are
+    also returned, for routes that build their own Response (which does not
+    receive headers set here).
+    """
+    headers = {
+        "ETag": make_etag(current_user.id, version, request),
+        "Cache-Control": cache_control(request),
+        "Vary": "Authorization",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return headers
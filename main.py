@@ -1,50 +1,45 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
-from collections import defaultdict
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+import math
 import time
 import uvicorn
 
 # Import your modules
-from . import database, models
-from .routers import users, expenses, categories, reports, export
-from .config import settings
+from . import exports, passwords
+from .routers import users, expenses, categories, reports, export, internal
+from .ratelimit import RateLimiter, build_limiter, client_identity
 
-# Create tables
-models.Base.metadata.create_all(bind=database.engine)
-
-# Rate limiting middleware (simple implementation)
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, calls: int = 100, period: int = 60):
-        super().__init__(app)
-        self.calls = calls
-        self.period = period
-        self.clients = defaultdict(list)
+# Rate limiting middleware (pure ASGI, so responses are passed through untouched)
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
     
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        now = time.time()
-        
-        # Clean old entries
-        self.clients[client_ip] = [
-            timestamp for timestamp in self.clients[client_ip]
-            if now - timestamp < self.period
-        ]
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Check rate limit
-        if len(self.clients[client_ip]) >= self.calls:
-            raise HTTPException(
+        client = scope.get("client")
+        identity = client_identity(
+            Headers(scope=scope).get("authorization"),
+            client[0] if client else None
+        )
+        retry_after = await self.limiter.hit(identity, scope["path"])
+        if retry_after:
+            response = JSONResponse(
                 status_code=429,
-                detail="Rate limit exceeded. Too many requests."
+                content={"detail": "Rate limit exceeded. Too many requests."},
+                headers={"Retry-After": str(math.ceil(retry_after))}
             )
+            await response(scope, receive, send)
+            return
         
-        # Add current request
-        self.clients[client_ip].append(now)
-        
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -73,6 +68,8 @@ app = FastAPI(
     - Input validation and sanitization
     """,
     version="0.1.0",
+    # Responses are encoded with orjson rather than the json module
+    default_response_class=ORJSONResponse,
     contact={
         "name": "Expense API Support",
         "email": "amirdoustdar1@gmail.com",
@@ -93,7 +90,8 @@ app.add_middleware(
 )
 
 app.add_middleware(GZipMiddleware, minimum_size=1000)
-app.add_middleware(RateLimitMiddleware, calls=100, period=60)
+limiter = build_limiter()
+app.add_middleware(RateLimitMiddleware, limiter=limiter)
 
 # Include routers
 app.include_router(users.router)
@@ -101,6 +99,21 @@ app.include_router(expenses.router)
 app.include_router(categories.router)
 app.include_router(reports.router)
 app.include_router(export.router)
+app.include_router(internal.router)
+
+@app.on_event("startup")
+def sweep_export_jobs():
+    # Fail jobs a previous run of the worker left pending or running, drop expired files
+    exports.jobs.sweep()
+
+@app.on_event("shutdown")
+def stop_export_jobs():
+    # Let queued export jobs finish before the worker exits
+    exports.jobs.shutdown()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    passwords.hasher.shutdown()
 
 @app.get("/")
 def read_root():
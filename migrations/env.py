@@ -0,0 +1,50 @@
+import importlib
+import sys
+from logging.config import fileConfig
+from pathlib import Path
+
+from alembic import context
+from sqlalchemy import create_engine
+
+# The project uses package-relative imports, so import it as a package
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_DIR.parent))
+settings = importlib.import_module(f"{PROJECT_DIR.name}.config").settings
+models = importlib.import_module(f"{PROJECT_DIR.name}.models")
+database = importlib.import_module(f"{PROJECT_DIR.name}.database")
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+def database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or settings.DATABASE_URL
+
+def run_migrations_offline() -> None:
+    """Emit SQL to stdout instead of connecting (alembic upgrade --sql)"""
+    context.configure(
+        url=database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online() -> None:
+    # In UTC like the app's sessions, so data migrations bucket timestamps the same way
+    connectable = create_engine(database_url(), connect_args=database.utc_connect_args(database_url()))
+    with connectable.connect() as connection:
+        # Batch mode lets ALTERs work on SQLite too
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+    connectable.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,42 @@
+"""composite indexes for report, export and category queries
+
+Every report, export and list query filters expenses by user_id plus a
+created_at range (ordered by created_at, id); category reports and deletion
+look expenses up by category.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY on Postgres so building them does not block expense writes
+    with op.get_context().autocommit_block():
+        op.create_index("ix_expenses_user_created", "expenses", ["user_id", "created_at", "id"],
+                        postgresql_concurrently=True)
+        op.create_index("ix_expenses_user_category", "expenses", ["user_id", "category_id"],
+                        postgresql_concurrently=True)
+        op.create_index("ix_expenses_category_id", "expenses", ["category_id"],
+                        postgresql_concurrently=True)
+        op.create_index("ix_categories_user_id", "categories", ["user_id"],
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_categories_user_id", table_name="categories")
+    op.drop_index("ix_expenses_category_id", table_name="expenses")
+    op.drop_index("ix_expenses_user_category", table_name="expenses")
+    op.drop_index("ix_expenses_user_created", table_name="expenses")
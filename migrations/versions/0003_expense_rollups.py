@@ -0,0 +1,61 @@
+"""monthly expense roll-ups
+
+Sum and count per (user, year, month, category), kept current by crud on
+every expense write; backfilled here from existing expenses.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "expense_rollups",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "year", "month", "category_id"),
+    )
+    expenses = sa.table(
+        "expenses",
+        sa.column("id", sa.Integer()),
+        sa.column("amount", sa.Float()),
+        sa.column("user_id", sa.Integer()),
+        sa.column("category_id", sa.Integer()),
+        sa.column("created_at", sa.DateTime(timezone=True)),
+    )
+    rollups = sa.table(
+        "expense_rollups",
+        *(sa.column(name) for name in ("user_id", "year", "month", "category_id", "total", "count")),
+    )
+    year = sa.cast(sa.extract("year", expenses.c.created_at), sa.Integer())
+    month = sa.cast(sa.extract("month", expenses.c.created_at), sa.Integer())
+    category_id = sa.func.coalesce(expenses.c.category_id, 0)
+    op.execute(rollups.insert().from_select(
+        ["user_id", "year", "month", "category_id", "total", "count"],
+        sa.select(
+            expenses.c.user_id, year, month, category_id,
+            sa.func.sum(expenses.c.amount), sa.func.count(expenses.c.id),
+        ).group_by(expenses.c.user_id, year, month, category_id),
+    ))
+
+
+def downgrade() -> None:
+    op.drop_table("expense_rollups")
@@ -0,0 +1,47 @@
+"""background export jobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "export_jobs",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("format", sa.String(length=16), nullable=False),
+        sa.Column("parameters", sa.JSON(), nullable=False),
+        sa.Column("params_key", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("total_records", sa.Integer(), nullable=True),
+        sa.Column("file_size", sa.Integer(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_export_jobs_user_id", "export_jobs", ["user_id"])
+    op.create_index("ux_export_jobs_active", "export_jobs", ["user_id", "params_key"], unique=True,
+                    postgresql_where=sa.text("status IN ('pending', 'running')"),
+                    sqlite_where=sa.text("status IN ('pending', 'running')"))
+
+
+def downgrade() -> None:
+    op.drop_index("ux_export_jobs_active", table_name="export_jobs")
+    op.drop_index("ix_export_jobs_user_id", table_name="export_jobs")
+    op.drop_table("export_jobs")
@@ -0,0 +1,28 @@
+"""per-user data version for ETags
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("data_version", sa.Integer(), nullable=False, server_default=sa.text("0")))
+
+
+def downgrade() -> None:
+    # batch mode: SQLite cannot drop columns in place
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("data_version")
@@ -0,0 +1,36 @@
+"""revoked token versions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # batch mode: SQLite cannot alter columns or add foreign keys in place
+    with op.batch_alter_table("revoked_tokens") as batch_op:
+        batch_op.alter_column("jti", existing_type=sa.String(length=32), nullable=True)
+        batch_op.add_column(sa.Column("user_id", sa.Integer()))
+        batch_op.add_column(sa.Column("token_version", sa.Integer()))
+        batch_op.create_foreign_key("fk_revoked_tokens_user_id", "users", ["user_id"], ["id"])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM revoked_tokens WHERE jti IS NULL")
+    with op.batch_alter_table("revoked_tokens") as batch_op:
+        batch_op.drop_constraint("fk_revoked_tokens_user_id", type_="foreignkey")
+        batch_op.drop_column("token_version")
+        batch_op.drop_column("user_id")
+        batch_op.alter_column("jti", existing_type=sa.String(length=32), nullable=False)
@@ -1,15 +1,24 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index, JSON
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from .database import Base  
 
+# SQLite stores timestamps as text and CURRENT_TIMESTAMP has no fraction, so keep
+# bound values in the same format or range/keyset comparisons go wrong there
+Timestamp = DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
 class User(Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    # Bumped by every expense/category write; ETags of the user's lists and reports derive from it
+    data_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    # Carried in access tokens as "ver"; bumping it invalidates every token issued before
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
 
     expenses = relationship("Expense", back_populates="owner")
     categories = relationship("Category", back_populates="owner")
@@ -21,22 +30,89 @@ class Category(Base):
     name = Column(String, nullable=False)
     color = Column(String, default="#3B82F6")
     icon = Column(String, default="📋")
-    user_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(Timestamp, server_default=func.now())
 
     owner = relationship("User", back_populates="categories")
     expenses = relationship("Expense", back_populates="category")
 
 class Expense(Base):
     __tablename__ = "expenses"
+    # Reports, exports and lists filter by user and created_at range (keyset on id);
+    # category reports and deletion look expenses up by category. See migration 0002.
+    __table_args__ = (
+        Index("ix_expenses_user_created", "user_id", "created_at", "id"),
+        Index("ix_expenses_user_category", "user_id", "category_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String)
     amount = Column(Float, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
+
+    # Fetch server-generated created_at on flush (RETURNING) for the roll-up key
+    __mapper_args__ = {"eager_defaults": True}
 
     owner = relationship("User", back_populates="expenses")
-    category = relationship("Category", back_populates="expenses")
\ No newline at end of file
+    # Loaded with the expense (one extra SELECT per query) since every expense
+    # response nests it, and async sessions cannot lazy-load during serialization
+    category = relationship("Category", back_populates="expenses", lazy="raise")
+
+class ExpenseRollup(Base):
+    """Sum and count of a user's expenses per month and category (see rollups.py)"""
+    __tablename__ = "expense_rollups"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    category_id = Column(Integer, primary_key=True)  # 0 = uncategorized, so no foreign key
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+class ExportJob(Base):
+    """A queued export (POST /export/), generated in the background (see exports.py)"""
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        # At most one pending or running job per user and parameter set
+        Index("ux_export_jobs_active", "user_id", "params_key", unique=True,
+              postgresql_where=text("status IN ('pending', 'running')"),
+              sqlite_where=text("status IN ('pending', 'running')")),
+    )
+    
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    format = Column(String(16), nullable=False)
+    parameters = Column(JSON, nullable=False)  # start_date, end_date, categories
+    params_key = Column(String(64), nullable=False)  # hash of format + parameters
+    status = Column(String(16), nullable=False, default="pending")  # pending, running, done, failed
+    total_records = Column(Integer)
+    file_size = Column(Integer)  # bytes
+    error = Column(String)
+    created_at = Column(Timestamp, server_default=func.now())
+    completed_at = Column(Timestamp)
+
+class RefreshToken(Base):
+    """A refresh token, stored as its SHA-256; single use, rotated by POST /users/refresh"""
+    __tablename__ = "refresh_tokens"
+    
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    family_id = Column(String(32), nullable=False, index=True)  # every token descended from one login
+    expires_at = Column(Timestamp, nullable=False)
+    used_at = Column(Timestamp)  # rotated or revoked; presenting it again revokes the family
+    created_at = Column(Timestamp, server_default=func.now())
+
+class RevokedToken(Base):
+    """Access tokens revoked before they expire (see revocation.py): one token
+    by its jti claim (logout), or every token of a user carrying a token
+    version below ``token_version`` (logout everywhere)"""
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(32), unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    token_version = Column(Integer)
+    expires_at = Column(Timestamp, nullable=False, index=True)
@@ -0,0 +1,115 @@
+"""Password hashing and verification off the event loop and the request threadpool.
+
+bcrypt costs up to a few hundred ms of CPU per call, so a burst of logins on
+the shared threadpool starves every other endpoint. ``PasswordHasher`` runs
+it on its own bounded pool (processes by default, ``PASSWORD_EXECUTOR``) and
+refuses work beyond ``PASSWORD_MAX_PENDING`` queued calls, which the routes
+turn into 503s instead of an ever-growing queue.
+
+The work factor is ``PASSWORD_BCRYPT_ROUNDS``. Stored hashes with any other
+factor still verify, and are rehashed on the next successful login.
+Successful verifications are remembered briefly (``LOGIN_CACHE_TTL_SECONDS``)
+so repeated logins with the same password skip bcrypt; wrong passwords always
+pay the full cost.
+"""
+import asyncio
+import hashlib
+import hmac
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .cache import LRUCache
+from .config import settings
+
+
+@lru_cache(maxsize=None)
+def crypt_context(rounds: int) -> CryptContext:
+    """bcrypt with exactly ``rounds``: hashes made with another factor need an update"""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds,
+                        bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+
+
+# Run on the pool; module-level so worker processes can unpickle them
+def hash_password(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+def verify_password(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """(valid, new hash if the stored one should be replaced)"""
+    return crypt_context(rounds).verify_and_update(password, hashed_password)
+
+
+class HasherBusy(Exception):
+    """Raised instead of queueing more than ``max_pending`` calls"""
+
+
+class PasswordHasher:
+    """bcrypt on a dedicated thread or process pool with a bounded queue.
+
+    The pool is created on first use and recreated after ``shutdown``, like
+    the export job pool.
+    """
+
+    def __init__(self, executor: str = "process", workers: int = 2, max_pending: int = 64,
+                 rounds: int = 12, cache_ttl: float = 300, cache_size: int = 10000):
+        self.executor_kind = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        # HMAC(stored hash, password) of recent successful verifications; process-local on purpose
+        self.verified = LRUCache(cache_size, cache_ttl) if cache_ttl > 0 else None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy()
+            self._pending += 1
+        try:
+            return await asyncio.wrap_future(self.executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _cache_key(self, password: str, hashed_password: str) -> str:
+        return hmac.new(settings.SECRET_KEY.encode(), f"{hashed_password}\0{password}".encode(),
+                        hashlib.sha256).hexdigest()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check ``password``; returns (valid, replacement hash or None)"""
+        key = self._cache_key(password, hashed_password)
+        if (self.verified is not None and self.verified.get(key)
+                and not crypt_context(self.rounds).needs_update(hashed_password)):
+            return True, None
+        valid, new_hash = await self._run(verify_password, password, hashed_password, self.rounds)
+        if valid and self.verified is not None:
+            self.verified.set(self._cache_key(password, new_hash) if new_hash else key, True)
+        return valid, new_hash
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+hasher = PasswordHasher(settings.PASSWORD_EXECUTOR, settings.PASSWORD_WORKERS, settings.PASSWORD_MAX_PENDING,
+                        settings.PASSWORD_BCRYPT_ROUNDS, settings.LOGIN_CACHE_TTL_SECONDS,
+                        settings.LOGIN_CACHE_MAX_SIZE)
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from jose import JWTError
+
+from .auth import decode_token
+from .config import settings
+
+# GCRA on a single key: stores the theoretical arrival time (TAT) and lets the
+# key expire once the bucket is full again, so idle clients cost no memory.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+if tat - now > tolerance then return tostring(tat - now - tolerance) end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class Limit(NamedTuple):
+    calls: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.calls
+
+    @property
+    def tolerance(self) -> float:
+        # A full bucket admits `calls` requests back to back
+        return self.interval * (self.calls - 1)
+
+
+class MemoryStore:
+    """Per-process GCRA state, bounded to ``max_keys`` with idle keys evicted first."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, now: float, limit: Limit) -> float:
+        with self._lock:
+            tat = max(self._tats.pop(key, now), now)
+            if tat - now > limit.tolerance:
+                self._tats[key] = tat
+                return tat - now - limit.tolerance
+            self._tats[key] = tat + limit.interval
+            self._evict(now)
+            return 0.0
+
+    def _evict(self, now: float):
+        # Keys are ordered by last use, so the head is the best eviction candidate
+        while self._tats:
+            key, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self.max_keys:
+                break
+            del self._tats[key]
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+    def __len__(self):
+        return len(self._tats)
+
+
+class RedisStore:
+    """GCRA state shared by every worker through a Redis-protocol ``redis.asyncio`` client."""
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.prefix = prefix
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, now: float, limit: Limit) -> float:
+        retry_after = await self._script(
+            keys=[f"{self.prefix}:{key}"], args=[now, limit.interval, limit.tolerance]
+        )
+        return float(retry_after)
+
+
+class RateLimiter:
+    """Token-bucket (GCRA) limiter with a default limit and per-route overrides.
+
+    ``routes`` maps a path prefix to calls per ``period``; each route prefix gets
+    its own bucket per client, everything else shares the default bucket.
+    """
+
+    def __init__(self, store, calls: int = 100, period: float = 60, routes: Optional[Dict[str, int]] = None):
+        self.store = store
+        self.default = Limit(calls, period)
+        # Longest prefix first so "/users/login" wins over "/users"
+        self.routes = sorted(
+            ((prefix, Limit(route_calls, period)) for prefix, route_calls in (routes or {}).items()),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def limit_for(self, path: str):
+        for prefix, limit in self.routes:
+            if path.startswith(prefix):
+                return prefix, limit
+        return "*", self.default
+
+    async def hit(self, identity: str, path: str, now: Optional[float] = None) -> float:
+        """Record one request; return 0 if allowed, else seconds until it would be."""
+        bucket, limit = self.limit_for(path)
+        return await self.store.hit(f"{identity}:{bucket}", time.time() if now is None else now, limit)
+
+
+def client_identity(authorization: Optional[str], client_host: Optional[str]) -> str:
+    """Rate-limit key for a request: the token subject if it verifies, else the client IP."""
+    if authorization and authorization.lower().startswith("bearer "):
+        try:
+            payload = decode_token(authorization[7:])  # shares the verified-token cache with auth
+        except JWTError:
+            payload = {}
+        if payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{client_host or 'unknown'}"
+
+
+def build_limiter() -> RateLimiter:
+    """Create the limiter on the backend selected by ``settings.RATE_LIMIT_BACKEND``."""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        import redis.asyncio
+
+        store = RedisStore(redis.asyncio.Redis.from_url(settings.REDIS_URL))
+    else:
+        store = MemoryStore(settings.RATE_LIMIT_MAX_KEYS)
+    return RateLimiter(store, settings.RATE_LIMIT_CALLS, settings.RATE_LIMIT_PERIOD, settings.RATE_LIMIT_ROUTES)
@@ -0,0 +1,84 @@
+"""Revoked access tokens, checked on every authenticated request.
+
+Access tokens are self-contained until they expire, so logging out records
+the token's ``jti`` claim in ``revoked_tokens``; logging out everywhere
+records the user's new token version instead, which revokes every token
+carrying an older one. Each worker mirrors the unexpired rows in dicts (jti
+-> expiry, user id -> minimum version), which makes the checks in
+``auth.get_current_user`` hash lookups. Revocations made by this worker
+apply at once; rows added by other workers are picked up at most
+``REVOCATION_SYNC_SECONDS`` later.
+
+Each sync re-reads every unexpired row rather than those above the last id
+seen: ids from a sequence can commit out of order, and the table only holds
+revocations of tokens that have not expired yet, so it stays small.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def epoch(moment: datetime) -> float:
+    # SQLite hands timestamps back naive; they are stored in UTC
+    return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class RevocationList:
+    """Process-local set of revoked jtis and user token versions, synced from the table"""
+
+    def __init__(self, sync_interval: float = 5):
+        self.sync_interval = sync_interval
+        self._revoked: Dict[str, float] = {}  # jti -> expiry (epoch seconds)
+        self._min_versions: Dict[int, Tuple[int, float]] = {}  # user id -> (lowest valid version, expiry)
+        self._synced_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def __len__(self):
+        return len(self._revoked) + len(self._min_versions)
+
+    def min_version(self, user_id: int) -> int:
+        """Tokens of ``user_id`` with a lower "ver" claim are revoked"""
+        entry = self._min_versions.get(user_id)
+        return entry[0] if entry else 0
+
+    def add(self, jti: str, expires_at: datetime):
+        with self._lock:
+            self._revoked[jti] = epoch(expires_at)
+
+    def add_user(self, user_id: int, version: int, expires_at: datetime):
+        """Revoke the user's tokens older than ``version`` until ``expires_at``, when the last of them expires"""
+        with self._lock:
+            self._add_user(user_id, version, epoch(expires_at))
+
+    def _add_user(self, user_id: int, version: int, expiry: float):
+        current = self._min_versions.get(user_id)
+        if current is None or version >= current[0]:
+            self._min_versions[user_id] = (version, max(expiry, current[1]) if current else expiry)
+
+    def sync_due(self) -> bool:
+        return time.monotonic() - self._synced_at >= self.sync_interval
+
+    def merge(self, rows: Iterable[Tuple[Optional[str], Optional[int], Optional[int], datetime]]):
+        """Add (jti, user_id, token_version, expires_at) rows from the table and drop expired entries"""
+        now = time.time()
+        with self._lock:
+            for jti, user_id, version, expires_at in rows:
+                if jti is not None:
+                    self._revoked[jti] = epoch(expires_at)
+                if user_id is not None and version is not None:
+                    self._add_user(user_id, version, epoch(expires_at))
+            for jti in [jti for jti, expiry in self._revoked.items() if expiry <= now]:
+                del self._revoked[jti]
+            for user_id in [user_id for user_id, (_, expiry) in self._min_versions.items() if expiry <= now]:
+                del self._min_versions[user_id]
+            self._synced_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._min_versions.clear()
+            self._synced_at = float("-inf")
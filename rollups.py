@@ -0,0 +1,168 @@
+"""Monthly expense roll-ups: sum and count per (user, year, month, category).
+
+crud keeps ``expense_rollups`` in step with every expense write, inside the
+same transaction, so yearly reports read at most 12 x categories rows
+instead of scanning expenses. If the table drifts (manual SQL, restores),
+check and repair it from the directory above the project with::
+
+    python -m expanse_api.rollups verify [--user-id N]
+    python -m expanse_api.rollups rebuild [--user-id N]
+"""
+import argparse
+import math
+from collections import defaultdict
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Integer, cast, delete, extract, func, select
+from sqlalchemy.orm import Session
+
+from . import database, models
+
+# category_id stored for expenses without a category (it is part of the key)
+UNCATEGORIZED = 0
+
+KEY_COLUMNS = ["user_id", "year", "month", "category_id"]
+
+
+class RollupDeltas:
+    """Changes to roll-up rows, merged per key so each row is written once."""
+
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [0.0, 0])
+
+    def add(self, user_id: int, year: int, month: int, category_id: Optional[int], total: float, count: int):
+        entry = self._deltas[(user_id, year, month, category_id or UNCATEGORIZED)]
+        entry[0] += total
+        entry[1] += count
+        return self
+
+    def add_expense(self, expense: models.Expense, sign: int = 1):
+        """Count ``expense`` in (sign=1) or out of (sign=-1) its month"""
+        created_at = expense.created_at
+        return self.add(expense.user_id, created_at.year, created_at.month, expense.category_id,
+                        sign * expense.amount, sign)
+
+    def change_matching(self, db: Session, where: Sequence, changes: dict):
+        """Move the expenses matching ``where`` to the roll-ups they will have once
+        ``changes`` (amount and/or category_id) are written; call before the UPDATE."""
+        for user_id, year, month, category_id, total, count in db.execute(aggregate_expenses(where=where)):
+            self.add(user_id, year, month, category_id, -total, -count)
+            self.add(user_id, year, month, changes.get("category_id", category_id),
+                     changes["amount"] * count if "amount" in changes else total, count)
+        return self
+
+    def apply(self, db: Session):
+        rows = [
+            dict(zip(KEY_COLUMNS, key), total=total, count=count)
+            for key, (total, count) in self._deltas.items()
+            if total or count
+        ]
+        if rows:
+            upsert(db, rows)
+        self._deltas.clear()
+
+
+def upsert(db: Session, rows: List[dict]):
+    """Add each row's total/count onto the stored row, inserting it if missing"""
+    table = models.ExpenseRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=KEY_COLUMNS,
+            set_={"total": table.c.total + stmt.excluded.total, "count": table.c.count + stmt.excluded.count},
+        ))
+        return
+    for row in rows:
+        key = [table.c[column] == row[column] for column in KEY_COLUMNS]
+        updated = db.execute(
+            table.update().where(*key).values(total=table.c.total + row["total"], count=table.c.count + row["count"])
+        )
+        if not updated.rowcount:
+            db.execute(table.insert().values(row))
+
+
+def move_categories(db: Session, user_id: int, category_ids: Sequence[int], to_category_id: Optional[int] = None):
+    """Fold a user's roll-ups for ``category_ids`` into another category (default: uncategorized)"""
+    rollup = models.ExpenseRollup
+    where = (rollup.user_id == user_id, rollup.category_id.in_(category_ids))
+    deltas = RollupDeltas()
+    for year, month, total, count in db.execute(select(rollup.year, rollup.month, rollup.total, rollup.count)
+                                                .where(*where)):
+        deltas.add(user_id, year, month, to_category_id, total, count)
+    db.execute(delete(rollup).where(*where).execution_options(synchronize_session=False))
+    deltas.apply(db)
+
+
+def aggregate_expenses(user_id: Optional[int] = None, where: Sequence = ()):
+    """SELECT computing roll-up rows from the raw expenses (those matching ``where``)"""
+    expense = models.Expense
+    year = cast(extract("year", expense.created_at), Integer)
+    month = cast(extract("month", expense.created_at), Integer)
+    category_id = func.coalesce(expense.category_id, UNCATEGORIZED)
+    query = select(
+        expense.user_id, year.label("year"), month.label("month"), category_id.label("category_id"),
+        func.sum(expense.amount).label("total"), func.count(expense.id).label("count"),
+    ).group_by(expense.user_id, year, month, category_id)
+    if user_id is not None:
+        query = query.where(expense.user_id == user_id)
+    return query.where(*where)
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute roll-ups from expenses; returns the number of rows written"""
+    rollup = models.ExpenseRollup
+    delete = db.query(rollup)
+    if user_id is not None:
+        delete = delete.filter(rollup.user_id == user_id)
+    delete.delete(synchronize_session=False)
+    result = db.execute(
+        rollup.__table__.insert().from_select(KEY_COLUMNS + ["total", "count"], aggregate_expenses(user_id))
+    )
+    db.commit()
+    return result.rowcount
+
+
+def verify(db: Session, user_id: Optional[int] = None) -> List[dict]:
+    """Compare roll-ups with expenses; returns one entry per mismatching key"""
+    rollup = models.ExpenseRollup
+    expected = {tuple(row[:4]): (row.total, row.count) for row in db.execute(aggregate_expenses(user_id))}
+    stored_query = db.query(rollup).filter(rollup.count != 0)
+    if user_id is not None:
+        stored_query = stored_query.filter(rollup.user_id == user_id)
+    stored = {(r.user_id, r.year, r.month, r.category_id): (r.total, r.count) for r in stored_query}
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(key, (0.0, 0)), stored.get(key, (0.0, 0))
+        if want[1] != have[1] or not math.isclose(want[0], have[0], rel_tol=1e-9, abs_tol=1e-6):
+            mismatches.append(dict(zip(KEY_COLUMNS, key), expected=want, stored=have))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or rebuild expense roll-ups")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user-id", type=int)
+    args = parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(db, args.user_id)} roll-up rows")
+            return 0
+        mismatches = verify(db, args.user_id)
+        for mismatch in mismatches:
+            print(mismatch)
+        print(f"{len(mismatches)} roll-up rows out of step")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,50 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
-from .. import schemas, crud, database, auth, models
+from typing import List, Optional
+from .. import schemas, crud_async, database, auth, http_cache, models
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
 @router.post("/", response_model=schemas.Category)
-def create_category(category: schemas.CategoryCreate,
-                    db: Session = Depends(database.get_db),
-                    current_user: models.User = Depends(auth.get_current_user)):
+async def create_category(category: schemas.CategoryCreate,
+                          db: Session = Depends(database.get_session),
+                          current_user: models.User = Depends(auth.get_current_user)):
     """Create a new category"""
-    return crud.create_category(db, category, current_user.id)
+    return await crud_async.create_category(db, category, current_user.id)
 
-@router.get("/", response_model=List[schemas.Category])
-def get_categories(db: Session = Depends(database.get_db),
-                   current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/", response_model=List[schemas.Category], dependencies=[Depends(http_cache.conditional_get)])
+async def get_categories(db: Session = Depends(database.get_session),
+                         current_user: models.User = Depends(auth.get_current_user)):
     """Get user's categories"""
-    return crud.get_categories(db, current_user.id)
+    return await crud_async.get_categories(db, current_user.id)
 
 @router.get("/{category_id}", response_model=schemas.Category)
-def get_category(category_id: int,
-                 db: Session = Depends(database.get_db),
-                 current_user: models.User = Depends(auth.get_current_user)):
+async def get_category(category_id: int,
+                       db: Session = Depends(database.get_session),
+                       current_user: models.User = Depends(auth.get_current_user)):
     """Get a specific category"""
-    category = crud.get_category(db, category_id, current_user.id)
+    category = await crud_async.get_category(db, category_id, current_user.id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
 @router.put("/{category_id}", response_model=schemas.Category)
-def update_category(category_id: int,
-                    category_update: schemas.CategoryBase,
-                    db: Session = Depends(database.get_db),
-                    current_user: models.User = Depends(auth.get_current_user)):
+async def update_category(category_id: int,
+                          category_update: schemas.CategoryBase,
+                          db: Session = Depends(database.get_session),
+                          current_user: models.User = Depends(auth.get_current_user)):
     """Update a category"""
-    category = crud.update_category(db, category_id, current_user.id, category_update)
+    category = await crud_async.update_category(db, category_id, current_user.id, category_update)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
+async def check_reassign_target(db, user_id: int, reassign_to: Optional[int], category_ids: List[int]):
+    if reassign_to is None:
+        return
+    if reassign_to in category_ids:
+        raise HTTPException(status_code=400, detail="reassign_to cannot be a category being deleted")
+    if await crud_async.missing_categories(db, user_id, [reassign_to]):
+        raise HTTPException(status_code=404, detail="reassign_to category not found")
+
+@router.post("/bulk/delete", response_model=schemas.CategoryDeleteResult)
+async def delete_categories_bulk(request: schemas.CategoryBulkDelete,
+                                 db: Session = Depends(database.get_session),
+                                 current_user: models.User = Depends(auth.get_current_user)):
+    """Delete several categories at once; their expenses move to reassign_to or become uncategorized"""
+    await check_reassign_target(db, current_user.id, request.reassign_to, request.ids)
+    deleted, moved = await crud_async.delete_categories(db, current_user.id, request.ids, request.reassign_to)
+    return schemas.CategoryDeleteResult(deleted=len(deleted), moved=moved)
+
 @router.delete("/{category_id}")
-def delete_category(category_id: int,
-                    db: Session = Depends(database.get_db),
-                    current_user: models.User = Depends(auth.get_current_user)):
+async def delete_category(category_id: int,
+                          reassign_to: Optional[int] = Query(None, description="Move the category's expenses "
+                                                                               "here instead of uncategorizing them"),
+                          db: Session = Depends(database.get_session),
+                          current_user: models.User = Depends(auth.get_current_user)):
     """Delete a category"""
-    category = crud.delete_category(db, category_id, current_user.id)
-    if not category:
+    await check_reassign_target(db, current_user.id, reassign_to, [category_id])
+    moved = await crud_async.delete_category(db, category_id, current_user.id, reassign_to)
+    if moved is None:
         raise HTTPException(status_code=404, detail="Category not found")
-    return {"message": "Category deleted successfully"}
\ No newline at end of file
+    return {"message": "Category deleted successfully", "moved": moved}
\ No newline at end of file
@@ -1,53 +1,156 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from typing import Optional, List
-from datetime import datetime
-from .. import schemas, crud, database, auth, models
+import orjson
+from typing import Any, Dict, Literal, Optional, List, Tuple, Union
+from .. import schemas, crud, crud_async, database, auth, http_cache, models
+from ..config import settings
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
+class ExpenseRowsResponse(ORJSONResponse):
+    """Projected expense rows rendered by orjson as they are, skipping the
+    route's response_model; UTC datetimes end in Z, as Pydantic writes them"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+def response_fields(fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. "
+                                                                    "id,amount,created_at (category nests it)"),
+                    include_category: bool = Query(True, description="false returns category_id without the "
+                                                                     "nested category")) -> Tuple[str, ...]:
+    """The expense fields a list request asks for, in response order"""
+    if fields is None:
+        return crud.EXPENSE_FIELDS if include_category else crud.EXPENSE_FIELDS[:-1]
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(crud.EXPENSE_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Invalid fields; choose from {', '.join(crud.EXPENSE_FIELDS)}")
+    return tuple(name for name in crud.EXPENSE_FIELDS if name in requested)
+
+async def check_category(db, user_id: int, category_id: Optional[int]):
+    """404 unless ``category_id`` is None or one of the user's categories (checked against their cache)"""
+    if category_id is not None and await crud_async.missing_categories(db, user_id, [category_id]):
+        raise HTTPException(status_code=404, detail="Category not found")
+
+def check_amount(changes: schemas.ExpenseUpdate):
+    """422 for an explicit "amount": null, which would leave the expense (and its roll-up) without one"""
+    if "amount" in changes.model_fields_set and changes.amount is None:
+        raise HTTPException(status_code=422, detail="amount cannot be null")
+
 @router.post("/", response_model=schemas.ExpenseOut)
-def create_expense(expense: schemas.ExpenseCreate,
-                   db: Session = Depends(database.get_db),
-                   current_user: models.User = Depends(auth.get_current_user)):
+async def create_expense(expense: schemas.ExpenseCreate,
+                         db: Session = Depends(database.get_session),
+                         current_user: models.User = Depends(auth.get_current_user)):
     """Create a new expense"""
-    return crud.create_expense(db, current_user.id, expense)
+    await check_category(db, current_user.id, expense.category_id)
+    return await crud_async.create_expense(db, current_user.id, expense)
+
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_expenses_bulk(expenses: List[Dict[str, Any]] = Body(...),
+                               atomic: bool = Query(False, description="Insert nothing if any row is invalid"),
+                               db: Session = Depends(database.get_session),
+                               current_user: models.User = Depends(auth.get_current_user)):
+    """Create many expenses from a JSON array, reporting invalid rows by index"""
+    if len(expenses) > settings.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_ROWS} expenses per request; "
+                                                    "use /expenses/import for larger files")
+    return await crud_async.import_expenses(
+        db, current_user.id, enumerate(expenses), settings.BULK_BATCH_SIZE, atomic, settings.BULK_MAX_ERRORS
+    )
+
+@router.post("/import", response_model=schemas.BulkResult)
+async def import_expenses(file: UploadFile = File(..., description="CSV with amount, description, category_id, date"),
+                          atomic: bool = Query(False, description="Insert nothing if any row is invalid"),
+                          db: Session = Depends(database.get_session),
+                          current_user: models.User = Depends(auth.get_current_user)):
+    """Import expenses from a CSV upload, read row by row; reports invalid rows by line number"""
+    return await crud_async.import_expenses(
+        db, current_user.id, crud.read_expense_csv(file.file), settings.BULK_BATCH_SIZE, atomic,
+        settings.BULK_MAX_ERRORS
+    )
+
+@router.post("/bulk/update", response_model=schemas.BulkMutationResult)
+async def update_expenses_bulk(request: schemas.BulkExpenseUpdate,
+                               db: Session = Depends(database.get_session),
+                               current_user: models.User = Depends(auth.get_current_user)):
+    """Apply the same changes to every selected expense (by ids and/or filters)"""
+    check_amount(request.changes)
+    await check_category(db, current_user.id, request.changes.category_id)
+    affected = await crud_async.update_expenses(
+        db, current_user.id, request, request.changes, settings.BULK_BATCH_SIZE
+    )
+    return schemas.BulkMutationResult(affected=affected)
+
+@router.post("/bulk/delete", response_model=schemas.BulkMutationResult)
+async def delete_expenses_bulk(selection: schemas.ExpenseSelection,
+                               db: Session = Depends(database.get_session),
+                               current_user: models.User = Depends(auth.get_current_user)):
+    """Delete every selected expense (by ids and/or filters)"""
+    affected = await crud_async.delete_expenses(db, current_user.id, selection, settings.BULK_BATCH_SIZE)
+    return schemas.BulkMutationResult(affected=affected)
+
+@router.get("/", response_model=Union[List[schemas.ExpenseOut], schemas.ExpensePage,
+                                      List[schemas.ExpenseBrief], schemas.ExpenseBriefPage])
+async def get_expenses(skip: int = Query(0, ge=0),
+                      limit: int = Query(100, ge=1, le=1000),
+                      pagination: Literal["offset", "cursor"] = "offset",
+                      cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+                      filters: schemas.ExpenseFilter = Depends(),
+                      fields: Tuple[str, ...] = Depends(response_fields),
+                      cache_headers: Dict[str, str] = Depends(http_cache.conditional_get),
+                      version: int = Depends(http_cache.data_version),
+                      db: Session = Depends(database.get_session),
+                      current_user: models.User = Depends(auth.get_current_user)):
+    """Get user's expenses, newest first.
 
-@router.get("/", response_model=List[schemas.ExpenseOut])
-def get_expenses(skip: int = Query(0, ge=0),
-                limit: int = Query(100, ge=1, le=1000),
-                db: Session = Depends(database.get_db),
-                current_user: models.User = Depends(auth.get_current_user)):
-    """Get user's expenses with pagination"""
-    return crud.get_expenses(db, current_user.id, skip, limit)
+    By default this returns a plain list paginated by ``skip``/``limit``.
+    With ``pagination=cursor`` (or a ``cursor``) it returns ``{items, next_cursor}``
+    using keyset pagination, which stays fast on deep pages. Only the columns
+    behind the requested ``fields`` are read; ``include_category=false`` or a
+    ``fields`` list without ``category`` skips the category join. Send the
+    ETag back as ``If-None-Match`` to get 304 while nothing has changed.
+    """
+    if pagination == "offset" and cursor is None:
+        # Nested categories are at least as new as the version the ETag was made from
+        items = await crud_async.get_expense_rows(db, current_user.id, skip, limit, filters, fields, version)
+        return ExpenseRowsResponse(items, headers=cache_headers)
+    try:
+        items, next_cursor = await crud_async.get_expense_rows_page(db, current_user.id, limit, cursor, filters,
+                                                                    fields, version)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ExpenseRowsResponse({"items": items, "next_cursor": next_cursor}, headers=cache_headers)
 
 @router.get("/{expense_id}", response_model=schemas.ExpenseOut)
-def get_expense(expense_id: int,
-                db: Session = Depends(database.get_db),
-                current_user: models.User = Depends(auth.get_current_user)):
+async def get_expense(expense_id: int,
+                      db: Session = Depends(database.get_session),
+                      current_user: models.User = Depends(auth.get_current_user)):
     """Get a specific expense"""
-    expense = crud.get_expense(db, expense_id, current_user.id)
+    expense = await crud_async.get_expense(db, expense_id, current_user.id)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     return expense
 
 @router.put("/{expense_id}", response_model=schemas.ExpenseOut)
-def update_expense(expense_id: int,
-                   expense_update: schemas.ExpenseUpdate,
-                   db: Session = Depends(database.get_db),
-                   current_user: models.User = Depends(auth.get_current_user)):
+async def update_expense(expense_id: int,
+                         expense_update: schemas.ExpenseUpdate,
+                         db: Session = Depends(database.get_session),
+                         current_user: models.User = Depends(auth.get_current_user)):
     """Update an expense"""
-    expense = crud.update_expense(db, expense_id, current_user.id, expense_update)
+    check_amount(expense_update)
+    await check_category(db, current_user.id, expense_update.category_id)
+    expense = await crud_async.update_expense(db, expense_id, current_user.id, expense_update)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     return expense
 
 @router.delete("/{expense_id}")
-def delete_expense(expense_id: int,
-                   db: Session = Depends(database.get_db),
-                   current_user: models.User = Depends(auth.get_current_user)):
+async def delete_expense(expense_id: int,
+                         db: Session = Depends(database.get_session),
+                         current_user: models.User = Depends(auth.get_current_user)):
     """Delete an expense"""
-    expense = crud.delete_expense(db, expense_id, current_user.id)
+    expense = await crud_async.delete_expense(db, expense_id, current_user.id)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     return {"message": "Expense deleted successfully"}
\ No newline at end of file
@@ -1,113 +1,137 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Iterator, Optional
 from datetime import datetime
-import csv
-import io
-import pandas as pd
-from .. import database, crud, auth, schemas
+from .. import database, crud_async, auth, models, schemas, exports
 
 router = APIRouter(prefix="/export", tags=["export"])
 
-@router.get("/csv")
-def export_csv(start_date: Optional[datetime] = None,
-               end_date: Optional[datetime] = None,
-               categories: Optional[str] = None,
-               db: Session = Depends(database.get_db),
-               current_user=Depends(auth.get_current_user)):
-    
-    # Parse categories if provided
+def export_request(start_date: Optional[datetime] = None,
+                   end_date: Optional[datetime] = None,
+                   categories: Optional[str] = None) -> schemas.ExportRequest:
+    """Export filters from the query string; ``categories`` is a comma-separated id list"""
     category_list = None
     if categories:
         try:
             category_list = [int(x) for x in categories.split(',')]
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid categories format")
-    
-    # Get expenses
-    expenses = crud.get_expenses_for_export(db, current_user.id, start_date, end_date, category_list)
-    
-    # Create CSV content
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['ID', 'Description', 'Amount', 'Category', 'Date'])
-    
-    # Write data
-    for expense in expenses:
-        category_name = expense.category.name if expense.category else 'Uncategorized'
-        writer.writerow([
-            expense.id,
-            expense.description or '',
-            expense.amount,
-            category_name,
-            expense.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    output.seek(0)
-    
-    filename = f"expenses_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.csv"
-    
+    return schemas.ExportRequest(start_date=start_date, end_date=end_date, categories=category_list)
+
+def attachment(filename: str) -> dict:
+    return {"Content-Disposition": f"attachment; filename={filename}"}
+
+def closing_session(db: Session, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Pass ``chunks`` through, closing ``db`` once the body is sent or abandoned.
+
+    The session outlives the request's dependency cleanup, which runs before a
+    streaming body is sent, so the stream closes it itself.
+    """
+    try:
+        yield from chunks
+    finally:
+        db.close()
+
+def stream_export(db: Session, current_user, export: schemas.ExportRequest, export_format: str) -> StreamingResponse:
+    """Stream ``export`` in ``export_format``, encoding batch by batch as the response is sent"""
+    export.format = export_format
+    export_type = exports.FORMATS[export_format]
+    filename = f"expenses_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.{export_type.extension}"
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode()),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        closing_session(db, exports.export_chunks(db, current_user.id, export)),
+        media_type=export_type.media_type,
+        headers=attachment(filename)
     )
 
-@router.get("/excel")
-def export_excel(start_date: Optional[datetime] = None,
-                end_date: Optional[datetime] = None,
-                categories: Optional[str] = None,
+@router.get("/csv")
+def export_csv(export: schemas.ExportRequest = Depends(export_request),
+               db: Session = Depends(database.get_db),
+               current_user=Depends(auth.get_current_user)):
+    return stream_export(db, current_user, export, "csv")
+
+@router.get("/ndjson")
+def export_ndjson(export: schemas.ExportRequest = Depends(export_request),
+                  db: Session = Depends(database.get_db),
+                  current_user=Depends(auth.get_current_user)):
+    return stream_export(db, current_user, export, "ndjson")
+
+@router.get("/json")
+def export_json(export: schemas.ExportRequest = Depends(export_request),
                 db: Session = Depends(database.get_db),
                 current_user=Depends(auth.get_current_user)):
-    
-    # Parse categories if provided
-    category_list = None
-    if categories:
-        try:
-            category_list = [int(x) for x in categories.split(',')]
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid categories format")
-    
-    # Get expenses
-    expenses = crud.get_expenses_for_export(db, current_user.id, start_date, end_date, category_list)
-    
-    # Create DataFrame
-    data = []
-    for expense in expenses:
-        category_name = expense.category.name if expense.category else 'Uncategorized'
-        data.append({
-            'ID': expense.id,
-            'Description': expense.description or '',
-            'Amount': expense.amount,
-            'Category': category_name,
-            'Date': expense.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Expenses', index=False)
-        
-        # Add summary sheet
-        summary_data = {
-            'Total Expenses': [len(expenses)],
-            'Total Amount': [sum(expense.amount for expense in expenses)],
-            'Date Range': [f"{start_date or 'All'} to {end_date or 'All'}"]
-        }
-        summary_df = pd.DataFrame(summary_data)
-        summary_df.to_excel(writer, sheet_name='Summary', index=False)
-    
-    output.seek(0)
-    
-    filename = f"expenses_{current_user.username}_{datetime.now().strftime('%Y%m%d')}.xlsx"
-    
+    return stream_export(db, current_user, export, "json")
+
+@router.get("/excel")
+def export_excel(export: schemas.ExportRequest = Depends(export_request),
+                 db: Session = Depends(database.get_db),
+                 current_user=Depends(auth.get_current_user)):
+    return stream_export(db, current_user, export, "excel")
+
+@router.get("/parquet")
+def export_parquet(export: schemas.ExportRequest = Depends(export_request),
+                   db: Session = Depends(database.get_db),
+                   current_user=Depends(auth.get_current_user)):
+    try:
+        import pyarrow  # noqa: F401 - optional, only needed here
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    return stream_export(db, current_user, export, "parquet")
+
+# ========================
+# Background export jobs
+# ========================
+
+def job_filename(job: models.ExportJob) -> str:
+    return f"expenses_{job.created_at.strftime('%Y%m%d')}_{job.id[:8]}.{exports.FORMATS[job.format].extension}"
+
+def job_response(job: models.ExportJob) -> schemas.ExportResponse:
+    response = schemas.ExportResponse(id=job.id, status=job.status, format=job.format, error=job.error)
+    if job.status == "done":
+        response.filename = job_filename(job)
+        response.download_url = router.url_path_for("download_export_job", job_id=job.id)
+        response.total_records = job.total_records
+        response.file_size = exports.human_size(job.file_size)
+    return response
+
+@router.post("/", response_model=schemas.ExportResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(export: schemas.ExportRequest,
+                            db: Session = Depends(database.get_session),
+                            current_user=Depends(auth.get_current_user)):
+    """Queue an export; poll the job until it is done, then download it.
+
+    While an identical request (same format and filters) is still pending or
+    running, its job is returned instead of queueing another.
+    """
+    job, created = await crud_async.create_export_job(db, current_user.id, export)
+    if created:
+        exports.jobs.submit(job.id)
+    return job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=schemas.ExportResponse)
+async def get_export_job(job_id: str,
+                         db: Session = Depends(database.get_session),
+                         current_user=Depends(auth.get_current_user)):
+    """Get an export job's status"""
+    job = await crud_async.get_export_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job_response(job)
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(job_id: str,
+                              db: Session = Depends(database.get_session),
+                              current_user=Depends(auth.get_current_user)):
+    """Download a finished export"""
+    job = await crud_async.get_export_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    storage = exports.jobs.get_storage()
+    key = exports.storage_key(job)
+    if job.status != "done" or not storage.exists(key):
+        raise HTTPException(status_code=409, detail=f"Export is not ready (status: {job.status})")
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
\ No newline at end of file
+        exports.file_chunks(storage.open(key)),
+        media_type=exports.FORMATS[job.format].media_type,
+        headers=attachment(job_filename(job))
+    )
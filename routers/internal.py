@@ -0,0 +1,25 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from .. import auth, crud, database
+from ..config import settings
+
+router = APIRouter(prefix="/internal", tags=["internal"], include_in_schema=False)
+
+def check_internal_token(token: Optional[str]):
+    """The internal endpoints do not exist until INTERNAL_TOKEN is set, and then need it"""
+    if not settings.INTERNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not secrets.compare_digest(token.encode(), settings.INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@router.get("/metrics")
+def metrics(x_internal_token: Optional[str] = Header(None)):
+    """Connection pool and cache metrics for this worker process"""
+    check_internal_token(x_internal_token)
+    return {
+        "database": database.pool_stats(),
+        "user_cache": auth.user_cache.stats(),
+        "category_cache": crud.category_cache.stats(),
+    }
@@ -1,31 +1,34 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from .. import database, crud, auth, models, schemas
+from .. import database, crud_async, auth, http_cache, models, schemas
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
-@router.get("/monthly")
-def monthly_report(year: int, month: int,
-                   db: Session = Depends(database.get_db),
-                   current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/monthly", response_model=schemas.MonthlyReportResponse,
+            dependencies=[Depends(http_cache.conditional_get)])
+async def monthly_report(year: int, month: int = Query(..., ge=1, le=12),
+                         db: Session = Depends(database.get_session),
+                         current_user: models.User = Depends(auth.get_current_user)):
     """Get monthly expense report"""
-    return crud.get_monthly_report(db, current_user.id, year, month)
+    return await crud_async.get_monthly_report(db, current_user.id, year, month)
 
-@router.get("/yearly", response_model=schemas.YearlyReportResponse)
-def yearly_report(year: int,
-                  db: Session = Depends(database.get_db),
-                  current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/yearly", response_model=schemas.YearlyReportResponse,
+            dependencies=[Depends(http_cache.conditional_get)])
+async def yearly_report(year: int,
+                        db: Session = Depends(database.get_session),
+                        current_user: models.User = Depends(auth.get_current_user)):
     """Get yearly expense report"""
-    return crud.get_yearly_report(db, current_user.id, year)
+    return await crud_async.get_yearly_report(db, current_user.id, year)
 
-@router.get("/summary")
-def expense_summary(db: Session = Depends(database.get_db),
-                   current_user: models.User = Depends(auth.get_current_user)):
-    """Get expense summary"""
-    expenses = crud.get_expenses(db, current_user.id)
-    total = sum(expense.amount for expense in expenses)
-    return {
-        "total_expenses": len(expenses),
-        "total_amount": total,
-        "average_expense": total / len(expenses) if expenses else 0
-    }
\ No newline at end of file
+@router.get("/summary", response_model=schemas.ExpenseSummary,
+            dependencies=[Depends(http_cache.conditional_get)])
+async def expense_summary(start_date: Optional[datetime] = None,
+                          end_date: Optional[datetime] = None,
+                          by_category: bool = False,
+                          db: Session = Depends(database.get_session),
+                          current_user: models.User = Depends(auth.get_current_user)):
+    """Get expense summary over all of the user's expenses, optionally within a date window"""
+    return await crud_async.get_expense_summary(db, current_user.id, start_date, end_date, by_category)
\ No newline at end of file
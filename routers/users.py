@@ -1,27 +1,79 @@
+from datetime import datetime, timezone
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import models, schemas, crud, auth, database
+from .. import models, schemas, crud_async, auth, database
+from ..passwords import HasherBusy
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+def hasher_busy() -> HTTPException:
+    """The password pool's queue is full: shed load rather than queue without bound"""
+    return HTTPException(status_code=503, detail="Too many logins in progress, retry shortly",
+                         headers={"Retry-After": "1"})
+
+def token_response(user, refresh_token: str) -> schemas.Token:
+    return schemas.Token(access_token=auth.create_access_token(data=auth.user_claims(user)),
+                         refresh_token=refresh_token, expires_in=auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 @router.post("/signup", response_model=schemas.UserOut)
-def signup(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
+async def signup(user: schemas.UserCreate, db: Session = Depends(database.get_session)):
     """Register a new user account"""
-    db_user = crud.get_user_by_username(db, user.username)
+    db_user = await crud_async.get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db, user)
+    try:
+        return await crud_async.create_user(db, user)
+    except HasherBusy:
+        raise hasher_busy()
 
-@router.post("/login")
-def login(form_data: schemas.UserLogin, db: Session = Depends(database.get_db)):
-    """Login and get access token"""
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+@router.post("/login", response_model=schemas.Token)
+async def login(form_data: schemas.UserLogin, db: Session = Depends(database.get_session)):
+    """Login and get access and refresh tokens"""
+    try:
+        user = await crud_async.authenticate_user(db, form_data.username, form_data.password)
+    except HasherBusy:
+        raise hasher_busy()
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    token = auth.create_access_token(data={"sub": user.username})
-    return {"access_token": token, "token_type": "bearer"}
+    refresh_token, expires_at = auth.new_refresh_token()
+    await crud_async.create_refresh_token(db, user.id, auth.refresh_token_hash(refresh_token), expires_at)
+    return token_response(user, refresh_token)
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh(request: schemas.RefreshRequest, db: Session = Depends(database.get_session)):
+    """Exchange a refresh token for new access and refresh tokens (the old one stops working)"""
+    refresh_token, expires_at = auth.new_refresh_token()
+    user = await crud_async.rotate_refresh_token(
+        db, auth.refresh_token_hash(request.refresh_token), auth.refresh_token_hash(refresh_token), expires_at
+    )
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return token_response(user, refresh_token)
+
+@router.post("/logout")
+async def logout(request: Optional[schemas.LogoutRequest] = None,
+                 token: str = Depends(auth.oauth2_scheme),
+                 db: Session = Depends(database.get_session),
+                 current_user: models.User = Depends(auth.get_current_user)):
+    """Revoke this access token, and the session's refresh tokens when given"""
+    claims = auth.decode_token(token)
+    expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+    refresh_hash = auth.refresh_token_hash(request.refresh_token) if request and request.refresh_token else None
+    await crud_async.logout(db, current_user.id, claims.get("jti"), expires_at, refresh_hash)
+    if "jti" in claims:
+        auth.revoked_tokens.add(claims["jti"], expires_at)
+    return {"message": "Logged out"}
+
+@router.post("/logout-all")
+async def logout_all(db: Session = Depends(database.get_session),
+                     current_user: models.User = Depends(auth.get_current_user)):
+    """Revoke every access and refresh token issued to this user so far"""
+    await crud_async.revoke_user_tokens(db, current_user.id)
+    return {"message": "Logged out everywhere"}
 
 @router.get("/me", response_model=schemas.UserOut)
-def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
+async def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
     """Get current user information"""
     return current_user
\ No newline at end of file
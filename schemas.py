@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -23,6 +23,18 @@ class UserOut(UserBase):
     class Config:
         from_attributes = True
 
+class Token(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int  # seconds until the access token expires
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None  # also revoke this session's refresh tokens
+
 # ========================
 # Category Schemas
 # ========================
@@ -53,6 +65,14 @@ class Category(CategoryBase):
     class Config:
         from_attributes = True
 
+class CategoryBulkDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+    reassign_to: Optional[int] = None  # move their expenses here instead of leaving them uncategorized
+
+class CategoryDeleteResult(BaseModel):
+    deleted: int
+    moved: int  # expenses reassigned (or left uncategorized)
+
 # ========================
 # Expense Schemas
 # ========================
@@ -65,6 +85,18 @@ class ExpenseBase(BaseModel):
 class ExpenseCreate(ExpenseBase):
     pass
 
+class ExpenseImport(ExpenseCreate):
+    created_at: Optional[datetime] = None  # defaults to the time of the import
+
+class RowError(BaseModel):
+    row: int  # index in a JSON array, line number in a CSV file
+    errors: List[str]
+
+class BulkResult(BaseModel):
+    created: int
+    failed: int
+    errors: List[RowError]  # the first BULK_MAX_ERRORS failures
+
 class ExpenseUpdate(BaseModel):
     amount: Optional[float] = None
     description: Optional[str] = None
@@ -83,6 +115,48 @@ class Expense(ExpenseBase):
 # For backward compatibility
 ExpenseOut = Expense
 
+class ExpenseBrief(ExpenseBase):
+    """An expense with its category_id only, for lighter list payloads"""
+    id: int
+    user_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ExpenseFilter(BaseModel):
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    category_id: Optional[int] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+class ExpenseSelection(BaseModel):
+    """Expenses picked by id list, by filter, or both (the ids that also match)"""
+    ids: Optional[List[int]] = None
+    filters: Optional[ExpenseFilter] = None
+
+    @model_validator(mode="after")
+    def require_criteria(self):
+        if self.ids is None and self.filters is None:
+            raise ValueError("Provide ids and/or filters; use filters: {} to select every expense")
+        return self
+
+class BulkExpenseUpdate(ExpenseSelection):
+    changes: ExpenseUpdate
+
+class BulkMutationResult(BaseModel):
+    affected: int
+
+class ExpensePage(BaseModel):
+    items: List[Expense]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+class ExpenseBriefPage(BaseModel):
+    items: List[ExpenseBrief]
+    next_cursor: Optional[str] = None
+
 # ========================
 # Report Schemas
 # ========================
@@ -108,6 +182,20 @@ class YearlyReportResponse(BaseModel):
     monthly_breakdown: dict
     top_categories: List[CategoryExpense]
 
+class CategorySummary(BaseModel):
+    category_id: Optional[int] = None
+    category_name: str
+    expense_count: int
+    total_amount: float
+
+class ExpenseSummary(BaseModel):
+    total_expenses: int  # number of expenses
+    total_amount: float
+    average_expense: float
+    min_expense: Optional[float] = None
+    max_expense: Optional[float] = None
+    categories: Optional[List[CategorySummary]] = None  # only with by_category
+
 # ========================
 # Export Schemas
 # ========================
@@ -116,10 +204,15 @@ class ExportRequest(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     categories: Optional[List[int]] = None
-    format: str = "csv"  # csv, excel, json
+    format: Literal["csv", "excel", "json", "ndjson", "parquet"] = "csv"
 
 class ExportResponse(BaseModel):
-    filename: str
-    download_url: str
-    total_records: int
-    file_size: str
\ No newline at end of file
+    id: str
+    status: str  # pending, running, done, failed
+    format: str
+    # Set once the job is done
+    filename: Optional[str] = None
+    download_url: Optional[str] = None
+    total_records: Optional[int] = None
+    file_size: Optional[str] = None
+    error: Optional[str] = None
\ No newline at end of file
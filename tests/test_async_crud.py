@@ -0,0 +1,65 @@
+import fakeredis
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import crud
+import crud_async
+import schemas
+from cache import RedisCache
+from database import Base, async_url
+from conftest import BlockingRedis
+
+@pytest_asyncio.fixture
+async def async_db():
+    engine = create_async_engine(async_url("sqlite://"), poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+class TestAsyncCrud:
+
+    def test_async_url_maps_drivers(self):
+        """Test sync URLs are mapped onto asyncpg / aiosqlite"""
+        assert async_url("postgresql+psycopg2://u:p@db/expenses").drivername == "postgresql+asyncpg"
+        assert async_url("sqlite:///./test.db").drivername == "sqlite+aiosqlite"
+
+    @pytest.mark.asyncio
+    async def test_expense_lifecycle(self, async_db):
+        """Test the async CRUD layer end to end on aiosqlite"""
+        user = await crud_async.create_user(async_db, schemas.UserCreate(username="asyncuser", password="pass123"))
+        assert await crud_async.authenticate_user(async_db, "asyncuser", "pass123") is not None
+        assert await crud_async.authenticate_user(async_db, "asyncuser", "wrong") is None
+
+        category = await crud_async.create_category(async_db, schemas.CategoryCreate(name="Food"), user.id)
+        expense = await crud_async.create_expense(
+            async_db, user.id, schemas.ExpenseCreate(amount=12.5, description="Lunch", category_id=category.id)
+        )
+        # Serializing must not need a lazy load on the async session
+        assert schemas.Expense.model_validate(expense).category.name == "Food"
+
+        expenses = await crud_async.get_expense_rows(async_db, user.id)
+        assert [(e["id"], e["category"]["name"]) for e in expenses] == [(expense.id, "Food")]
+
+        updated = await crud_async.update_expense(async_db, expense.id, user.id, schemas.ExpenseUpdate(amount=20))
+        assert updated.amount == 20
+
+        assert await crud_async.delete_expense(async_db, expense.id, user.id) is not None
+        assert await crud_async.get_expense(async_db, expense.id, user.id) is None
+
+    @pytest.mark.asyncio
+    async def test_shared_cache_is_awaited_inside_run_sync(self, async_db, monkeypatch):
+        """Test crud's category cache calls, run on the event loop by run_sync, go through the asyncio client"""
+        cache = RedisCache(BlockingRedis(), "category", ttl=60, async_client=fakeredis.FakeAsyncRedis())
+        monkeypatch.setattr(crud, "category_cache", cache)
+        user = await crud_async.create_user(async_db, schemas.UserCreate(username="asyncredis", password="pass123"))
+        category = await crud_async.create_category(async_db, schemas.CategoryCreate(name="Food"), user.id)
+        await crud_async.create_expense(async_db, user.id, schemas.ExpenseCreate(amount=1, category_id=category.id))
+
+        for _ in range(2):
+            rows = await crud_async.get_expense_rows(async_db, user.id)
+            assert rows[0]["category"]["name"] == "Food"
+        assert cache.stats()["hits"] == 1
@@ -0,0 +1,190 @@
+import io
+from datetime import datetime
+
+from fastapi import status
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql
+
+import crud
+import models
+import rollups
+import schemas
+
+class TestImportExpenses:
+
+    def test_valid_rows_are_inserted_and_invalid_reported(self, db_session, make_user):
+        """Test rows are validated per batch, with bad amounts and foreign categories reported"""
+        user = make_user("bulkuser")
+        other = make_user("bulkother")
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        foreign = crud.create_category(db_session, schemas.CategoryCreate(name="Theirs"), other.id)
+        rows = enumerate([
+            {"amount": 10, "category_id": food.id},
+            {"amount": "ten"},
+            {"amount": 2.5, "description": "dated", "created_at": "2025-03-04T10:00:00"},
+            {"amount": 1, "category_id": foreign.id},
+            {"amount": 4},
+        ])
+
+        result = crud.import_expenses(db_session, user.id, rows, batch_size=2)
+
+        assert (result.created, result.failed) == (3, 2)
+        assert [(error.row, error.errors[0].split(":")[0]) for error in result.errors] == [
+            (1, "amount"), (3, "category_id"),
+        ]
+        expenses = crud.get_expense_rows(db_session, user.id)
+        assert sorted(e["amount"] for e in expenses) == [2.5, 4, 10]
+        assert [e["created_at"] for e in expenses if e["description"] == "dated"] == [datetime(2025, 3, 4, 10, 0)]
+        assert rollups.verify(db_session, user.id) == []
+
+    def test_offset_timestamps_count_in_their_utc_month(self, db_session, make_user):
+        """Test a timestamp with a time zone is stored and rolled up in UTC, not in its local month"""
+        user = make_user("tzuser")
+        rows = enumerate([{"amount": 3, "created_at": "2025-03-31T23:30:00-05:00"}])
+
+        assert crud.import_expenses(db_session, user.id, rows).created == 1
+
+        assert crud.get_expense_rows(db_session, user.id)[0]["created_at"] == datetime(2025, 4, 1, 4, 30)
+        assert rollups.verify(db_session, user.id) == []
+        assert crud.get_yearly_report(db_session, user.id, 2025).monthly_breakdown == {"April": 3}
+
+    def test_error_list_is_capped(self, db_session, make_user):
+        """Test only the first max_errors failures are listed, but all are counted"""
+        user = make_user("capuser")
+
+        result = crud.import_expenses(db_session, user.id, enumerate([{}] * 5), max_errors=2)
+
+        assert (result.failed, len(result.errors)) == (5, 2)
+
+class TestBulkEndpoints:
+
+    def test_bulk_json(self, client, make_auth_headers):
+        """Test POST /expenses/bulk creates the valid rows and reports the rest"""
+        headers = make_auth_headers("bulkjson")
+
+        response = client.post("/expenses/bulk", json=[{"amount": 5}, {"amount": -1, "description": None}, {"x": 1}],
+                               headers=headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["created"] == 2
+        assert response.json()["errors"] == [{"row": 2, "errors": ["amount: Field required"]}]
+        assert len(client.get("/expenses/", headers=headers).json()) == 2
+
+    def test_csv_import(self, client, make_auth_headers):
+        """Test POST /expenses/import reads an uploaded CSV, including an export's columns"""
+        headers = make_auth_headers("bulkcsv")
+        food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+        content = (
+            "ID,Description,Amount,Category_ID,Date\n"
+            f"1,lunch,12.5,{food['id']},2026-01-15 12:30:00\n"
+            "2,coffee,abc,,2026-01-16\n"
+            "\n"
+            "3,,3,,\n"
+        )
+
+        response = client.post("/expenses/import", files={"file": ("statement.csv", io.BytesIO(content.encode()), "text/csv")},
+                               headers=headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        result = response.json()
+        assert (result["created"], result["failed"]) == (2, 1)
+        assert result["errors"][0]["row"] == 3
+        expenses = client.get("/expenses/", headers=headers).json()
+        assert sorted(e["amount"] for e in expenses) == [3, 12.5]
+        assert [e["category"]["name"] for e in expenses if e["amount"] == 12.5] == ["Food"]
+
+    def test_atomic_import_rolls_back(self, client, make_auth_headers):
+        """Test atomic imports insert nothing when any row is invalid"""
+        headers = make_auth_headers("bulkatomic")
+
+        response = client.post("/expenses/bulk", params={"atomic": True}, json=[{"amount": 1}, {}], headers=headers)
+
+        assert (response.json()["created"], response.json()["failed"]) == (0, 1)
+        assert client.get("/expenses/", headers=headers).json() == []
+
+    def test_bulk_row_limit(self, client, make_auth_headers, monkeypatch):
+        """Test oversized JSON bodies are rejected before any insert"""
+        from config import settings
+        monkeypatch.setattr(settings, "BULK_MAX_ROWS", 2)
+        headers = make_auth_headers("bulklimit")
+
+        response = client.post("/expenses/bulk", json=[{"amount": 1}] * 3, headers=headers)
+
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+class TestBulkMutations:
+
+    def test_update_by_ids_and_filter(self, db_session, make_user):
+        """Test bulk updates touch only the owner's selected rows and keep roll-ups in step"""
+        user = make_user("bulkupd")
+        other = make_user("bulkupdother")
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        mine = [crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=a)).id for a in (1, 2, 50)]
+        theirs = crud.create_expense(db_session, other.id, schemas.ExpenseCreate(amount=3)).id
+
+        affected = crud.update_expenses(
+            db_session, user.id, schemas.ExpenseSelection(ids=mine[:2] + [theirs]),
+            schemas.ExpenseUpdate(category_id=food.id), batch_size=1
+        )
+        assert affected == 2
+
+        affected = crud.update_expenses(
+            db_session, user.id, schemas.ExpenseSelection(filters=schemas.ExpenseFilter(min_amount=2)),
+            schemas.ExpenseUpdate(amount=10, description="cleaned")
+        )
+        assert affected == 2
+
+        db_session.expire_all()
+        expenses = {e["id"]: e for e in crud.get_expense_rows(db_session, user.id)}
+        assert [(expenses[i]["amount"], expenses[i]["category_id"]) for i in mine] == [
+            (1, food.id), (10, food.id), (10, None),
+        ]
+        assert expenses[mine[2]]["description"] == "cleaned" and expenses[mine[2]]["updated_at"] is not None
+        assert crud.get_expense(db_session, theirs, other.id).category_id is None
+        assert rollups.verify(db_session) == []
+
+    def test_delete_by_filter(self, db_session, make_user):
+        """Test bulk deletes are scoped to the owner and keep roll-ups in step"""
+        user = make_user("bulkdel")
+        other = make_user("bulkdelother")
+        for amount in (1, 5, 9):
+            crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=amount))
+        crud.create_expense(db_session, other.id, schemas.ExpenseCreate(amount=5))
+
+        affected = crud.delete_expenses(
+            db_session, user.id, schemas.ExpenseSelection(filters=schemas.ExpenseFilter(max_amount=5))
+        )
+
+        assert affected == 2
+        assert [e["amount"] for e in crud.get_expense_rows(db_session, user.id)] == [9]
+        assert len(crud.get_expense_rows(db_session, other.id)) == 1
+        assert rollups.verify(db_session) == []
+
+    def test_postgres_update_returns_locked_pre_image(self):
+        """Test the PostgreSQL bulk UPDATE locks the rows it reads old values from and returns them"""
+        expense = models.Expense
+        old = crud.locked_pre_image([expense.user_id == 1])
+        sql = str(update(expense).values(amount=1).where(expense.id == old.c.id)
+                  .returning(old.c.old_amount).compile(dialect=postgresql.dialect()))
+
+        assert "FOR UPDATE" in sql
+        assert 'FROM "old" WHERE expenses.id = "old".id RETURNING "old".old_amount' in sql
+
+    def test_endpoints(self, client, make_auth_headers):
+        """Test the bulk update/delete endpoints return affected counts and validate input"""
+        headers = make_auth_headers("bulkapi")
+        ids = [client.post("/expenses/", json={"amount": a}, headers=headers).json()["id"] for a in (1, 2, 3)]
+
+        response = client.post("/expenses/bulk/update", json={"ids": ids[:2], "changes": {"description": "x"}},
+                               headers=headers)
+        assert response.json() == {"affected": 2}
+
+        response = client.post("/expenses/bulk/update", json={"ids": ids, "changes": {"category_id": 999}},
+                               headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = client.post("/expenses/bulk/delete", json={}, headers=headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+        response = client.post("/expenses/bulk/delete", json={"filters": {}}, headers=headers)
+        assert response.json() == {"affected": 3}
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import fakeredis
+from fastapi import status
+from sqlalchemy.util.concurrency import greenlet_spawn
+
+import auth
+import crud_async
+from cache import LRUCache, RedisCache
+from conftest import BlockingRedis
+
+class TestLRUCache:
+
+    def test_get_set_and_counters(self):
+        """Test hits and misses are counted"""
+        cache = LRUCache(maxsize=10, ttl=60)
+        assert cache.get("alice") is None
+        cache.set("alice", {"id": 1})
+
+        assert cache.get("alice") == {"id": 1}
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest untouched entry is evicted at maxsize"""
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self):
+        """Test entries are dropped after their TTL"""
+        cache = LRUCache(maxsize=10, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+class TestRedisCache:
+
+    def test_round_trip_and_delete(self):
+        """Test values are shared through the Redis client"""
+        client = fakeredis.FakeRedis()
+        writer = RedisCache(client, "user", ttl=60)
+        reader = RedisCache(client, "user", ttl=60)
+        writer.set("alice", {"id": 1, "username": "alice"})
+
+        assert reader.get("alice") == {"id": 1, "username": "alice"}
+        writer.delete("alice")
+        assert reader.get("alice") is None
+        assert reader.stats() == {"backend": "redis", "hits": 1, "misses": 1}
+
+    def test_event_loop_callers_use_the_async_client(self):
+        """Test async methods, and sync calls made as AsyncSession.run_sync makes them, never block on the sync client"""
+        server = fakeredis.FakeServer()
+        cache = RedisCache(BlockingRedis(), "user", ttl=60, async_client=fakeredis.FakeAsyncRedis(server=server))
+        async def on_the_loop():
+            await cache.aset("alice", {"id": 1})
+            assert await cache.aget("alice") == {"id": 1}
+            assert await greenlet_spawn(cache.get, "alice") == {"id": 1}
+            await greenlet_spawn(cache.set, "bob", {"id": 2})
+            await greenlet_spawn(cache.delete, "alice")
+            return await cache.aget("alice")
+
+        assert asyncio.run(on_the_loop()) is None
+        assert RedisCache(fakeredis.FakeRedis(server=server), "user").get("bob") == {"id": 2}
+
+class TestCurrentUserCache:
+
+    def test_authenticated_requests_skip_user_lookup(self, client, make_auth_headers, monkeypatch):
+        """Test only the first authenticated request queries the users table"""
+        headers = make_auth_headers("cacheduser")
+        calls = []
+        by_id, by_username = crud_async.get_user, crud_async.get_user_by_username
+
+        async def counting_by_id(db, user_id):
+            calls.append(user_id)
+            return await by_id(db, user_id)
+
+        async def counting_by_username(db, name):
+            calls.append(name)
+            return await by_username(db, name)
+
+        monkeypatch.setattr(crud_async, "get_user", counting_by_id)
+        monkeypatch.setattr(crud_async, "get_user_by_username", counting_by_username)
+
+        for _ in range(3):
+            response = client.get("/users/me", headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.json()["username"] == "cacheduser"
+
+        # One primary-key lookup, by the id the token carries
+        assert calls == [response.json()["id"]]
+        assert auth.user_cache.stats()["hits"] == 2
+
+    def test_redis_lookups_do_not_block_the_event_loop(self, client, make_auth_headers, monkeypatch):
+        """Test get_current_user reads and fills a Redis user cache through the asyncio client"""
+        headers = make_auth_headers("asyncredisuser")
+        server = fakeredis.FakeServer()
+        cache = RedisCache(BlockingRedis(), "user", ttl=60, async_client=fakeredis.FakeAsyncRedis(server=server))
+        monkeypatch.setattr(auth, "user_cache", cache)
+
+        for _ in range(2):
+            assert client.get("/users/me", headers=headers).status_code == status.HTTP_200_OK
+        assert cache.stats() == {"backend": "redis", "hits": 1, "misses": 1}
+
+    def test_create_user_invalidates_cached_identity(self):
+        """Test creating a user drops any stale cache entry"""
+        auth.user_cache.set("ghost", {"id": 999, "username": "ghost"})
+        auth.invalidate_user("ghost")
+
+        assert auth.user_cache.get("ghost") is None
@@ -0,0 +1,178 @@
+import pytest
+from fastapi import status
+from sqlalchemy import func, select
+
+import crud
+import models
+import rollups
+import schemas
+from conftest import QueryCounter, TestingSessionLocal
+
+@pytest.fixture
+def owner(client, make_auth_headers):
+    """Headers of a user with one category, and that category"""
+    headers = make_auth_headers("catowner")
+    category = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+    return headers, category
+
+class TestCategoryValidation:
+
+    def test_expense_writes_reject_foreign_categories(self, client, owner, make_auth_headers):
+        """Test creating or moving an expense into another user's (or no) category gets 404"""
+        headers, category = owner
+        other = make_auth_headers("catintruder")
+        response = client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=other)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = client.post("/expenses/", json={"amount": 5, "category_id": 999999}, headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        expense = client.post("/expenses/", json={"amount": 5}, headers=other).json()
+        response = client.put(f"/expenses/{expense['id']}", json={"category_id": category["id"]}, headers=other)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert client.get(f"/expenses/{expense['id']}", headers=other).json()["category_id"] is None
+
+    def test_own_category_is_accepted(self, client, owner):
+        """Test the owner's category passes validation on create and update"""
+        headers, category = owner
+        response = client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["category"]["name"] == "Food"
+        response = client.put(f"/expenses/{response.json()['id']}", json={"category_id": category["id"]},
+                              headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_stale_cache_is_refreshed_before_rejecting(self, client, owner):
+        """Test a category missing from an older cache entry (created via another worker) is re-read, not rejected"""
+        headers, category = owner
+        crud.category_cache.set(str(category["user_id"]), {"version": 0, "categories": []})
+        response = client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_stale_cache_does_not_accept_deleted_categories(self, client, owner, db_engine):
+        """Test a category deleted via another worker, still in this one's cache, is rejected"""
+        headers, category = owner
+        with TestingSessionLocal() as db:
+            stale = db.scalar(select(models.User.data_version).where(models.User.id == category["user_id"]))
+        client.delete(f"/categories/{category['id']}", headers=headers)
+        crud.category_cache.set(str(category["user_id"]), {"version": stale, "categories": [category]})
+
+        response = client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+class TestCategoryCache:
+
+    def test_lists_attach_cached_categories_without_a_join(self, db_session, make_user, assert_num_queries):
+        """Test expense lists read categories once, then from the cache, never joined"""
+        user = make_user("cachecat")
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        for i in range(10):
+            crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=i, category_id=food.id))
+
+        with assert_num_queries(3) as queries:
+            rows = crud.get_expense_rows(db_session, user.id)
+        assert "JOIN" not in queries.statements[0].upper()
+        assert {row["category"]["name"] for row in rows} == {"Food"}
+
+        # The route passes in the data version its ETag was made from
+        version = crud.get_data_version(db_session, user.id)
+        with assert_num_queries(1):
+            page, _ = crud.get_expense_rows_page(db_session, user.id, limit=5, version=version)
+        assert page[0]["category"] == rows[0]["category"]
+
+    def test_category_writes_invalidate(self, client, owner):
+        """Test renaming or deleting a category shows up in the next expense list"""
+        headers, category = owner
+        client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+        assert client.get("/expenses/", headers=headers).json()[0]["category"]["name"] == "Food"
+
+        client.put(f"/categories/{category['id']}", json={"name": "Groceries"}, headers=headers)
+        assert client.get("/expenses/", headers=headers).json()[0]["category"]["name"] == "Groceries"
+
+        client.delete(f"/categories/{category['id']}", headers=headers)
+        assert client.get("/expenses/", headers=headers).json()[0]["category"] is None
+        response = client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_entries_older_than_the_etag_are_reread(self, client, owner):
+        """Test a rename via another worker is listed under the new ETag even while this one caches the old name"""
+        headers, category = owner
+        client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+        client.get("/expenses/", headers=headers)
+        stale = crud.category_cache.get(str(category["user_id"]))
+
+        client.put(f"/categories/{category['id']}", json={"name": "Groceries"}, headers=headers)
+        crud.category_cache.set(str(category["user_id"]), stale)
+        response = client.get("/expenses/", headers=headers)
+        assert response.json()[0]["category"]["name"] == "Groceries"
+
+        crud.category_cache.clear()
+        response = client.get("/expenses/", headers={**headers, "If-None-Match": response.headers["etag"]})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+@pytest.fixture
+def filled_categories(db_session, make_user):
+    """A user with three categories of four expenses each, and one uncategorized expense"""
+    user = make_user("catdeleter")
+    categories = [crud.create_category(db_session, schemas.CategoryCreate(name=f"Cat {i}"), user.id) for i in range(3)]
+    for i in range(12):
+        crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=i, category_id=categories[i % 3].id))
+    crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=100))
+    return user, [category.id for category in categories]
+
+def category_counts(db_session, user_id):
+    rows = db_session.execute(select(models.Expense.category_id, func.count())
+                              .where(models.Expense.user_id == user_id).group_by(models.Expense.category_id))
+    return dict(rows.all())
+
+class TestCategoryDeletion:
+
+    def test_reassign_moves_expenses_and_rollups(self, db_session, filled_categories):
+        """Test deleting with reassign_to moves the expenses and their roll-ups there"""
+        user, (first, second, third) = filled_categories
+        assert crud.delete_category(db_session, first, user.id, reassign_to=second) == 4
+
+        assert category_counts(db_session, user.id) == {second: 8, third: 4, None: 1}
+        assert crud.get_category(db_session, first, user.id) is None
+        assert rollups.verify(db_session, user.id) == []
+
+    def test_bulk_delete_uncategorizes(self, db_session, filled_categories):
+        """Test deleting several categories at once leaves their expenses uncategorized"""
+        user, (first, second, third) = filled_categories
+        deleted, moved = crud.delete_categories(db_session, user.id, [first, third, 999999])
+
+        assert (deleted, moved) == ([first, third], 8)
+        assert category_counts(db_session, user.id) == {second: 4, None: 9}
+        assert rollups.verify(db_session, user.id) == []
+
+    def test_statements_do_not_grow_with_categories(self, db_session, filled_categories, db_engine):
+        """Test deleting many categories takes as many statements as deleting one"""
+        user, (first, second, third) = filled_categories
+        with QueryCounter(db_engine) as one:
+            crud.delete_categories(db_session, user.id, [first])
+        with QueryCounter(db_engine) as two:
+            crud.delete_categories(db_session, user.id, [second, third])
+        assert one.kinds == two.kinds
+        assert one.kinds.count("UPDATE") == 2  # the expenses, and the user's data version
+
+    def test_api(self, client, owner, make_auth_headers):
+        """Test the delete routes report moved expenses and check the reassignment target"""
+        headers, food = owner
+        other = client.post("/categories/", json={"name": "Other"}, headers=headers).json()
+        client.post("/expenses/", json={"amount": 5, "category_id": food["id"]}, headers=headers)
+
+        response = client.delete(f"/categories/{food['id']}", params={"reassign_to": food["id"]}, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        foreign = client.post("/categories/", json={"name": "Theirs"}, headers=make_auth_headers("catstranger"))
+        response = client.delete(f"/categories/{food['id']}", params={"reassign_to": foreign.json()["id"]},
+                                 headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = client.delete(f"/categories/{food['id']}", params={"reassign_to": other["id"]}, headers=headers)
+        assert response.json() == {"message": "Category deleted successfully", "moved": 1}
+        assert client.get("/expenses/", headers=headers).json()[0]["category"]["name"] == "Other"
+        assert client.delete(f"/categories/{food['id']}", headers=headers).status_code == status.HTTP_404_NOT_FOUND
+
+        response = client.post("/categories/bulk/delete", json={"ids": [other["id"], foreign.json()["id"]]},
+                               headers=headers)
+        assert response.json() == {"deleted": 1, "moved": 1}
+        assert client.get("/expenses/", headers=headers).json()[0]["category"] is None
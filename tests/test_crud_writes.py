@@ -0,0 +1,83 @@
+import pytest
+from fastapi import status
+
+import crud
+import models
+import rollups
+import schemas
+
+@pytest.fixture
+def users(make_user):
+    return [make_user(name) for name in ("writer", "other")]
+
+class TestReturningWrites:
+
+    def test_create_expense_is_one_insert(self, db_session, users, assert_num_queries):
+        """Test create_expense loads the row from RETURNING instead of re-reading it"""
+        user = users[0]
+        with assert_num_queries(3) as queries:
+            expense = crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=12.5, description="Lunch"))
+            assert expense.id and expense.created_at and expense.category is None
+        # The expense INSERT, the roll-up upsert and the data version bump
+        assert queries.kinds == ["INSERT", "INSERT", "UPDATE"]
+
+    def test_update_and_delete_skip_the_select(self, db_session, users, assert_num_queries):
+        """Test update and delete run no SELECT before or after the write"""
+        user = users[0]
+        expense = crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=10))
+        with assert_num_queries(2) as queries:
+            updated = crud.update_expense(db_session, expense.id, user.id, schemas.ExpenseUpdate(description="Taxi"))
+            assert updated.description == "Taxi" and updated.updated_at is not None
+        # The expense UPDATE, then the data version bump
+        assert queries.kinds == ["UPDATE", "UPDATE"]
+
+        with assert_num_queries(3) as queries:
+            assert crud.delete_expense(db_session, expense.id, user.id).amount == 10
+        assert queries.kinds == ["DELETE", "INSERT", "UPDATE"]
+        assert crud.get_expense(db_session, expense.id, user.id) is None
+
+    def test_amount_change_keeps_rollups_correct(self, db_session, users):
+        """Test changing amount and category moves the expense between roll-ups"""
+        user = users[0]
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        expense = crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=10))
+        updated = crud.update_expense(db_session, expense.id, user.id,
+                                      schemas.ExpenseUpdate(amount=30, category_id=food.id))
+        assert updated.amount == 30 and updated.category.name == "Food"
+        assert rollups.verify(db_session, user.id) == []
+
+    def test_writes_are_scoped_to_the_owner(self, db_session, users):
+        """Test another user's expense or category is neither changed nor deleted"""
+        owner, other = users
+        expense = crud.create_expense(db_session, owner.id, schemas.ExpenseCreate(amount=10))
+        category = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), owner.id)
+
+        assert crud.update_expense(db_session, expense.id, other.id, schemas.ExpenseUpdate(amount=99)) is None
+        assert crud.delete_expense(db_session, expense.id, other.id) is None
+        assert crud.update_category(db_session, category.id, other.id, schemas.CategoryBase(name="Mine")) is None
+
+        db_session.expire_all()
+        assert db_session.get(models.Expense, expense.id).amount == 10
+        assert db_session.get(models.Category, category.id).name == "Food"
+        assert rollups.verify(db_session, owner.id) == []
+
+    def test_null_amount_is_rejected(self, client, make_auth_headers):
+        """Test PUT and bulk update refuse an explicit null amount instead of failing on it"""
+        headers = make_auth_headers("nullamount")
+        expense = client.post("/expenses/", json={"amount": 10}, headers=headers).json()
+
+        response = client.put(f"/expenses/{expense['id']}", json={"amount": None}, headers=headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        response = client.post("/expenses/bulk/update", json={"ids": [expense["id"]], "changes": {"amount": None}},
+                               headers=headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get(f"/expenses/{expense['id']}", headers=headers).json()["amount"] == 10
+
+    def test_update_category_returns_new_values(self, db_session, users, assert_num_queries):
+        """Test update_category returns the row as written"""
+        user = users[0]
+        category = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        with assert_num_queries(2):
+            updated = crud.update_category(db_session, category.id, user.id,
+                                           schemas.CategoryBase(name="Groceries", color="#00FF00"))
+        assert (updated.name, updated.color) == ("Groceries", "#00FF00")
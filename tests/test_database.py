@@ -0,0 +1,63 @@
+from fastapi import status
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from config import settings
+from database import PoolMetrics, engine_options, metered, track_in_use
+
+class TestPoolMetrics:
+
+    def test_metered_pool_records_checkouts(self, tmp_path):
+        """Test checkouts report wait time and connections in use"""
+        metrics = PoolMetrics()
+        engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=metered(QueuePool, metrics), pool_size=2)
+        track_in_use(engine, metrics)
+
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            assert metrics.snapshot(engine.pool)["in_use"] == 1
+
+        stats = metrics.snapshot(engine.pool)
+        assert stats["pool"] == "QueuePool"
+        assert stats["checkouts"] == 1
+        assert stats["in_use"] == 0
+        assert stats["size"] == 2
+        assert stats["wait_ms_max"] >= 0
+
+class TestEngineOptions:
+
+    def test_postgres_sessions_run_in_utc(self, monkeypatch):
+        """Test both PostgreSQL drivers pin the session time zone, also behind PgBouncer, and SQLite is left alone"""
+        metrics = PoolMetrics()
+        sync = engine_options("postgresql+psycopg2://u:p@db/expenses", metrics)
+        assert sync["connect_args"] == {"options": "-c timezone=UTC"}
+        assert engine_options("sqlite:///./test.db", metrics)["connect_args"] == {}
+
+        monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+        pooled = engine_options("postgresql+asyncpg://u:p@db/expenses", metrics)["connect_args"]
+        assert pooled["server_settings"] == {"timezone": "UTC"}
+        assert pooled["statement_cache_size"] == 0
+
+class TestInternalMetrics:
+
+    def test_metrics_endpoint(self, client, monkeypatch):
+        """Test pool and cache metrics are exposed"""
+        monkeypatch.setattr(settings, "INTERNAL_TOKEN", "secret")
+        response = client.get("/internal/metrics", headers={"X-Internal-Token": "secret"})
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert "in_use" in data["database"]["sync"]
+        assert data["user_cache"]["backend"] == "memory"
+
+    def test_metrics_endpoint_requires_token(self, client, monkeypatch):
+        """Test the endpoint is hidden without INTERNAL_TOKEN and guarded by it when set"""
+        monkeypatch.setattr(settings, "INTERNAL_TOKEN", None)
+        assert client.get("/internal/metrics").status_code == status.HTTP_404_NOT_FOUND
+
+        monkeypatch.setattr(settings, "INTERNAL_TOKEN", "secret")
+        assert client.get("/internal/metrics").status_code == status.HTTP_403_FORBIDDEN
+        response = client.get("/internal/metrics", headers={"X-Internal-Token": "wrong"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        response = client.get("/internal/metrics", headers={"X-Internal-Token": "secret"})
+        assert response.status_code == status.HTTP_200_OK
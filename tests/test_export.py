@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import status
+from openpyxl import load_workbook
+
+import crud
+import models
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(response.text)))
+
+class TestCsvExport:
+
+    def test_streams_all_rows(self, client, make_auth_headers, monkeypatch):
+        """Test the CSV holds every expense, newest first, across several batches"""
+        from config import settings
+        monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+        headers = make_auth_headers("exportuser")
+        food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+        client.post("/expenses/", json={"amount": 1.5, "description": "first", "category_id": food["id"]}, headers=headers)
+        for i in range(4):
+            client.post("/expenses/", json={"amount": i}, headers=headers)
+
+        response = client.get("/export/csv", headers=headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = read_csv(response)
+        assert rows[0] == ["ID", "Description", "Amount", "Category", "Date"]
+        assert len(rows) == 6
+        assert rows[-1][1:4] == ["first", "1.5", "Food"]
+        assert rows[1][3] == crud.UNCATEGORIZED_NAME
+        ids = [int(row[0]) for row in rows[1:]]
+        assert ids == sorted(ids, reverse=True)
+
+    def test_category_filter(self, client, make_auth_headers):
+        """Test only the requested categories are exported and bad lists are rejected"""
+        headers = make_auth_headers("exportfilter")
+        food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+        client.post("/expenses/", json={"amount": 3, "category_id": food["id"]}, headers=headers)
+        client.post("/expenses/", json={"amount": 4}, headers=headers)
+
+        rows = read_csv(client.get("/export/csv", params={"categories": str(food["id"])}, headers=headers))
+        assert [row[2:4] for row in rows[1:]] == [["3.0", "Food"]]
+
+        response = client.get("/export/csv", params={"categories": "food"}, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_empty_export_has_header(self, client, make_auth_headers):
+        """Test a user without expenses gets just the header row"""
+        headers = make_auth_headers("exportempty")
+        assert read_csv(client.get("/export/csv", headers=headers)) == [["ID", "Description", "Amount", "Category", "Date"]]
+
+class TestExcelExport:
+
+    def test_expenses_and_summary_sheets(self, client, make_auth_headers, monkeypatch):
+        """Test the workbook holds every row plus the SQL summary for the same filters"""
+        from config import settings
+        monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+        headers = make_auth_headers("exceluser")
+        food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+        client.post("/expenses/", json={"amount": 2.5, "description": "lunch", "category_id": food["id"]}, headers=headers)
+        for i in range(3):
+            client.post("/expenses/", json={"amount": 10}, headers=headers)
+
+        response = client.get("/export/excel", headers=headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        workbook = load_workbook(io.BytesIO(response.content), read_only=True)
+        assert workbook.sheetnames == ["Expenses", "Summary"]
+        rows = list(workbook["Expenses"].values)
+        assert rows[0] == ("ID", "Description", "Amount", "Category", "Date")
+        assert len(rows) == 5
+        assert rows[-1][1:4] == ("lunch", 2.5, "Food")
+        assert list(workbook["Summary"].values) == [
+            ("Total Expenses", "Total Amount", "Date Range"),
+            (4, 32.5, "All to All"),
+        ]
+
+        response = client.get("/export/excel", params={"categories": str(food["id"])}, headers=headers)
+        workbook = load_workbook(io.BytesIO(response.content), read_only=True)
+        assert len(list(workbook["Expenses"].values)) == 2
+        assert list(workbook["Summary"].values)[1][:2] == (1, 2.5)
+
+@pytest.fixture
+def export_headers(client, make_auth_headers, monkeypatch):
+    """A user with one categorized and three uncategorized expenses, exported two rows per batch"""
+    from config import settings
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    headers = make_auth_headers("formatuser")
+    food = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+    client.post("/expenses/", json={"amount": 2.5, "description": "lunch", "category_id": food["id"]}, headers=headers)
+    for i in range(3):
+        client.post("/expenses/", json={"amount": 10}, headers=headers)
+    return headers
+
+class TestJsonExports:
+
+    def test_ndjson(self, client, export_headers):
+        """Test NDJSON has one object per line, newest first"""
+        response = client.get("/export/ndjson", headers=export_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 4
+        assert set(rows[0]) == {"id", "description", "amount", "category", "created_at"}
+        assert (rows[-1]["description"], rows[-1]["amount"], rows[-1]["category"]) == ("lunch", 2.5, "Food")
+        assert rows[0]["description"] is None
+        datetime.fromisoformat(rows[0]["created_at"])
+
+    def test_json_array(self, client, export_headers):
+        """Test the JSON export is one valid array assembled from several batches"""
+        rows = client.get("/export/json", headers=export_headers).json()
+
+        assert [row["amount"] for row in rows] == [10, 10, 10, 2.5]
+
+    def test_empty_json_array(self, client, make_auth_headers):
+        """Test a user without expenses gets an empty array"""
+        headers = make_auth_headers("jsonempty")
+        assert client.get("/export/json", headers=headers).json() == []
+        assert client.get("/export/ndjson", headers=headers).text == ""
+
+class TestParquetExport:
+
+    def test_columns_and_types(self, client, export_headers):
+        """Test the Parquet file carries typed columns for every row"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        response = client.get("/export/parquet", params={"start_date": "2000-01-01T00:00:00"}, headers=export_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        table = pq.ParquetFile(io.BytesIO(response.content)).read(use_threads=False)
+        assert table.column_names == ["id", "description", "amount", "category", "created_at"]
+        assert str(table.schema.field("created_at").type) == "timestamp[us, tz=UTC]"
+        assert table.column("amount").to_pylist() == [10, 10, 10, 2.5]
+        assert table.column("category").to_pylist()[-1] == "Food"
+
+class TestStreamExpenses:
+
+    def test_batches_are_plain_rows(self, db_session, make_user):
+        """Test rows come back in lists of batch_size, without ORM objects"""
+        user = make_user("streamuser")
+        for i in range(5):
+            db_session.add(models.Expense(user_id=user.id, amount=i))
+        db_session.commit()
+
+        batches = list(crud.stream_expenses_for_export(db_session, user.id, batch_size=2))
+
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert batches[0][0]._fields == ("id", "description", "amount", "category", "created_at")
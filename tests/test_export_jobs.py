@@ -0,0 +1,169 @@
+import csv
+import io
+import multiprocessing
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import database
+import exports
+import models
+import schemas
+from config import settings
+from conftest import TestingSessionLocal
+
+class InlineJobs:
+    """Records the jobs the app submits; run() then runs them in the test's thread.
+
+    The test database is a single shared connection, which a pool thread
+    would use while the request that queued the job is still finishing.
+    """
+
+    def __init__(self, session_factory, storage):
+        self.session_factory = session_factory
+        self.storage = storage
+        self.submitted = []
+
+    def run(self):
+        while self.submitted:
+            exports.run_export_job(self.submitted.pop(0), self.session_factory, self.storage)
+
+@pytest.fixture
+def export_jobs(db_engine, tmp_path, monkeypatch):
+    """Queue jobs against the test database, storing files under tmp_path"""
+    jobs = InlineJobs(sessionmaker(bind=db_engine), exports.FileSystemStorage(tmp_path))
+    monkeypatch.setattr(exports.jobs, "storage", jobs.storage)
+    monkeypatch.setattr(exports.jobs, "submit", jobs.submitted.append)
+    return jobs
+
+class TestExportJobs:
+
+    def test_job_lifecycle(self, client, make_auth_headers, export_jobs):
+        """Test a queued export runs in the background and can then be downloaded"""
+        headers = make_auth_headers("jobuser")
+        for amount in (5, 7):
+            client.post("/expenses/", json={"amount": amount}, headers=headers)
+
+        response = client.post("/export/", json={"format": "csv"}, headers=headers)
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        job = response.json()
+        assert (job["status"], job["format"], job["download_url"]) == ("pending", "csv", None)
+
+        export_jobs.run()
+        job = client.get(f"/export/jobs/{job['id']}", headers=headers).json()
+        assert job["status"] == "done"
+        assert job["total_records"] == 2
+        assert job["file_size"].endswith(" B")
+        assert job["filename"].endswith(".csv")
+
+        download = client.get(job["download_url"], headers=headers)
+        assert download.status_code == status.HTTP_200_OK
+        assert job["filename"] in download.headers["content-disposition"]
+        rows = list(csv.reader(io.StringIO(download.text)))
+        assert [row[2] for row in rows[1:]] == ["7.0", "5.0"]
+
+    def test_identical_requests_share_a_job(self, client, make_auth_headers, export_jobs):
+        """Test an identical request joins the pending job, and other filters queue their own"""
+        headers = make_auth_headers("dedupuser")
+
+        first = client.post("/export/", json={"format": "ndjson", "categories": [2, 1]}, headers=headers).json()
+        second = client.post("/export/", json={"format": "ndjson", "categories": [1, 2]}, headers=headers).json()
+        other = client.post("/export/", json={"format": "json", "categories": [1, 2]}, headers=headers).json()
+
+        assert second["id"] == first["id"]
+        assert other["id"] != first["id"]
+        assert export_jobs.submitted == [first["id"], other["id"]]
+
+        response = client.get(f"/export/jobs/{first['id']}/download", headers=headers)
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    def test_failed_job_reports_error(self, client, make_auth_headers, export_jobs, monkeypatch):
+        """Test a job whose export raises is marked failed with the error"""
+        def broken(*args, **kwargs):
+            raise RuntimeError("disk full")
+        monkeypatch.setattr(exports, "export_chunks", broken)
+        headers = make_auth_headers("faileduser")
+
+        job = client.post("/export/", json={"format": "csv"}, headers=headers).json()
+        export_jobs.run()
+
+        job = client.get(f"/export/jobs/{job['id']}", headers=headers).json()
+        assert (job["status"], job["error"]) == ("failed", "disk full")
+
+    def test_jobs_are_private(self, client, make_auth_headers, export_jobs):
+        """Test another user's job is not found and unknown formats are rejected"""
+        owner = make_auth_headers("jobowner")
+        job = client.post("/export/", json={"format": "csv"}, headers=owner).json()
+        export_jobs.run()
+
+        other = make_auth_headers("jobsnooper")
+        assert client.get(f"/export/jobs/{job['id']}", headers=other).status_code == status.HTTP_404_NOT_FOUND
+        assert client.get(f"/export/jobs/{job['id']}/download", headers=other).status_code == status.HTTP_404_NOT_FOUND
+        assert client.post("/export/", json={"format": "pdf"}, headers=owner).status_code == 422
+
+    @pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                        reason="workers only see the test database when forked")
+    def test_job_runs_on_a_process_pool(self, client, make_auth_headers, export_jobs, db_engine, monkeypatch):
+        """Test a job runs in a worker process on its own connection, leaving the app's usable"""
+        monkeypatch.setattr(database, "engine", db_engine)
+        monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(settings, "EXPORT_DIR", str(export_jobs.storage.root))
+        headers = make_auth_headers("processjobuser")
+        client.post("/expenses/", json={"amount": 5}, headers=headers)
+        job = client.post("/export/", json={"format": "csv"}, headers=headers).json()
+
+        pool = exports.ExportJobs("process", workers=1)
+        try:
+            pool.submit(job["id"]).result(timeout=60)
+        finally:
+            pool.shutdown()
+
+        job = client.get(f"/export/jobs/{job['id']}", headers=headers).json()
+        assert (job["status"], job["total_records"]) == ("done", 1)
+        assert client.get(job["download_url"], headers=headers).status_code == status.HTTP_200_OK
+
+class TestExportJobSweep:
+
+    def make_job(self, db_session, user_id, status, age, **fields):
+        columns = dict(id=uuid.uuid4().hex, user_id=user_id, format="csv", parameters={}, params_key="key",
+                       status=status, created_at=datetime.now(timezone.utc) - age)
+        job = models.ExportJob(**{**columns, **fields})
+        db_session.add(job)
+        db_session.commit()
+        return job
+
+    def test_sweep_fails_lost_jobs_and_deletes_expired_files(self, db_session, make_user, tmp_path):
+        """Test a sweep fails jobs left running past the timeout and deletes expired jobs with their files"""
+        user = make_user("sweepuser")
+        lost = self.make_job(db_session, user.id, "running", timedelta(days=1))
+        old = timedelta(days=2)
+        expired = self.make_job(db_session, user.id, "done", old, completed_at=datetime.now(timezone.utc) - old)
+        recent = self.make_job(db_session, user.id, "done", timedelta(0), completed_at=datetime.now(timezone.utc))
+        storage = exports.FileSystemStorage(tmp_path)
+        expired_key, recent_key = exports.storage_key(expired), exports.storage_key(recent)
+        for key in (expired_key, recent_key):
+            storage.save(key, iter([b"x"]))
+
+        assert exports.sweep_export_jobs(sessionmaker(bind=db_session.connection()), storage) == (1, 1)
+
+        statuses = dict(db_session.query(models.ExportJob.id, models.ExportJob.status)
+                        .filter(models.ExportJob.user_id == user.id).all())
+        assert statuses == {lost.id: "failed", recent.id: "done"}
+        assert not storage.exists(expired_key) and storage.exists(recent_key)
+
+    def test_lost_job_does_not_block_identical_requests(self, db_session, make_user):
+        """Test a job lost with its worker is failed, not returned, when the same export is requested"""
+        user = make_user("lostuser")
+        export = schemas.ExportRequest(format="csv")
+        lost = self.make_job(db_session, user.id, "pending", timedelta(days=1),
+                             params_key=crud.export_params_key(export))
+
+        job, created = crud.create_export_job(db_session, user.id, export)
+
+        assert created and job.id != lost.id
+        db_session.refresh(lost)
+        assert lost.status == "failed"
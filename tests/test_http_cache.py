@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+from fastapi import status
+
+import crud_async
+from http_cache import etag_matches
+
+YEAR = datetime.now().year
+
+@pytest.fixture
+def headers(client, make_auth_headers):
+    headers = make_auth_headers("etaguser")
+    client.post("/expenses/", json={"amount": 10, "description": "Lunch"}, headers=headers)
+    return headers
+
+class TestConditionalGets:
+
+    @pytest.mark.parametrize("url", [
+        f"/reports/yearly?year={YEAR}",
+        f"/reports/monthly?year={YEAR}&month=1",
+        "/reports/summary",
+        "/categories/",
+        "/expenses/",
+        "/expenses/?pagination=cursor&fields=id,amount",
+    ])
+    def test_unchanged_data_returns_304(self, client, headers, url):
+        """Test sending the ETag back returns 304 with no body"""
+        first = client.get(url, headers=headers)
+        assert first.status_code == status.HTTP_200_OK
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+        assert first.headers["vary"].startswith("Authorization")
+
+        second = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert second.status_code == status.HTTP_304_NOT_MODIFIED
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+    def test_304_skips_the_report_queries(self, client, headers, monkeypatch):
+        """Test a matching If-None-Match is answered before the report runs"""
+        etag = client.get(f"/reports/yearly?year={YEAR}", headers=headers).headers["etag"]
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("report recomputed")
+        monkeypatch.setattr(crud_async, "get_yearly_report", fail)
+
+        response = client.get(f"/reports/yearly?year={YEAR}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_writes_change_the_etag(self, client, headers):
+        """Test expense and category writes invalidate earlier ETags"""
+        etags = [client.get("/expenses/", headers=headers).headers["etag"]]
+        expense = client.post("/expenses/", json={"amount": 5}, headers=headers).json()
+        etags.append(client.get("/expenses/", headers=headers).headers["etag"])
+        client.put(f"/expenses/{expense['id']}", json={"amount": 7}, headers=headers)
+        etags.append(client.get("/expenses/", headers=headers).headers["etag"])
+        client.post("/categories/", json={"name": "Food"}, headers=headers)
+        etags.append(client.get("/expenses/", headers=headers).headers["etag"])
+        client.post("/expenses/bulk/delete", json={"ids": [expense["id"]]}, headers=headers)
+        etags.append(client.get("/expenses/", headers=headers).headers["etag"])
+        assert len(set(etags)) == len(etags)
+
+        response = client.get("/expenses/", headers={**headers, "If-None-Match": etags[0]})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 1
+
+    def test_etags_differ_per_url_and_user(self, client, headers, make_auth_headers):
+        """Test another user's writes leave the ETag alone, and URLs get distinct ETags"""
+        etag = client.get("/expenses/", headers=headers).headers["etag"]
+        assert client.get("/expenses/?limit=5", headers=headers).headers["etag"] != etag
+
+        other = make_auth_headers("otheretaguser")
+        assert client.get("/expenses/", headers=other).headers["etag"] != etag
+        client.post("/expenses/", json={"amount": 1}, headers=other)
+        assert client.get("/expenses/", headers=headers).headers["etag"] == etag
+
+    def test_cache_control_per_route(self, client, headers):
+        """Test reports may be reused briefly while lists always revalidate"""
+        assert client.get(f"/reports/yearly?year={YEAR}", headers=headers).headers["cache-control"] == \
+            "private, max-age=60, must-revalidate"
+        assert client.get("/expenses/", headers=headers).headers["cache-control"] == "private, no-cache"
+
+    def test_etag_matching(self):
+        """Test If-None-Match parsing: lists, weak prefixes and *"""
+        assert etag_matches('"a", W/"b"', 'W/"b"')
+        assert etag_matches('"b"', 'W/"b"')
+        assert etag_matches("*", 'W/"b"')
+        assert not etag_matches('W/"a"', 'W/"b"')
+        assert not etag_matches(None, 'W/"b"')
@@ -0,0 +1,74 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, event
+
+import crud
+import models
+import schemas
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+@pytest.fixture
+def report_user(db_session, make_user):
+    user = make_user("planuser")
+    category = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+    for i in range(20):
+        crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=i, category_id=category.id))
+    return user
+
+@pytest.fixture
+def expense_selects(db_session):
+    """Collect the SELECTs against expenses issued while the test runs"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "expenses" in statement:
+            statements.append((statement, parameters))
+
+    connection = db_session.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    yield statements
+    event.remove(connection, "before_cursor_execute", capture)
+
+def query_plan(db_session, statement, parameters) -> str:
+    rows = db_session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return " | ".join(row[-1] for row in rows)
+
+class TestReportQueryPlans:
+
+    @pytest.mark.parametrize("report", [
+        lambda db, user_id: crud.get_monthly_report(db, user_id, datetime.now().year, datetime.now().month),
+        lambda db, user_id: crud.get_expense_rows(db, user_id, limit=5),
+        lambda db, user_id: crud.get_expense_rows_page(db, user_id, limit=5, cursor=crud.encode_cursor(datetime.max, 0)),
+    ], ids=["monthly", "list", "keyset-page"])
+    def test_expense_queries_use_user_indexes(self, db_session, report_user, expense_selects, report):
+        """Test report queries search expenses by a (user_id, ...) index instead of scanning"""
+        report(db_session, report_user.id)
+
+        assert expense_selects
+        for statement, parameters in expense_selects:
+            plan = query_plan(db_session, statement, parameters)
+            assert "ix_expenses_user_" in plan, plan
+            assert "SCAN expenses" not in plan, plan
+
+class TestMigrations:
+
+    def test_migrations_match_models(self, tmp_path):
+        """Test alembic upgrade head produces exactly the models' schema"""
+        url = f"sqlite:///{tmp_path}/migrations.db"
+        config = Config(str(PROJECT_DIR / "alembic.ini"))
+        config.set_main_option("script_location", str(PROJECT_DIR / "migrations"))
+        config.set_main_option("sqlalchemy.url", url)
+        config.attributes["configure_logger"] = False
+        command.upgrade(config, "head")
+
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            assert compare_metadata(MigrationContext.configure(connection), models.Base.metadata) == []
+        engine.dispose()
@@ -0,0 +1,173 @@
+from typing import List
+
+import pytest
+from fastapi import status
+from pydantic import TypeAdapter
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import joinedload
+
+import crud
+import models
+import schemas
+from routers.expenses import ExpenseRowsResponse
+
+@pytest.fixture
+def expense_headers(client, make_auth_headers):
+    headers = make_auth_headers("pageuser")
+    for i in range(25):
+        client.post("/expenses/", json={"description": f"Expense {i}", "amount": float(i)}, headers=headers)
+    return headers
+
+@pytest.fixture
+def categorized_user(db_session, make_user):
+    """A user with 30 expenses spread over 3 categories, detached from the session"""
+    user = make_user("loaduser")
+    categories = [crud.create_category(db_session, schemas.CategoryCreate(name=f"Cat {i}"), user.id) for i in range(3)]
+    for i in range(30):
+        crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=i, category_id=categories[i % 3].id))
+    # Start from an empty identity map, as a request does
+    db_session.expunge_all()
+    return user
+
+class TestCursorPagination:
+
+    def test_walks_all_pages_in_stable_order(self, client, expense_headers):
+        """Test following next_cursor returns every expense exactly once, newest first"""
+        seen, params = [], {"limit": 10, "pagination": "cursor"}
+        while True:
+            response = client.get("/expenses/", params=params, headers=expense_headers)
+            assert response.status_code == status.HTTP_200_OK
+            page = response.json()
+            seen.extend(expense["id"] for expense in page["items"])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+
+        assert len(seen) == 25
+        assert seen == sorted(seen, reverse=True)
+
+    def test_filters_apply_to_pages(self, client, expense_headers):
+        """Test amount range filters narrow the page"""
+        response = client.get(
+            "/expenses/",
+            params={"pagination": "cursor", "min_amount": 5, "max_amount": 9},
+            headers=expense_headers,
+        )
+
+        amounts = [expense["amount"] for expense in response.json()["items"]]
+        assert sorted(amounts) == [5.0, 6.0, 7.0, 8.0, 9.0]
+        assert response.json()["next_cursor"] is None
+
+    def test_invalid_cursor(self, client, expense_headers):
+        """Test a malformed cursor is rejected"""
+        response = client.get("/expenses/", params={"cursor": "not-a-cursor"}, headers=expense_headers)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_offset_mode_still_returns_a_list(self, client, expense_headers):
+        """Test requests without a cursor keep the list response"""
+        response = client.get("/expenses/", params={"skip": 20, "limit": 10}, headers=expense_headers)
+
+        assert isinstance(response.json(), list)
+        assert len(response.json()) == 5
+
+class TestCategoryLoading:
+
+    @pytest.mark.parametrize("read", [
+        lambda db, user_id, version: crud.get_expense_rows(db, user_id, limit=20, version=version),
+        lambda db, user_id, version: crud.get_expense_rows_page(db, user_id, limit=20, version=version)[0],
+    ], ids=["offset", "keyset"])
+    def test_page_with_categories_is_one_query(self, db_session, categorized_user, assert_num_queries, read):
+        """Test a page with nested categories is one SELECT of expenses once the categories are cached"""
+        version = crud.get_data_version(db_session, categorized_user.id)
+        crud.get_category_map(db_session, categorized_user.id, version)
+        with assert_num_queries(1) as queries:
+            rows = read(db_session, categorized_user.id, version)
+
+        assert "categories" not in queries.statements[0]
+        assert len(rows) == 20
+        assert {row["category"]["name"] for row in rows} == {"Cat 0", "Cat 1", "Cat 2"}
+
+    def test_without_categories_skips_the_cache(self, db_session, categorized_user, assert_num_queries):
+        """Test a fieldset without "category" reads expenses alone, not even the categories"""
+        fields = tuple(name for name in crud.EXPENSE_FIELDS if name != "category")
+        with assert_num_queries(1) as queries:
+            rows = crud.get_expense_rows(db_session, categorized_user.id, limit=20, fields=fields)
+
+        assert "categories" not in queries.statements[0]
+        assert all(row["category_id"] and "category" not in row for row in rows)
+
+    def test_orm_reads_never_load_categories_implicitly(self, db_session, categorized_user, assert_num_queries):
+        """Test an ORM read without a loader option is one query, and touching the category raises"""
+        with assert_num_queries(1):
+            expenses = db_session.query(models.Expense).filter(models.Expense.user_id == categorized_user.id).all()
+
+        with pytest.raises(InvalidRequestError):
+            expenses[0].category
+
+    def test_api_category_ids_only(self, client, make_auth_headers):
+        """Test include_category=false drops the nested category from both list shapes"""
+        headers = make_auth_headers("briefuser")
+        category = client.post("/categories/", json={"name": "Food"}, headers=headers).json()
+        client.post("/expenses/", json={"amount": 5, "category_id": category["id"]}, headers=headers)
+
+        full = client.get("/expenses/", headers=headers).json()
+        assert full[0]["category"]["name"] == "Food"
+
+        brief = client.get("/expenses/", params={"include_category": "false"}, headers=headers)
+        assert brief.status_code == status.HTTP_200_OK
+        assert brief.json() == [{key: value for key, value in full[0].items() if key != "category"}]
+
+        page = client.get("/expenses/", params={"include_category": "false", "pagination": "cursor"},
+                          headers=headers).json()
+        assert page["next_cursor"] is None
+        assert "category" not in page["items"][0] and page["items"][0]["category_id"] == category["id"]
+
+class TestProjectedRows:
+
+    def test_rows_match_the_response_models(self, db_session, categorized_user):
+        """Test projected rows encode exactly as the Pydantic response models do"""
+        crud.create_expense(db_session, categorized_user.id, schemas.ExpenseCreate(amount=1.5, description="loose"))
+        expenses = (
+            db_session.query(models.Expense).options(joinedload(models.Expense.category))
+            .filter(models.Expense.user_id == categorized_user.id)
+            .order_by(models.Expense.created_at.desc(), models.Expense.id.desc()).all()
+        )
+        adapter = TypeAdapter(List[schemas.Expense])
+        expected = adapter.dump_json(adapter.validate_python(expenses))
+
+        rows = crud.get_expense_rows(db_session, categorized_user.id, limit=50)
+
+        assert ExpenseRowsResponse(rows).body == expected
+        assert rows[0]["category"] is None and rows[1]["category"]["name"]
+
+    def test_fields_select_only_those_columns(self, db_session, categorized_user, assert_num_queries):
+        """Test a sparse fieldset reads just its columns, without the category join"""
+        with assert_num_queries(1) as queries:
+            rows = crud.get_expense_rows(db_session, categorized_user.id, fields=("amount", "id"))
+
+        assert "categories" not in queries.statements[0]
+        assert "description" not in queries.statements[0]
+        assert list(rows[0]) == ["amount", "id"]
+
+    def test_api_fields(self, client, expense_headers):
+        """Test fields= narrows both list shapes and keeps responses in schema order"""
+        response = client.get("/expenses/", params={"fields": "id, amount"}, headers=expense_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/json"
+        assert list(response.json()[0]) == ["amount", "id"]
+
+        seen, params = [], {"fields": "amount", "pagination": "cursor", "limit": 10}
+        while True:
+            page = client.get("/expenses/", params=params, headers=expense_headers).json()
+            seen.extend(item["amount"] for item in page["items"])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+        assert sorted(seen) == [float(i) for i in range(25)]
+
+    def test_api_unknown_fields(self, client, expense_headers):
+        """Test unknown field names are rejected"""
+        response = client.get("/expenses/", params={"fields": "id,password"}, headers=expense_headers)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
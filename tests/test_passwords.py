@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from sqlalchemy import select
+
+import models
+import passwords
+from passwords import HasherBusy, PasswordHasher
+
+CREDENTIALS = {"username": "hashuser", "password": "testpass123"}
+
+@pytest.fixture
+def stored_hash(client, db_engine, make_auth_headers):
+    """Sign up a user and return a function reading their stored hash"""
+    make_auth_headers(CREDENTIALS["username"], CREDENTIALS["password"])
+    def _read():
+        with db_engine.connect() as connection:
+            return connection.scalar(select(models.User.hashed_password)
+                                     .where(models.User.username == CREDENTIALS["username"]))
+    return _read
+
+@pytest.fixture
+def count_bcrypt(monkeypatch):
+    """Run bcrypt in threads (patches do not reach worker processes) and count verifications"""
+    calls = []
+    verify = passwords.verify_password
+    def counting(*args):
+        calls.append(args)
+        return verify(*args)
+    monkeypatch.setattr(passwords, "verify_password", counting)
+    monkeypatch.setattr(passwords.hasher, "executor_kind", "thread")
+    passwords.hasher.shutdown()
+    passwords.hasher.verified.clear()
+    yield calls
+    passwords.hasher.shutdown()
+
+class TestPasswordHashing:
+
+    def test_login_rehashes_with_new_work_factor(self, client, stored_hash, monkeypatch):
+        """Test a hash with a different bcrypt cost is replaced on the next login"""
+        original = stored_hash()
+        assert original.startswith(f"$2b${passwords.hasher.rounds:02d}$")
+
+        monkeypatch.setattr(passwords.hasher, "rounds", 5)
+        response = client.post("/users/login", json=CREDENTIALS)
+        assert response.status_code == status.HTTP_200_OK
+        upgraded = stored_hash()
+        assert upgraded.startswith("$2b$05$")
+
+        # The new hash verifies, and is left alone from now on
+        assert client.post("/users/login", json=CREDENTIALS).status_code == status.HTTP_200_OK
+        assert stored_hash() == upgraded
+
+    def test_repeat_login_skips_bcrypt(self, client, stored_hash, count_bcrypt):
+        """Test a recently verified password is not run through bcrypt again"""
+        for _ in range(3):
+            assert client.post("/users/login", json=CREDENTIALS).status_code == status.HTTP_200_OK
+        assert len(count_bcrypt) == 1
+
+    def test_wrong_password_is_never_cached(self, client, stored_hash, count_bcrypt):
+        """Test failed verifications always pay for bcrypt and still fail"""
+        wrong = {**CREDENTIALS, "password": "wrongpass"}
+        for _ in range(2):
+            assert client.post("/users/login", json=wrong).status_code == status.HTTP_400_BAD_REQUEST
+        assert len(count_bcrypt) == 2
+        assert client.post("/users/login", json=CREDENTIALS).status_code == status.HTTP_200_OK
+
+    def test_full_queue_returns_503(self, client, stored_hash, monkeypatch):
+        """Test logins beyond PASSWORD_MAX_PENDING are shed with Retry-After"""
+        monkeypatch.setattr(passwords.hasher, "max_pending", 0)
+        passwords.hasher.verified.clear()
+        response = client.post("/users/login", json=CREDENTIALS)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["retry-after"] == "1"
+
+    def test_process_pool_round_trip(self):
+        """Test hashing and verifying on worker processes"""
+        hasher = PasswordHasher("process", workers=1, rounds=4, cache_ttl=0)
+        async def round_trip():
+            hashed = await hasher.hash("secret")
+            return hashed, await hasher.verify("secret", hashed), await hasher.verify("nope", hashed)
+        try:
+            hashed, good, bad = asyncio.run(round_trip())
+        finally:
+            hasher.shutdown()
+        assert hashed.startswith("$2b$04$")
+        assert good == (True, None)
+        assert bad == (False, None)
+
+    def test_pending_limit(self):
+        """Test the hasher refuses work once max_pending calls are queued"""
+        hasher = PasswordHasher("thread", workers=1, max_pending=1, rounds=4, cache_ttl=0)
+        async def burst():
+            return await asyncio.gather(*(hasher.hash("secret") for _ in range(3)), return_exceptions=True)
+        try:
+            results = asyncio.run(burst())
+        finally:
+            hasher.shutdown()
+        assert isinstance(results[0], str)
+        assert all(isinstance(result, HasherBusy) for result in results[1:])
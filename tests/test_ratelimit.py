@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+import fakeredis.aioredis
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from auth import create_access_token
+from main import RateLimitMiddleware
+from ratelimit import Limit, MemoryStore, RateLimiter, RedisStore, client_identity
+
+class TestMemoryStore:
+
+    @pytest.mark.asyncio
+    async def test_allows_burst_then_rejects(self):
+        """Test a full bucket admits `calls` requests, then reports the wait"""
+        store = MemoryStore()
+        limit = Limit(calls=3, period=3)
+
+        assert [await store.hit("ip:1", 100.0, limit) for _ in range(3)] == [0, 0, 0]
+        assert await store.hit("ip:1", 100.0, limit) == pytest.approx(1.0)
+        assert await store.hit("ip:1", 101.0, limit) == 0
+
+    @pytest.mark.asyncio
+    async def test_idle_and_excess_keys_are_evicted(self):
+        """Test memory stays bounded by max_keys and drops replenished keys"""
+        store = MemoryStore(max_keys=2)
+        limit = Limit(calls=10, period=10)
+        for i in range(5):
+            await store.hit(f"ip:{i}", 100.0, limit)
+        assert len(store) == 2
+
+        await store.hit("ip:new", 200.0, limit)
+        assert len(store) == 1
+
+class TestRateLimiter:
+
+    @pytest.mark.asyncio
+    async def test_route_limits_use_their_own_bucket(self):
+        """Test a matching route is limited by its own bucket instead of the default one"""
+        limiter = RateLimiter(MemoryStore(), calls=100, period=60, routes={"/users/login": 1})
+
+        assert await limiter.hit("ip:1", "/users/login", now=0) == 0
+        assert await limiter.hit("ip:1", "/users/login", now=0) > 0
+        assert await limiter.hit("ip:1", "/expenses/", now=0) == 0
+
+    @pytest.mark.asyncio
+    async def test_redis_store_is_shared_between_workers(self):
+        """Test two limiters on one Redis see the same bucket"""
+        client = fakeredis.aioredis.FakeRedis()
+        worker1 = RateLimiter(RedisStore(client), calls=2, period=60)
+        worker2 = RateLimiter(RedisStore(client), calls=2, period=60)
+
+        assert await worker1.hit("ip:1", "/", now=1000.0) == 0
+        assert await worker2.hit("ip:1", "/", now=1000.0) == 0
+        assert await worker1.hit("ip:1", "/", now=1000.0) == pytest.approx(30.0)
+
+    def test_identity_prefers_token_subject(self):
+        """Test a valid bearer token is keyed by its subject, and invalid or expired ones by the client IP"""
+        token = create_access_token({"sub": "alice"})
+        assert client_identity(f"Bearer {token}", "10.0.0.1") == "user:alice"
+        assert client_identity(f"bearer {token}", None) == "user:alice"
+
+        expired = create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=-1))
+        assert client_identity(f"Bearer {expired}", "10.0.0.1") == "ip:10.0.0.1"
+        assert client_identity("Bearer not-a-token", "10.0.0.1") == "ip:10.0.0.1"
+        assert client_identity(None, None) == "ip:unknown"
+
+class TestRateLimitMiddleware:
+
+    def test_returns_429_with_retry_after(self):
+        """Test the middleware answers 429 instead of raising"""
+        app = FastAPI()
+        app.add_middleware(RateLimitMiddleware, limiter=RateLimiter(MemoryStore(), calls=1, period=60))
+        app.get("/ping")(lambda: {"ok": True})
+
+        with TestClient(app) as client:
+            assert client.get("/ping").status_code == status.HTTP_200_OK
+            response = client.get("/ping")
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers["Retry-After"] == "60"
+        assert "rate limit" in response.json()["detail"].lower()
+
+    def test_users_behind_one_address_have_their_own_buckets(self):
+        """Test authenticated requests are limited per user rather than per client IP"""
+        app = FastAPI()
+        app.add_middleware(RateLimitMiddleware, limiter=RateLimiter(MemoryStore(), calls=1, period=60))
+        app.get("/ping")(lambda: {"ok": True})
+        alice, bob = ({"Authorization": f"Bearer {create_access_token({'sub': name})}"} for name in ("alice", "bob"))
+
+        with TestClient(app) as client:
+            assert client.get("/ping", headers=alice).status_code == status.HTTP_200_OK
+            assert client.get("/ping", headers=bob).status_code == status.HTTP_200_OK
+            assert client.get("/ping").status_code == status.HTTP_200_OK
+            assert client.get("/ping", headers=alice).status_code == status.HTTP_429_TOO_MANY_REQUESTS
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+from fastapi import status
+
+import crud
+import models
+import schemas
+
+@pytest.fixture
+def october_expenses(db_session, make_user):
+    user = make_user("reportuser")
+    food = crud.create_category(db_session, schemas.CategoryCreate(name="Food", color="#10B981"), user.id)
+    rows = [
+        (10.0, food.id, datetime(2026, 9, 30, 23, 59)),   # previous month
+        (20.0, food.id, datetime(2026, 10, 1, 0, 0)),
+        (5.0, None, datetime(2026, 10, 1, 12, 0)),
+        (30.0, food.id, datetime(2026, 10, 31, 23, 30)),  # last evening of the month
+        (40.0, None, datetime(2026, 11, 1, 0, 0)),        # next month
+    ]
+    for amount, category_id, created_at in rows:
+        db_session.add(models.Expense(user_id=user.id, amount=amount, category_id=category_id, created_at=created_at))
+    db_session.commit()
+    return user
+
+class TestMonthlyReport:
+
+    def test_half_open_month_range(self, db_session, october_expenses):
+        """Test the whole last day counts and the next month's first instant does not"""
+        report = crud.get_monthly_report(db_session, october_expenses.id, 2026, 10)
+
+        assert report.total_expenses == 55.0
+        assert report.expense_count == 3
+
+    def test_category_and_daily_breakdown(self, db_session, october_expenses):
+        """Test per-category and per-day totals are filled from the same query"""
+        report = crud.get_monthly_report(db_session, october_expenses.id, 2026, 10)
+
+        assert [(c.category_name, c.total_amount, c.expense_count) for c in report.categories] == [
+            ("Food", 50.0, 2),
+            (crud.UNCATEGORIZED_NAME, 5.0, 1),
+        ]
+        assert report.categories[0].category_color == "#10B981"
+        assert report.categories[0].percentage == pytest.approx(90.91)
+        assert report.daily_breakdown == {"2026-10-01": 25.0, "2026-10-31": 30.0}
+
+    def test_empty_month(self, db_session, october_expenses):
+        """Test a month without expenses reports zeros"""
+        report = crud.get_monthly_report(db_session, october_expenses.id, 2026, 12)
+
+        assert report.total_expenses == 0
+        assert report.categories == []
+        assert report.daily_breakdown == {}
+
+    def test_endpoint_uses_report_schema(self, client, make_auth_headers):
+        """Test the endpoint returns MonthlyReportResponse and validates the month"""
+        headers = make_auth_headers("monthlyuser")
+        client.post("/expenses/", json={"amount": 12.5}, headers=headers)
+        now = datetime.utcnow()
+
+        response = client.get("/reports/monthly", params={"year": now.year, "month": now.month}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_expenses"] == 12.5
+        assert response.json()["categories"][0]["category_name"] == crud.UNCATEGORIZED_NAME
+
+        response = client.get("/reports/monthly", params={"year": 2026, "month": 13}, headers=headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+class TestSummary:
+
+    def test_aggregates_every_expense(self, db_session, october_expenses):
+        """Test the summary covers all expenses, not just the first page of 100"""
+        for i in range(150):
+            db_session.add(models.Expense(user_id=october_expenses.id, amount=1.0, created_at=datetime(2026, 8, 1)))
+        db_session.commit()
+
+        summary = crud.get_expense_summary(db_session, october_expenses.id)
+
+        assert summary.total_expenses == 155
+        assert summary.total_amount == 255.0
+        assert summary.average_expense == pytest.approx(255.0 / 155)
+        assert (summary.min_expense, summary.max_expense) == (1.0, 40.0)
+        assert summary.categories is None
+
+    def test_date_window_and_category_split(self, db_session, october_expenses):
+        """Test the date window bounds the rows and by_category splits them"""
+        summary = crud.get_expense_summary(
+            db_session, october_expenses.id, datetime(2026, 10, 1), datetime(2026, 10, 31, 23, 59), by_category=True
+        )
+
+        assert (summary.total_expenses, summary.total_amount) == (3, 55.0)
+        assert (summary.min_expense, summary.max_expense) == (5.0, 30.0)
+        assert [(c.category_name, c.expense_count, c.total_amount) for c in summary.categories] == [
+            ("Food", 2, 50.0),
+            (crud.UNCATEGORIZED_NAME, 1, 5.0),
+        ]
+
+    def test_endpoint(self, client, make_auth_headers):
+        """Test /reports/summary returns zeros for a new user and then the aggregate"""
+        headers = make_auth_headers("summaryuser")
+        assert client.get("/reports/summary", headers=headers).json() == {
+            "total_expenses": 0, "total_amount": 0.0, "average_expense": 0.0,
+            "min_expense": None, "max_expense": None, "categories": None,
+        }
+
+        client.post("/expenses/", json={"amount": 10}, headers=headers)
+        client.post("/expenses/", json={"amount": 30}, headers=headers)
+        response = client.get("/reports/summary", params={"by_category": True}, headers=headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["average_expense"] == 20.0
+        assert response.json()["categories"] == [
+            {"category_id": None, "category_name": crud.UNCATEGORIZED_NAME, "expense_count": 2, "total_amount": 40.0}
+        ]
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+
+import crud
+import models
+import rollups
+import schemas
+
+@pytest.fixture
+def user(make_user):
+    return make_user("rollupuser")
+
+def stored_rollups(db_session, user_id):
+    rows = db_session.query(models.ExpenseRollup).filter(
+        models.ExpenseRollup.user_id == user_id, models.ExpenseRollup.count != 0
+    )
+    return {(r.year, r.month, r.category_id): (r.total, r.count) for r in rows}
+
+class TestRollupMaintenance:
+
+    def test_expense_writes_keep_rollups_in_step(self, db_session, user):
+        """Test create, update and delete adjust the matching roll-up rows"""
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        lunch = crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=10, category_id=food.id))
+        crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=5))
+        now = lunch.created_at
+
+        assert stored_rollups(db_session, user.id) == {
+            (now.year, now.month, food.id): (10.0, 1),
+            (now.year, now.month, rollups.UNCATEGORIZED): (5.0, 1),
+        }
+
+        crud.update_expense(db_session, lunch.id, user.id, schemas.ExpenseUpdate(amount=25, category_id=None))
+        assert stored_rollups(db_session, user.id) == {(now.year, now.month, rollups.UNCATEGORIZED): (30.0, 2)}
+
+        crud.delete_expense(db_session, lunch.id, user.id)
+        assert stored_rollups(db_session, user.id) == {(now.year, now.month, rollups.UNCATEGORIZED): (5.0, 1)}
+        assert rollups.verify(db_session, user.id) == []
+
+    def test_delete_category_moves_rollups_to_uncategorized(self, db_session, user):
+        """Test deleting a category folds its roll-ups into the uncategorized row"""
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food"), user.id)
+        crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=10, category_id=food.id))
+        expense = crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=5))
+
+        crud.delete_category(db_session, food.id, user.id)
+
+        now = expense.created_at
+        assert stored_rollups(db_session, user.id) == {(now.year, now.month, rollups.UNCATEGORIZED): (15.0, 2)}
+        assert rollups.verify(db_session, user.id) == []
+
+    def test_verify_detects_drift_and_rebuild_repairs_it(self, db_session, user):
+        """Test expenses written around crud show up in verify until rebuilt"""
+        crud.create_expense(db_session, user.id, schemas.ExpenseCreate(amount=10))
+        db_session.add(models.Expense(user_id=user.id, amount=7, created_at=datetime(2025, 3, 4)))
+        db_session.commit()
+
+        mismatches = rollups.verify(db_session, user.id)
+        assert [(m["year"], m["month"], m["expected"], m["stored"]) for m in mismatches] == [
+            (2025, 3, (7.0, 1), (0.0, 0)),
+        ]
+
+        assert rollups.rebuild(db_session, user.id) == 2
+        assert rollups.verify(db_session, user.id) == []
+
+class TestYearlyReport:
+
+    def test_report_reads_rollups(self, db_session, user):
+        """Test the yearly report is assembled from roll-ups, including all of Dec 31"""
+        food = crud.create_category(db_session, schemas.CategoryCreate(name="Food", color="#10B981"), user.id)
+        rows = [
+            (20.0, food.id, datetime(2026, 1, 15)),
+            (5.0, None, datetime(2026, 1, 20)),
+            (30.0, food.id, datetime(2026, 12, 31, 18, 0)),
+            (40.0, None, datetime(2027, 1, 1)),
+        ]
+        for amount, category_id, created_at in rows:
+            db_session.add(models.Expense(user_id=user.id, amount=amount, category_id=category_id, created_at=created_at))
+        db_session.commit()
+        rollups.rebuild(db_session, user.id)
+
+        report = crud.get_yearly_report(db_session, user.id, 2026)
+
+        assert report.total_expenses == 55.0
+        assert report.monthly_breakdown == {"January": 25.0, "December": 30.0}
+        assert [(c.category_name, c.total_amount, c.expense_count) for c in report.top_categories] == [
+            ("Food", 50.0, 2),
+        ]
+        assert report.top_categories[0].percentage == pytest.approx(90.91)
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from jose import jwt
+
+import auth
+import models
+import passwords
+
+@pytest.fixture
+def token(client, make_auth_headers):
+    return make_auth_headers("tokenuser")["Authorization"].removeprefix("Bearer ")
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+class TestAccessTokens:
+
+    def test_token_carries_user_claims(self, client, token):
+        """Test login tokens carry the user id and token version"""
+        claims = jwt.get_unverified_claims(token)
+        me = client.get("/users/me", headers=bearer(token)).json()
+        assert claims["sub"] == "tokenuser"
+        assert claims["uid"] == me["id"]
+        assert claims["ver"] == 0
+
+    def test_repeat_requests_skip_decoding(self, client, token, monkeypatch):
+        """Test a verified token is decoded once (for auth and rate limiting), then served from the cache"""
+        calls = []
+        decode = jwt.decode
+        def counting(*args, **kwargs):
+            calls.append(args[0])
+            return decode(*args, **kwargs)
+        monkeypatch.setattr(auth.jwt, "decode", counting)
+
+        for _ in range(3):
+            assert client.get("/users/me", headers=bearer(token)).status_code == status.HTTP_200_OK
+        assert calls == [token]
+
+    def test_bumped_token_version_rejects_old_tokens(self, client, token, db_engine):
+        """Test tokens issued before a token_version bump get 401"""
+        assert client.get("/users/me", headers=bearer(token)).status_code == status.HTTP_200_OK
+        users = models.User.__table__
+        with db_engine.begin() as connection:
+            connection.execute(users.update().values(token_version=users.c.token_version + 1))
+        auth.invalidate_user("tokenuser")
+
+        assert client.get("/users/me", headers=bearer(token)).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_tokens_without_user_claims_still_work(self, client, token):
+        """Test tokens issued before uid/ver were added are looked up by username"""
+        legacy = auth.create_access_token(data={"sub": "tokenuser"})
+        response = client.get("/users/me", headers=bearer(legacy))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["username"] == "tokenuser"
+
+    def test_mismatched_claims_are_rejected(self, client, token):
+        """Test a token whose id and username disagree gets 401"""
+        claims = {**jwt.get_unverified_claims(token), "sub": "someoneelse"}
+        claims.pop("exp")
+        forged = auth.create_access_token(data=claims)
+        assert client.get("/users/me", headers=bearer(forged)).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_expired_token_is_not_cached(self, client, token):
+        """Test an expired token is rejected and never enters the token cache"""
+        claims = jwt.get_unverified_claims(token)
+        claims.pop("exp")
+        expired = auth.create_access_token(data=claims, expires_delta=timedelta(seconds=-1))
+        assert client.get("/users/me", headers=bearer(expired)).status_code == status.HTTP_401_UNAUTHORIZED
+        assert len(auth.token_cache) == 0
+
+@pytest.fixture
+def session(client, make_auth_headers):
+    """Sign up and log in, returning the login response"""
+    make_auth_headers("sessionuser")
+    return client.post("/users/login", json={"username": "sessionuser", "password": "testpass123"}).json()
+
+class TestRefreshTokens:
+
+    def test_refresh_rotates_tokens(self, client, session, monkeypatch):
+        """Test a refresh token buys a new token pair without checking the password"""
+        async def no_bcrypt(*args):
+            raise AssertionError("bcrypt used")
+        monkeypatch.setattr(passwords.hasher, "verify", no_bcrypt)
+
+        response = client.post("/users/refresh", json={"refresh_token": session["refresh_token"]})
+        assert response.status_code == status.HTTP_200_OK
+        tokens = response.json()
+        assert tokens["refresh_token"] != session["refresh_token"]
+        assert tokens["expires_in"] == auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        me = client.get("/users/me", headers=bearer(tokens["access_token"]))
+        assert me.json()["username"] == "sessionuser"
+
+    def test_reused_refresh_token_revokes_family(self, client, session):
+        """Test presenting a used refresh token fails and invalidates its successor"""
+        rotated = client.post("/users/refresh", json={"refresh_token": session["refresh_token"]}).json()
+        reuse = client.post("/users/refresh", json={"refresh_token": session["refresh_token"]})
+        assert reuse.status_code == status.HTTP_401_UNAUTHORIZED
+        successor = client.post("/users/refresh", json={"refresh_token": rotated["refresh_token"]})
+        assert successor.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_unknown_refresh_token(self, client, session):
+        """Test a made-up refresh token gets 401"""
+        response = client.post("/users/refresh", json={"refresh_token": "made-up"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_logout_revokes_access_and_refresh_token(self, client, session, make_auth_headers):
+        """Test a logged-out access token and its refresh token stop working"""
+        headers = bearer(session["access_token"])
+        other = make_auth_headers("sessionuser")  # a second session of the same user
+        response = client.post("/users/logout", json={"refresh_token": session["refresh_token"]}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        assert client.get("/users/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+        refresh = client.post("/users/refresh", json={"refresh_token": session["refresh_token"]})
+        assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get("/users/me", headers=other).status_code == status.HTTP_200_OK
+
+    def test_logout_all(self, client, session, make_auth_headers):
+        """Test logging out everywhere invalidates every earlier token, but not later logins"""
+        other = make_auth_headers("sessionuser")
+        response = client.post("/users/logout-all", headers=bearer(session["access_token"]))
+        assert response.status_code == status.HTTP_200_OK
+
+        assert client.get("/users/me", headers=bearer(session["access_token"])).status_code == \
+            status.HTTP_401_UNAUTHORIZED
+        assert client.get("/users/me", headers=other).status_code == status.HTTP_401_UNAUTHORIZED
+        refresh = client.post("/users/refresh", json={"refresh_token": session["refresh_token"]})
+        assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get("/users/me", headers=make_auth_headers("sessionuser")).status_code == status.HTTP_200_OK
+
+    def test_revocations_by_other_workers_are_synced(self, client, session, db_engine, monkeypatch):
+        """Test a jti revoked in the table (e.g. by another worker) is picked up on sync"""
+        headers = bearer(session["access_token"])
+        assert client.get("/users/me", headers=headers).status_code == status.HTTP_200_OK
+        claims = jwt.get_unverified_claims(session["access_token"])
+        with db_engine.begin() as connection:
+            connection.execute(models.RevokedToken.__table__.insert().values(
+                jti=claims["jti"], expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc)))
+
+        assert client.get("/users/me", headers=headers).status_code == status.HTTP_200_OK  # not synced yet
+        monkeypatch.setattr(auth.revoked_tokens, "sync_interval", 0)
+        assert client.get("/users/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+        assert claims["jti"] in auth.revoked_tokens
+
+    def test_logout_all_reaches_other_workers(self, client, session, make_auth_headers):
+        """Test a worker still caching the old token version rejects old tokens once it syncs, and accepts new ones"""
+        old = bearer(session["access_token"])
+        stale_identity = auth.user_cache.get("sessionuser")
+        assert client.post("/users/logout-all", headers=old).status_code == status.HTTP_200_OK
+        new = make_auth_headers("sessionuser")
+
+        # Another worker: its cached identity holds the old version and it has not synced yet
+        auth.user_cache.set("sessionuser", stale_identity)
+        auth.revoked_tokens.clear()
+        assert client.get("/users/me", headers=old).status_code == status.HTTP_401_UNAUTHORIZED
+        auth.user_cache.set("sessionuser", stale_identity)
+        assert client.get("/users/me", headers=new).status_code == status.HTTP_200_OK
+
+    def test_late_commits_with_lower_ids_are_synced(self, client, session, db_engine, monkeypatch):
+        """Test a revocation committed after a sync with a lower id than rows already seen is still picked up"""
+        headers = bearer(session["access_token"])
+        claims = jwt.get_unverified_claims(session["access_token"])
+        expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+        table = models.RevokedToken.__table__
+        with db_engine.begin() as connection:
+            connection.execute(table.insert().values(id=10**6, jti="seen-first", expires_at=expires_at))
+        monkeypatch.setattr(auth.revoked_tokens, "sync_interval", 0)
+        assert client.get("/users/me", headers=headers).status_code == status.HTTP_200_OK
+
+        with db_engine.begin() as connection:
+            connection.execute(table.insert().values(id=10**6 - 1, jti=claims["jti"], expires_at=expires_at))
+        assert client.get("/users/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED